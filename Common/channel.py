@@ -0,0 +1,320 @@
+"""
+Shared wireless medium, with two models of which receptions succeed.
+
+`Channel` has collision detection per receiver.
+
+A transmission occupies the interval [start, end) at every node within the
+sender's TX range, where start is delayed by the propagation time. A
+reception that overlaps any other reception at the same node is corrupted,
+no matter whether the frames were meant for that node.
+
+Overlapping receptions at a node form a busy period: a reception that starts
+while another one is still in flight joins the current period, otherwise it
+starts a new one. Every reception in a period of two or more overlaps at
+least one other, so a reception is intact exactly when its period has no
+other member. Each node keeps the end times of its in-flight receptions in a
+heap, which makes registering a reception O(log k) in the number of
+concurrent receptions k at that node. Senders only visit the nodes in their
+own neighbor list, so the cost of a run stays linear in the number of
+receptions.
+
+`SinrChannel` replaces the hard collision rule with a physical model. The
+received power falls off with the distance to the power of
+`path_loss_exponent`, and a reception succeeds if its signal to interference
+plus noise ratio (SINR) stays above the capture threshold while it lasts.
+Interference is the sum of the received power of all other ongoing
+transmissions in the network, not only of those within range. It only
+changes when a transmission starts or ends, so at every such boundary the
+SINR of all ongoing receptions is computed in one NumPy batch over all
+active transmitters.
+
+Both models only consider the nodes within the sender's TX range as
+receivers. Nodes on the channel get an intact frame addressed to them
+through `on_receive(sender_id, *args)` (started as a process, it may be a
+generator) and a corrupted one through `on_collision(sender_id, *args)`,
+both once the reception has ended.
+
+Radios are half-duplex: a node loses every reception that overlaps one of
+its own transmissions, and it transmits one frame at a time. A frame that is
+transmitted while the sender's previous frame is still in flight goes out
+right after it, `deferred` counts these frames.
+
+For carrier sensing, `busy(node_id)` tells whether a transmission reaches a
+node right now (including its own), `busy_until(node_id)` when the last one
+ends and `carrier(node_id)` gives an event that triggers when the next one
+starts.
+"""
+import heapq
+from functools import partial
+
+import numpy as np
+from wsnsimpy.wsnsimpy import BROADCAST_ADDR
+
+PROPAGATION_SPEED = 3e8  # meters per second, as in wsnsimpy's default PHY
+PATH_LOSS_EXPONENT = 3.0
+CAPTURE_THRESHOLD_DB = 10.0
+NOISE_MARGIN_DB = 10.0  # SINR above the capture threshold at the edge of the TX range without interference
+
+
+class _BusyPeriod:
+    """Receptions that overlap (transitively) at one node"""
+
+    __slots__ = ("receptions",)
+
+    def __init__(self):
+        self.receptions = 0
+
+
+class _Receiver:
+    __slots__ = ("ends", "period")
+
+    def __init__(self):
+        self.ends = []  # heap of the end times of the in-flight receptions
+        self.period = None
+
+
+class Channel:
+    """The medium all nodes of a simulator transmit on"""
+
+    def __init__(self, env):
+        self._env = env
+        self._receivers = {}  # node id -> _Receiver
+        self._carrier = {}  # node id -> event of a node waiting for the next transmission
+        self._senders = {}  # node id -> time its last transmission ends
+        self.transmissions = 0
+        self.deferred = 0
+        self.receptions = 0
+        self.corrupted = 0
+
+    @classmethod
+    def of(cls, simulator):
+        """The channel of `simulator`, a `Channel` is created on first use"""
+        if simulator.channel is None:
+            simulator.channel = cls(simulator.env)
+        return simulator.channel
+
+    def transmit(self, sender, dest, duration, *args):
+        """
+        Transmit a frame from `sender`, it reaches every node within its TX range
+        :param wsp.Node sender: The transmitting node
+        :param int dest: ID of the node the frame is for, or BROADCAST_ADDR
+        :param float duration: Airtime of the frame in seconds
+        :param args: The frame, passed on to the receivers
+        """
+        now = self._env.now
+        free = self._senders.get(sender.id, now)
+        if free > now:
+            # Still transmitting, the frame follows the previous one
+            self.deferred += 1
+            self._senders[sender.id] = free + duration
+            self._env.timeout(free - now).callbacks.append(partial(self._deferred, sender, dest, duration, args))
+            return
+
+        self._senders[sender.id] = now + duration
+        self._start(sender, dest, duration, args)
+
+    def _deferred(self, sender, dest, duration, args, _event):
+        self._start(sender, dest, duration, args)
+
+    def _start(self, sender, dest, duration, args):
+        env = self._env
+        now = env.now
+        self.transmissions += 1
+        carrier = self._carrier
+
+        # The own transmission joins the busy period at the sender, so every
+        # reception that overlaps it is lost
+        self._register(sender.id, now, now + duration)
+        if carrier:
+            self._sense(sender.id)
+
+        for dist, node in sender.neighbor_distance_list:
+            if dist > sender.tx_range:
+                break
+
+            delay = dist / PROPAGATION_SPEED
+            period = self._register(node.id, now + delay, now + delay + duration)
+            if carrier:
+                self._sense(node.id)
+            # Frames for other nodes still occupy the medium at this node
+            if dest == BROADCAST_ADDR or dest == node.id:
+                env.timeout(delay + duration).callbacks.append(partial(self._deliver, node, sender.id, period, args))
+
+    def _register(self, node_id, start, end):
+        receiver = self._receivers.get(node_id)
+        if receiver is None:
+            receiver = self._receivers[node_id] = _Receiver()
+
+        ends = receiver.ends
+        while ends and ends[0] <= start:
+            heapq.heappop(ends)
+        if not ends:
+            receiver.period = _BusyPeriod()
+
+        heapq.heappush(ends, end)
+        receiver.period.receptions += 1
+        return receiver.period
+
+    def _deliver(self, node, sender_id, period, args, _event):
+        self.receptions += 1
+        if period.receptions > 1:
+            self.corrupted += 1
+            node.on_collision(sender_id, *args)
+        else:
+            node.start_process(node.create_process(node.on_receive, sender_id, *args))
+
+    def in_flight(self, node_id):
+        """Number of receptions at `node_id` that have started and not ended yet"""
+        receiver = self._receivers.get(node_id)
+        if receiver is None:
+            return 0
+
+        now = self._env.now
+        ends = receiver.ends
+        while ends and ends[0] <= now:
+            heapq.heappop(ends)
+        return len(ends)
+
+    def busy(self, node_id):
+        """Whether `node_id` senses a transmission on the medium"""
+        return self.in_flight(node_id) > 0
+
+    def busy_until(self, node_id):
+        """Time the last transmission that reaches `node_id` ends, now if there is none"""
+        if not self.in_flight(node_id):
+            return self._env.now
+        return max(self._receivers[node_id].ends)
+
+    def carrier(self, node_id):
+        """Event that is triggered when the next transmission that reaches `node_id` starts"""
+        event = self._carrier.get(node_id)
+        if event is None:
+            event = self._carrier[node_id] = self._env.event()
+        return event
+
+    def _sense(self, node_id):
+        event = self._carrier.pop(node_id, None)
+        if event is not None:
+            event.succeed()
+
+
+class _Transmission:
+    __slots__ = ("sender_id", "pos", "dest", "end", "receivers", "receiver_ids", "positions", "signal", "lost", "args")
+
+
+class SinrChannel(Channel):
+    """
+    Channel on which a reception succeeds if its SINR stays above the capture
+    threshold, see the module documentation.
+    """
+
+    def __init__(self, env, path_loss_exponent=PATH_LOSS_EXPONENT, capture_threshold=CAPTURE_THRESHOLD_DB,
+                 noise=None, noise_margin=NOISE_MARGIN_DB):
+        """
+        :param float path_loss_exponent: Exponent of the distance in the path loss
+        :param float capture_threshold: Minimum SINR in dB
+        :param float noise: Noise power relative to the power received at 1 meter, by
+                            default derived from the TX range of the first sender
+        :param float noise_margin: Without interference, the SINR at the edge of that
+                                   TX range is this many dB above the capture threshold
+        """
+        super().__init__(env)
+        self.path_loss_exponent = path_loss_exponent
+        self.capture_ratio = 10 ** (capture_threshold / 10)
+        self.noise_margin = noise_margin
+        self.noise = noise
+        self._active = []  # ongoing _Transmissions
+        self._evaluation_scheduled = False
+
+    def _power(self, distance):
+        return np.maximum(distance, 1.0) ** -self.path_loss_exponent
+
+    def _start(self, sender, dest, duration, args):
+        if self.noise is None:
+            self.noise = float(self._power(sender.tx_range)) / self.capture_ratio / 10 ** (self.noise_margin / 10)
+
+        tx = _Transmission()
+        tx.sender_id = sender.id
+        tx.pos = sender.pos
+        tx.dest = dest
+        tx.end = self._env.now + duration
+        tx.args = args
+        tx.receivers = []
+        distances = []
+        carrier = self._carrier
+        # Receptions are decided per transmission, the per node end times
+        # only serve carrier sensing
+        self._register(sender.id, self._env.now, tx.end)
+        if carrier:
+            self._sense(sender.id)
+        for dist, node in sender.neighbor_distance_list:
+            if dist > sender.tx_range:
+                break
+            tx.receivers.append(node)
+            distances.append(dist)
+            self._register(node.id, self._env.now, tx.end)
+            if carrier:
+                self._sense(node.id)
+
+        tx.receiver_ids = np.fromiter((node.id for node in tx.receivers), dtype=np.int64, count=len(tx.receivers))
+        tx.positions = np.array([node.pos for node in tx.receivers], dtype=float).reshape(-1, 2)
+        tx.signal = self._power(np.array(distances, dtype=float))
+        tx.lost = np.zeros(len(tx.receivers), dtype=bool)
+
+        self.transmissions += 1
+        self._active.append(tx)
+        self._schedule_evaluation()
+        self._env.timeout(duration).callbacks.append(partial(self._end, tx))
+
+    def _schedule_evaluation(self):
+        # All transmissions that start or end at the same time share one evaluation
+        if not self._evaluation_scheduled:
+            self._evaluation_scheduled = True
+            self._env.timeout(0).callbacks.append(self._evaluate)
+
+    def _evaluate(self, _event):
+        self._evaluation_scheduled = False
+        active = self._active
+        if not active:
+            return
+
+        tx_ids = np.array([tx.sender_id for tx in active])
+        tx_pos = np.array([tx.pos for tx in active], dtype=float)
+        rx_ids = np.concatenate([tx.receiver_ids for tx in active])
+        rx_pos = np.concatenate([tx.positions for tx in active])
+        signal = np.concatenate([tx.signal for tx in active])
+
+        # Power of every active transmitter at every receiver, without the own transmissions of the receivers
+        power = self._power(np.hypot(rx_pos[:, 0, None] - tx_pos[None, :, 0], rx_pos[:, 1, None] - tx_pos[None, :, 1]))
+        power[rx_ids[:, None] == tx_ids[None, :]] = 0
+        interference = np.maximum(power.sum(axis=1) - signal, 0)
+        lost = signal < self.capture_ratio * (self.noise + interference)
+        # Receivers that are transmitting themselves
+        lost |= np.isin(rx_ids, tx_ids)
+
+        start = 0
+        for tx in active:
+            end = start + len(tx.receivers)
+            tx.lost |= lost[start:end]
+            start = end
+
+    def _end(self, tx, _event):
+        self._active.remove(tx)
+        self._schedule_evaluation()
+
+        broadcast = tx.dest == BROADCAST_ADDR
+        for node, lost in zip(tx.receivers, tx.lost.tolist()):
+            if not broadcast and node.id != tx.dest:
+                continue
+            self.receptions += 1
+            if lost:
+                self.corrupted += 1
+                node.on_collision(tx.sender_id, *tx.args)
+            else:
+                node.start_process(node.create_process(node.on_receive, tx.sender_id, *tx.args))
+
+
+CHANNELS = {
+    "disk": Channel,
+    "sinr": SinrChannel,
+}
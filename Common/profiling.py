@@ -0,0 +1,171 @@
+"""
+Opt-in profiling of node methods in simulated and wall-clock time.
+
+Node methods are decorated with `profiled`. While the simulator has no
+profiler, a decorated method costs one attribute check per call. Once
+`Simulator.start_profile` is called, every call is counted per method and
+message type (e.g. `MacawNode.on_receive(RTS)`) together with:
+
+- the wall-clock time spent in it, excluding decorated methods it calls
+- for generator methods, the simulated time between the first and the last
+  resume and the number of resumes, i.e. how long the `yield self.timeout`
+  chain of a handler runs
+
+The wall-clock times are kept per call stack and can be written as a
+collapsed-stack file (one `frame;frame;frame microseconds` line per stack),
+which flamegraph.pl, speedscope and similar tools read directly.
+"""
+from functools import wraps
+from inspect import isgeneratorfunction
+from time import perf_counter
+
+
+class FrameStats:
+    __slots__ = ("calls", "resumes", "wall_time", "sim_time")
+
+    def __init__(self):
+        self.calls = 0
+        self.resumes = 0
+        self.wall_time = 0.0  # second(s), excluding profiled callees
+        self.sim_time = 0.0  # simulated second(s)
+
+
+class Profiler:
+    """
+    Collects the statistics of `profiled` methods. Created by
+    `Simulator.start_profile`, which writes the collapsed stacks to its path
+    when the simulation ends.
+    """
+
+    def __init__(self, env, path=None):
+        """
+        :param simpy.Environment env: Environment to read the simulated time from
+        :param str path: Collapsed-stack file to write when `close` is called
+        """
+        self._env = env
+        self._path = path
+        self._stack = []  # frames that are running right now
+        self._child_time = []  # wall time spent in profiled callees, per running frame
+        self.frames = {}  # frame -> FrameStats
+        self.stacks = {}  # tuple of frames -> wall time excluding callees
+
+    def _enter(self, frame):
+        self._stack.append(frame)
+        self._child_time.append(0.0)
+        return perf_counter()
+
+    def _exit(self, started):
+        elapsed = perf_counter() - started
+        own_time = elapsed - self._child_time.pop()
+        stack = tuple(self._stack)
+        self._stack.pop()
+        if self._child_time:
+            self._child_time[-1] += elapsed
+
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + own_time
+        return own_time
+
+    def _stats(self, frame):
+        stats = self.frames.get(frame)
+        if stats is None:
+            stats = self.frames[frame] = FrameStats()
+        return stats
+
+    def call(self, frame, func, *args, **kwargs):
+        """Call `func` and account its time to `frame`"""
+        stats = self._stats(frame)
+        stats.calls += 1
+        stats.resumes += 1
+
+        started = self._enter(frame)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.wall_time += self._exit(started)
+
+    def process(self, frame, generator):
+        """
+        Run `generator` as a SimPy process body and account the time of every
+        resume to `frame`.
+        """
+        stats = self._stats(frame)
+        stats.calls += 1
+        sim_start = self._env.now
+        value = None
+
+        try:
+            while True:
+                stats.resumes += 1
+                started = self._enter(frame)
+                try:
+                    event = generator.send(value)
+                finally:
+                    stats.wall_time += self._exit(started)
+                value = yield event
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            stats.sim_time += self._env.now - sim_start
+
+    def collapsed(self):
+        """Lines of the collapsed-stack format, values in microseconds"""
+        for stack, wall_time in sorted(self.stacks.items()):
+            yield f"{';'.join(stack)} {round(wall_time * 1e6)}"
+
+    def write_collapsed(self, path):
+        with open(path, "w") as file:
+            for line in self.collapsed():
+                file.write(line + "\n")
+
+    def report(self):
+        """Table of all frames, the most expensive in wall-clock time first"""
+        lines = [f"{'Frame':<40} {'Calls':>9} {'Resumes':>9} {'Wall (ms)':>11} {'Per call (us)':>14} "
+                 f"{'Sim (s)':>10}"]
+        for frame, stats in sorted(self.frames.items(), key=lambda item: -item[1].wall_time):
+            lines.append(f"{frame:<40} {stats.calls:>9} {stats.resumes:>9} {stats.wall_time * 1e3:>11.2f} "
+                         f"{stats.wall_time * 1e6 / stats.calls:>14.2f} {stats.sim_time:>10.2f}")
+        return "\n".join(lines)
+
+    def close(self):
+        if self._path is not None:
+            self.write_collapsed(self._path)
+            self._path = None
+
+
+def profiled(message_type=None):
+    """
+    Decorator for node methods that accounts every call to the simulator's
+    profiler, if it has one.
+
+    :param message_type: Function taking the method's arguments (without
+        `self`) and returning the name of the message type, which is added to
+        the frame name. None to only use the method name.
+    """
+    def decorator(method):
+        name = method.__qualname__
+
+        def frame(args, kwargs):
+            if message_type is None:
+                return name
+            return f"{name}({message_type(*args, **kwargs)})"
+
+        if isgeneratorfunction(method):
+            # wsnsimpy checks whether a handler is a generator function, so the
+            # wrapper has to be one as well
+            @wraps(method)
+            def wrapper(self, *args, **kwargs):
+                profiler = self.sim.profiler
+                if profiler is None:
+                    return (yield from method(self, *args, **kwargs))
+                return (yield from profiler.process(frame(args, kwargs), method(self, *args, **kwargs)))
+        else:
+            @wraps(method)
+            def wrapper(self, *args, **kwargs):
+                profiler = self.sim.profiler
+                if profiler is None:
+                    return method(self, *args, **kwargs)
+                return profiler.call(frame(args, kwargs), method, self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
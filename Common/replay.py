@@ -0,0 +1,456 @@
+"""
+Recording of visualization commands and a replay viewer.
+
+A `SceneRecorder` is a TopoVis plotter: attached to the simulator's scene it
+receives every drawing command (`node`, `nodecolor`, `circle`, `delshape`,
+`addlink`, ...) and stores it with the simulated time, in the same batched
+chunk layout as `Common.trace`:
+
+- `H`: JSON header with the terrain size, written once
+- `S`: JSON list of strings (style names, labels) appended to the string table
+- `R`: packed records, see `RECORD`
+
+The simulation can therefore run headless at full speed and be watched
+afterwards with `python -m Common.replay <file>`, at any speed and seeking to
+any time.
+"""
+import argparse
+import json
+import struct
+from bisect import bisect_right
+from time import perf_counter
+
+from Common.trace import _CHUNK, DEFAULT_CAPACITY
+
+MAGIC = b"WSNSCENE1\n"
+
+# time, command, 3 integer and 4 float fields
+RECORD = struct.Struct("<dB3xiiidddd")
+
+# Commands
+NODE = 0
+NODEMOVE = 1
+NODECOLOR = 2
+NODEWIDTH = 3
+NODESCALE = 4
+NODELABEL = 5
+ADDLINK = 6
+DELLINK = 7
+CLEARLINKS = 8
+CIRCLE = 9
+LINE = 10
+DELSHAPE = 11
+LINESTYLE = 12
+
+# Default TopoVis appearance
+NODE_SIZE = 10
+NODE_COLOR = (0, 0, 0)
+DEFAULT_STYLE = {"color": (0, 0, 0), "dash": (), "width": 1, "arrow": "none"}
+
+KEYFRAME_INTERVAL = 20000  # records between two stored replay states
+
+# The plotter interface names its arguments `id`
+_object_id = id
+
+
+class SceneRecorder:
+    """
+    TopoVis plotter that writes the scene commands to `path` in batches of
+    `capacity` records. Created by `Simulator.start_recording`.
+    """
+
+    def __init__(self, path, env, terrain_size, capacity=DEFAULT_CAPACITY):
+        """
+        :param str path: File to write the recording to
+        :param simpy.Environment env: Environment to read the simulated time from
+        :param tuple terrain_size: (width, height) of the scene
+        :param int capacity: Number of records per batch
+        """
+        self.scene = None
+        self._env = env
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        header = json.dumps({"terrain_size": list(terrain_size)}).encode()
+        self._file.write(_CHUNK.pack(b"H", len(header)))
+        self._file.write(header)
+
+        self._capacity = capacity
+        self._buffer = bytearray(capacity * RECORD.size)
+        self._count = 0
+        self._strings = {}
+        self._new_strings = []
+        self._style_names = {}  # id of a LineStyle object -> its name
+
+    def _string(self, text):
+        index = self._strings.get(text)
+        if index is None:
+            index = self._strings[text] = len(self._strings)
+            self._new_strings.append(text)
+        return index
+
+    def _shape(self, id):
+        # TopoVis generates the shape ids "_1", "_2", ...
+        if isinstance(id, str) and id[1:].isdigit():
+            return int(id[1:])
+        return -1 - self._string(str(id))
+
+    def _style(self, style):
+        name = self._style_names.get(_object_id(style))
+        if name is None:
+            # Styles passed by object instead of by name
+            name = self._style_names[_object_id(style)] = f"_anonymous{len(self._style_names)}"
+            self._record(LINESTYLE, b=self._string(name), c=self._string(json.dumps(vars(style))))
+        return self._string(name)
+
+    def _record(self, command, a=0, b=0, c=0, x=0.0, y=0.0, z=0.0, w=0.0):
+        RECORD.pack_into(self._buffer, self._count * RECORD.size, self._env.now, command, a, b, c, x, y, z, w)
+        self._count += 1
+        if self._count == self._capacity:
+            self.flush()
+
+    def flush(self):
+        if self._file is None:
+            return
+
+        if self._new_strings:
+            payload = json.dumps(self._new_strings).encode()
+            self._file.write(_CHUNK.pack(b"S", len(payload)))
+            self._file.write(payload)
+            self._new_strings = []
+
+        if self._count:
+            size = self._count * RECORD.size
+            self._file.write(_CHUNK.pack(b"R", size))
+            self._file.write(memoryview(self._buffer)[:size])
+            self._count = 0
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    # TopoVis plotter interface
+
+    def setScene(self, scene):
+        self.scene = scene
+        # Styles defined before the recorder was added
+        for name, style in scene.lineStyles.items():
+            self.linestyle(name, **vars(style))
+
+    def init(self, tx, ty):
+        pass
+
+    def setTime(self, time):
+        pass
+
+    def show(self):
+        pass
+
+    def node(self, id, x, y):
+        self._record(NODE, id, x=x, y=y)
+
+    def nodemove(self, id, x, y):
+        self._record(NODEMOVE, id, x=x, y=y)
+
+    def nodecolor(self, id, r, g, b):
+        self._record(NODECOLOR, id, x=r, y=g, z=b)
+
+    def nodewidth(self, id, width):
+        self._record(NODEWIDTH, id, x=width)
+
+    def nodescale(self, id, scale):
+        self._record(NODESCALE, id, x=scale)
+
+    def nodelabel(self, id, label):
+        self._record(NODELABEL, id, self._string(str(label)))
+
+    def nodehollow(self, id, flag):
+        pass
+
+    def nodedouble(self, id, flag):
+        pass
+
+    def addlink(self, src, dst, style):
+        self._record(ADDLINK, src, dst, self._string(style))
+
+    def dellink(self, src, dst, style):
+        self._record(DELLINK, src, dst, self._string(style))
+
+    def clearlinks(self):
+        self._record(CLEARLINKS)
+
+    def circle(self, x, y, r, id, linestyle, fillstyle):
+        self._record(CIRCLE, self._shape(id), c=self._style(linestyle), x=x, y=y, z=r)
+
+    def line(self, x1, y1, x2, y2, id, linestyle):
+        self._record(LINE, self._shape(id), c=self._style(linestyle), x=x1, y=y1, z=x2, w=y2)
+
+    def rect(self, x1, y1, x2, y2, id, linestyle, fillstyle):
+        pass
+
+    def delshape(self, id):
+        self._record(DELSHAPE, self._shape(id))
+
+    def linestyle(self, id, **kwargs):
+        # Shapes get the style object, remember which name it belongs to
+        style = self.scene.lineStyles.get(id) if self.scene is not None else None
+        if style is not None:
+            self._style_names[_object_id(style)] = id
+        self._record(LINESTYLE, b=self._string(id), c=self._string(json.dumps(kwargs)))
+
+    def fillstyle(self, id, **kwargs):
+        pass
+
+    def textstyle(self, id, **kwargs):
+        pass
+
+
+def read_recording(path):
+    """
+    Read a recording.
+
+    :param str path: File written by `SceneRecorder`
+    :return: Tuple of the header dict, the string table and the list of
+        (time, command, a, b, c, x, y, z, w) records
+    """
+    header = None
+    strings = []
+    records = []
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a scene recording")
+
+        while True:
+            chunk = file.read(_CHUNK.size)
+            if not chunk:
+                break
+            kind, size = _CHUNK.unpack(chunk)
+            payload = file.read(size)
+
+            if kind == b"H":
+                header = json.loads(payload)
+            elif kind == b"S":
+                strings.extend(json.loads(payload))
+            elif kind == b"R":
+                records.extend(RECORD.iter_unpack(payload))
+            else:
+                raise ValueError(f"Unknown chunk {kind!r} in {path}")
+
+    return header, strings, records
+
+
+class ReplayState:
+    """
+    The scene at some point of a recording. Moving forward applies the
+    records in between, moving back restarts from the last keyframe (a copy of
+    the state stored every KEYFRAME_INTERVAL records) before that time.
+    """
+
+    def __init__(self, strings, records):
+        self._strings = strings
+        self._records = records
+        self._times = [record[0] for record in records]
+        self._keyframes = {}  # record index -> saved state
+        self._reset()
+
+    @property
+    def end_time(self):
+        return self._times[-1] if self._times else 0.0
+
+    def _reset(self):
+        self.time = 0.0
+        self.position = 0  # index of the next record to apply
+        self.nodes = {}  # id -> [x, y, color, width, scale, label]
+        self.shapes = {}  # shape -> (command, coordinates, style)
+        self.links = {}  # (src, dst, style) -> None, in insertion order
+        self.styles = {"": DEFAULT_STYLE}
+
+    def _save(self):
+        return (
+            {id: list(node) for id, node in self.nodes.items()},
+            dict(self.shapes),
+            dict(self.links),
+            dict(self.styles),
+        )
+
+    def _restore(self, position):
+        nodes, shapes, links, styles = self._keyframes[position]
+        self.position = position
+        self.time = self._times[position - 1] if position else 0.0
+        self.nodes = {id: list(node) for id, node in nodes.items()}
+        self.shapes = dict(shapes)
+        self.links = dict(links)
+        self.styles = dict(styles)
+
+    def _apply(self, record):
+        _, command, a, b, c, x, y, z, w = record
+        if command == NODE:
+            self.nodes[a] = [x, y, NODE_COLOR, 1, 1.0, str(a)]
+        elif command == NODEMOVE:
+            self.nodes[a][0:2] = x, y
+        elif command == NODECOLOR:
+            self.nodes[a][2] = (x, y, z)
+        elif command == NODEWIDTH:
+            self.nodes[a][3] = x
+        elif command == NODESCALE:
+            self.nodes[a][4] = x
+        elif command == NODELABEL:
+            self.nodes[a][5] = self._strings[b]
+        elif command == ADDLINK:
+            self.links[(a, b, self._strings[c])] = None
+        elif command == DELLINK:
+            self.links.pop((a, b, self._strings[c]), None)
+        elif command == CLEARLINKS:
+            self.links.clear()
+        elif command == CIRCLE:
+            self.shapes[a] = (CIRCLE, (x, y, z), self._strings[c])
+        elif command == LINE:
+            self.shapes[a] = (LINE, (x, y, z, w), self._strings[c])
+        elif command == DELSHAPE:
+            self.shapes.pop(a, None)
+        elif command == LINESTYLE:
+            self.styles[self._strings[b]] = dict(DEFAULT_STYLE, **json.loads(self._strings[c]))
+
+    def seek(self, time):
+        """Bring the state to `time`, applying all records up to and including it"""
+        end = bisect_right(self._times, time)
+        if end < self.position:
+            start = (end // KEYFRAME_INTERVAL) * KEYFRAME_INTERVAL
+            if start in self._keyframes:
+                self._restore(start)
+            else:
+                self._reset()
+
+        for position in range(self.position, end):
+            if position % KEYFRAME_INTERVAL == 0 and position not in self._keyframes:
+                self._keyframes[position] = self._save()
+            self._apply(self._records[position])
+
+        self.position = max(self.position, end)
+        self.time = time
+
+
+def _color(color):
+    return "#%02x%02x%02x" % tuple(int(channel * 255) for channel in color)
+
+
+class ReplayViewer:
+    """
+    Tk window that plays a recording back. The scene is redrawn from the
+    replay state at most `fps` times per second, independent of how many
+    commands were recorded in between.
+    """
+
+    ARROWS = {"head": "last", "tail": "first", "both": "both", "none": "none"}
+
+    def __init__(self, path, speed=1.0, fps=30):
+        # Only the viewer needs Tk, recording works without it
+        import tkinter as tk
+
+        header, strings, records = read_recording(path)
+        self.state = ReplayState(strings, records)
+        self.speed = speed
+        self.playing = True
+        self._interval = int(1000 / fps)
+
+        self.tk = tk.Tk()
+        self.tk.title(f"Replay of {path}")
+        width, height = header["terrain_size"]
+        self.canvas = tk.Canvas(self.tk, width=width, height=height, background="white")
+        self.canvas.pack(fill=tk.BOTH, expand=tk.YES)
+
+        controls = tk.Frame(self.tk)
+        controls.pack(fill=tk.X)
+        self._play_button = tk.Button(controls, text="Pause", width=6, command=self.toggle)
+        self._play_button.pack(side=tk.LEFT)
+        tk.Label(controls, text="Speed").pack(side=tk.LEFT)
+        self._speed = tk.StringVar(value=f"{speed:g}")
+        speed_entry = tk.Entry(controls, textvariable=self._speed, width=6)
+        speed_entry.pack(side=tk.LEFT)
+        speed_entry.bind("<Return>", self._set_speed)
+        self._time_scale = tk.Scale(controls, from_=0, to=self.state.end_time, resolution=0.01,
+                                    orient=tk.HORIZONTAL, showvalue=True, command=self._seek)
+        self._time_scale.pack(side=tk.LEFT, fill=tk.X, expand=tk.YES)
+
+        self._last_tick = None
+        self._updating_scale = False
+
+    def toggle(self):
+        self.playing = not self.playing
+        self._play_button.configure(text="Pause" if self.playing else "Play")
+
+    def _set_speed(self, _):
+        try:
+            self.speed = float(self._speed.get())
+        except ValueError:
+            self._speed.set(f"{self.speed:g}")
+
+    def _seek(self, value):
+        if not self._updating_scale:
+            self.state.seek(float(value))
+            self.draw()
+
+    def draw(self):
+        canvas = self.canvas
+        state = self.state
+        canvas.delete("all")
+
+        for command, coordinates, style_name in state.shapes.values():
+            style = state.styles.get(style_name, DEFAULT_STYLE)
+            options = {"width": style["width"], "dash": tuple(style["dash"])}
+            if command == CIRCLE:
+                x, y, r = coordinates
+                canvas.create_oval(x - r, y - r, x + r, y + r, outline=_color(style["color"]), **options)
+            else:
+                canvas.create_line(*coordinates, fill=_color(style["color"]), arrow=self.ARROWS[style["arrow"]],
+                                   **options)
+
+        for src, dst, style_name in state.links:
+            if src in state.nodes and dst in state.nodes:
+                style = state.styles.get(style_name, DEFAULT_STYLE)
+                canvas.create_line(*state.nodes[src][0:2], *state.nodes[dst][0:2], fill=_color(style["color"]),
+                                   width=style["width"], dash=tuple(style["dash"]),
+                                   arrow=self.ARROWS[style["arrow"]])
+
+        for x, y, color, width, scale, label in state.nodes.values():
+            size = NODE_SIZE * scale
+            canvas.create_oval(x - size, y - size, x + size, y + size, outline=_color(color), width=width)
+            canvas.create_text(x, y, text=label, fill=_color(color))
+
+        canvas.create_text(0, 0, text=f"Time: {state.time:.2f}S", anchor="nw")
+
+    def _tick(self):
+        now = perf_counter()
+        if self.playing and self._last_tick is not None:
+            target = min(self.state.time + (now - self._last_tick) * self.speed, self.state.end_time)
+            self.state.seek(target)
+            self._updating_scale = True
+            self._time_scale.set(target)
+            self._updating_scale = False
+            self.draw()
+        self._last_tick = now
+        self.tk.after(self._interval, self._tick)
+
+    def run(self):
+        self.draw()
+        self._tick()
+        self.tk.mainloop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play back a recorded simulation")
+    parser.add_argument("recording", help="recording to play, written with --record")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="simulated seconds per second (default: 1)")
+    parser.add_argument("--start", type=float, default=0.0, help="simulated time to start at (default: 0)")
+    parser.add_argument("--fps", type=int, default=30, help="maximum number of redraws per second (default: 30)")
+    args = parser.parse_args()
+
+    viewer = ReplayViewer(args.recording, args.speed, args.fps)
+    viewer.state.seek(args.start)
+    viewer.run()
+
+
+if __name__ == '__main__':
+    main()
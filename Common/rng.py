@@ -0,0 +1,63 @@
+"""
+Independent random number streams derived from a single master seed.
+
+Every subsystem (topology placement, traffic, MAC backoff, ...) and every node
+draws from its own `random.Random` instance. A stream's seed only depends on
+the master seed and the stream's name, so adding draws to one subsystem does
+not shift the numbers seen by any other, and two protocol variants run with
+the same master seed see the same topology and traffic.
+"""
+import hashlib
+import random
+
+# Subsystem names
+TOPOLOGY = "topology"
+TRAFFIC = "traffic"
+BACKOFF = "backoff"
+JITTER = "jitter"
+CHANNEL = "channel"
+
+
+def derive_seed(seed, subsystem, node_id=None):
+    """
+    Seed for a stream, stable across Python versions and processes (unlike
+    `hash`, which is salted per process for strings).
+
+    :param int seed: Master seed
+    :param str subsystem: Name of the subsystem the stream is used by
+    :param int node_id: Node the stream belongs to, None for a shared stream
+    :return: 64 bit seed
+    """
+    key = f"{seed}:{subsystem}:{'' if node_id is None else node_id}".encode()
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], "little")
+
+
+class RandomStreams:
+    """
+    Hands out one random stream per (subsystem, node) pair, all derived from
+    `seed`. Streams are created on first use and cached.
+    """
+
+    def __init__(self, seed=None):
+        """
+        :param int seed: Master seed, a random one is chosen (and can be read
+            from `seed` to replay the run) if None
+        """
+        if seed is None:
+            seed = random.SystemRandom().randrange(2 ** 32)
+
+        self.seed = seed
+        self._streams = {}
+
+    def stream(self, subsystem, node_id=None):
+        """
+        :param str subsystem: Name of the subsystem, e.g. `TOPOLOGY`
+        :param int node_id: Node the stream belongs to, None for a stream shared
+            by the whole subsystem
+        :return: random.Random instance
+        """
+        key = (subsystem, node_id)
+        rng = self._streams.get(key)
+        if rng is None:
+            rng = self._streams[key] = random.Random(derive_seed(self.seed, subsystem, node_id))
+        return rng
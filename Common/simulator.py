@@ -0,0 +1,182 @@
+import bisect
+
+import wsnsimpy.wsnsimpy_tk as wsp
+from wsnsimpy.topovis import Scene
+
+from Common.channel import CHANNELS
+from Common.profiling import Profiler
+from Common.replay import SceneRecorder
+from Common.rng import RandomStreams, derive_seed
+from Common.spatial import GridIndex
+from Common.trace import Tracer
+
+# Line styles wsnsimpy defines on visual scenes and draws with
+WSNSIMPY_LINE_STYLES = {
+    "wsnsimpy:tx": {"color": (0, 0, 1), "dash": (5, 5)},
+    "wsnsimpy:ack": {"color": (0, 1, 1), "dash": (5, 5)},
+    "wsnsimpy:unicast": {"color": (0, 0, 1), "width": 3, "arrow": "head"},
+    "wsnsimpy:collision": {"color": (1, 0, 0), "width": 3},
+}
+
+
+class Simulator(wsp.Simulator):
+    """
+    wsnsimpy simulator that maintains the neighbor lists of its nodes with a
+    uniform grid index instead of comparing every pair of nodes.
+
+    Adding nodes does no neighbor bookkeeping. Once all nodes are placed and
+    have their `tx_range` set, `build_index` (called automatically at the start
+    of `run`) builds the grid with cells as wide as the largest TX range. After
+    that, `Node.move` only updates the neighbors around the old and new
+    position. A node's `neighbor_distance_list` only contains the nodes within
+    the largest TX range, which is all wsnsimpy needs for sending and for
+    `Node.neighbors`.
+
+    All randomness is derived from `seed`: `rng` hands out independent streams
+    per subsystem and node, and wsnsimpy's own `random` (used by its default
+    PHY and MAC layers) is seeded from the same master seed.
+
+    Nodes record trace events to `tracer`, which is None (tracing disabled)
+    until `start_trace` is called. The trace is flushed when `run` returns.
+    Likewise, `profiled` node methods report to `profiler` once
+    `start_profile` is called, and the scene commands are written to
+    `recorder` once `start_recording` is called, also in headless runs.
+
+    Nodes that transmit on a shared medium use `channel`, see `use_channel`.
+    """
+
+    def __init__(self, *args, seed=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.index = None
+        self.streams = RandomStreams(seed)
+        self.random.seed(derive_seed(self.streams.seed, "wsnsimpy"))
+        self.tracer = None
+        self.profiler = None
+        self.recorder = None
+        self.channel = None
+
+    @property
+    def seed(self):
+        return self.streams.seed
+
+    def rng(self, subsystem, node_id=None):
+        """Random stream for `subsystem`, see `RandomStreams.stream`"""
+        return self.streams.stream(subsystem, node_id)
+
+    def start_trace(self, path, **kwargs):
+        """Write trace events to `path`, see `Common.trace.Tracer`"""
+        self.tracer = Tracer(path, **kwargs)
+
+    def start_profile(self, path=None):
+        """
+        Profile the `profiled` node methods, see `Common.profiling.Profiler`.
+        If `path` is given, the collapsed stacks are written to it when the
+        simulation ends.
+        """
+        self.profiler = Profiler(self.env, path)
+        return self.profiler
+
+    def start_recording(self, path, **kwargs):
+        """
+        Record the scene commands to `path`, see `Common.replay.SceneRecorder`.
+        Has to be called before any node is added.
+        """
+        if self.nodes:
+            raise ValueError("Recording has to start before the nodes are added")
+
+        if not self.visual:
+            # Headless runs have no scene at all, give them one without plotters
+            self.scene = Scene(realtime=True)
+            for name, style in WSNSIMPY_LINE_STYLES.items():
+                self.scene.linestyle(name, **style)
+            self.scene.init(*self.terrain_size)
+
+        self.recorder = SceneRecorder(path, self.env, self.terrain_size, **kwargs)
+        self.scene.addPlotter(self.recorder)
+
+    def use_channel(self, model, **kwargs):
+        """
+        Let the nodes transmit on the medium `model`, "disk" or "sinr" (see
+        `Common.channel`), the `kwargs` are passed to the channel. Has to be
+        called before any node is added.
+        """
+        if model not in CHANNELS:
+            raise ValueError(f"Unknown channel model {model!r}, possible options: {', '.join(CHANNELS)}")
+        if self.nodes:
+            raise ValueError("The channel has to be chosen before the nodes are added")
+
+        self.channel = CHANNELS[model](self.env, **kwargs)
+        return self.channel
+
+    @property
+    def drawing(self):
+        """Whether scene commands are shown or recorded, nodes can skip drawing if not"""
+        return self.visual or self.recorder is not None
+
+    def build_index(self):
+        """Build the grid index and the neighbor lists of all nodes"""
+        self.neighbor_range = max(node.tx_range for node in self.nodes)
+        self.index = GridIndex(self.neighbor_range)
+
+        for node in self.nodes:
+            self.index.insert(node.id, node.pos)
+
+        for node in self.nodes:
+            node.neighbor_distance_list = self._find_neighbors(node)
+
+    def _find_neighbors(self, node):
+        neighbors = [
+            (dist, self.nodes[node_id])
+            for dist, node_id in self.index.within(node.pos, self.neighbor_range)
+            if node_id != node.id
+        ]
+        neighbors.sort()
+        return neighbors
+
+    def update_neighbor_list(self, id):
+        """
+        Called by wsnsimpy when a node is added or moved. Before the index is
+        built there is nothing to maintain.
+        """
+        if self.index is None:
+            return
+
+        me = self.nodes[id]
+
+        # remove this node from its old neighbors' lists
+        for _, neighbor in me.neighbor_distance_list:
+            nlist = neighbor.neighbor_distance_list
+            for i, (_, other) in enumerate(nlist):
+                if other is me:
+                    del nlist[i]
+                    break
+
+        self.index.move(id, me.pos)
+        me.neighbor_distance_list = self._find_neighbors(me)
+
+        # then insert it in the lists of its new neighbors
+        for dist, neighbor in me.neighbor_distance_list:
+            bisect.insort(neighbor.neighbor_distance_list, (dist, me))
+
+    def init(self):
+        super().init()
+        if self.index is None:
+            self.build_index()
+
+        for node in self.nodes:
+            if node.tx_range > self.neighbor_range:
+                raise ValueError(
+                    f"Node {node.id} has a TX range of {node.tx_range}, but the neighbor index was built for "
+                    f"{self.neighbor_range}. Set all TX ranges before calling build_index()"
+                )
+
+    def run(self):
+        try:
+            return super().run()
+        finally:
+            if self.tracer is not None:
+                self.tracer.close()
+            if self.profiler is not None:
+                self.profiler.close()
+            if self.recorder is not None:
+                self.recorder.close()
@@ -0,0 +1,80 @@
+from math import ceil, floor
+
+
+class GridIndex:
+    """
+    Uniform grid over the terrain with cells of `cell_size` wide. Finding all
+    keys within `cell_size` of a point only has to look at the 3x3 cells around
+    it, so lookups cost O(local density) instead of O(N).
+    """
+
+    def __init__(self, cell_size):
+        """
+        :param float cell_size: Width of a grid cell, usually the largest TX range
+        """
+        if cell_size <= 0:
+            raise ValueError(f"Grid cell size must be positive, got {cell_size}")
+
+        self.cell_size = cell_size
+        self._cells = {}
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def _cell(self, pos):
+        return floor(pos[0] / self.cell_size), floor(pos[1] / self.cell_size)
+
+    def insert(self, key, pos):
+        """
+        :param key: Key to store, e.g. a node id
+        :param tuple pos: (x, y) position of the key
+        """
+        if key in self._positions:
+            self.remove(key)
+        self._positions[key] = pos
+        self._cells.setdefault(self._cell(pos), set()).add(key)
+
+    def remove(self, key):
+        pos = self._positions.pop(key)
+        cell = self._cell(pos)
+        keys = self._cells[cell]
+        keys.discard(key)
+        if not keys:
+            del self._cells[cell]
+
+    def move(self, key, pos):
+        """Update the position of `key`, only touching the cells involved"""
+        old_pos = self._positions.get(key)
+        if old_pos is not None and self._cell(old_pos) == self._cell(pos):
+            self._positions[key] = pos
+        else:
+            self.insert(key, pos)
+
+    def within(self, pos, radius):
+        """
+        :param tuple pos: (x, y) center of the search
+        :param float radius: Search radius
+        :return: List of (distance, key) for all keys within `radius` of `pos`
+        """
+        x, y = pos
+        reach = max(1, ceil(radius / self.cell_size))
+        cx, cy = self._cell(pos)
+        radius_sq = radius * radius
+        found = []
+
+        for gx in range(cx - reach, cx + reach + 1):
+            for gy in range(cy - reach, cy + reach + 1):
+                keys = self._cells.get((gx, gy))
+                if not keys:
+                    continue
+                for key in keys:
+                    px, py = self._positions[key]
+                    dist_sq = (px - x) ** 2 + (py - y) ** 2
+                    if dist_sq <= radius_sq:
+                        found.append((dist_sq ** 0.5, key))
+
+        return found
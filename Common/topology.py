@@ -0,0 +1,154 @@
+"""
+Vectorized node placement and receiver lookup for the topology classes.
+
+All functions return plain NumPy arrays, so a topology can place thousands of
+nodes and find every node's in-range receivers without Python loops over
+pairs of nodes.
+"""
+import numpy as np
+
+# Offsets of a grid cell and its 8 surrounding cells
+_NEIGHBOR_CELLS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+def grid_positions(bounds, spacing):
+    """
+    Positions on a regular grid, in the same order as nested
+    `for x in range(...): for y in range(...)` loops.
+
+    :param list bounds: [min_x, min_y, max_x, max_y], the max values are exclusive
+    :param int spacing: Distance between neighboring grid points
+    :return: (N, 2) array of positions
+    """
+    xs = np.arange(bounds[0], bounds[2], spacing)
+    ys = np.arange(bounds[1], bounds[3], spacing)
+    grid_x, grid_y = np.meshgrid(xs, ys, indexing="ij")
+    return np.column_stack((grid_x.ravel(), grid_y.ravel()))
+
+
+def poisson_disk(n, bounds, min_spacing, rng, max_failed_rounds=10):
+    """
+    Place `n` uniformly random points such that no two points are closer than
+    `min_spacing` on both axes (the same square exclusion zone the randomized
+    topology always used).
+
+    Candidates are thrown in batches. A background grid with cells of
+    `min_spacing` wide holds at most one accepted point per cell, so every
+    candidate only has to be checked against the 3x3 cells around it.
+
+    :param int n: Number of points to place
+    :param list bounds: [min_x, min_y, max_x, max_y] of the field
+    :param float min_spacing: Minimum spacing between two points
+    :param numpy.random.Generator rng: Random generator to draw positions from
+    :param int max_failed_rounds: Number of batches in a row without any accepted
+        candidate after which the field is considered full
+    :return: (n, 2) array of positions
+    """
+    low = np.array(bounds[:2], dtype=float)
+    high = np.array(bounds[2:], dtype=float)
+    points = np.empty((n, 2))
+
+    if min_spacing <= 0:
+        points[:] = rng.uniform(low, high, size=(n, 2))
+        return points
+
+    # Pad the grid by one cell on every side so neighbor lookups never go out of bounds
+    cells_x, cells_y = (np.floor((high - low) / min_spacing).astype(int) + 3)
+    grid = np.full((cells_x, cells_y), -1, dtype=np.int64)
+    count = 0
+    acceptance = 1.0
+    failed_rounds = 0
+
+    while count < n:
+        # Throw more candidates per round as the field fills up and fewer are accepted
+        batch_size = min(max(64, int(2 * (n - count) / max(acceptance, 0.001))), 1 << 20)
+        candidates = rng.uniform(low, high, size=(batch_size, 2))
+        cells = np.floor((candidates - low) / min_spacing).astype(np.int64) + 1
+        accept = np.ones(len(candidates), dtype=bool)
+
+        # Reject candidates that are too close to an already placed point
+        for dx, dy in _NEIGHBOR_CELLS:
+            placed = grid[cells[:, 0] + dx, cells[:, 1] + dy]
+            occupied = np.flatnonzero(placed >= 0)
+            too_close = np.all(np.abs(points[placed[occupied]] - candidates[occupied]) < min_spacing, axis=1)
+            accept[occupied[too_close]] = False
+
+        candidates, cells = candidates[accept], cells[accept]
+
+        # Reject candidates that are too close to an earlier candidate of the same batch
+        batch = np.full_like(grid, -1)
+        batch[cells[::-1, 0], cells[::-1, 1]] = np.arange(len(candidates))[::-1]
+        accept = np.ones(len(candidates), dtype=bool)
+        for dx, dy in _NEIGHBOR_CELLS:
+            other = batch[cells[:, 0] + dx, cells[:, 1] + dy]
+            earlier = np.flatnonzero((other >= 0) & (other < np.arange(len(candidates))))
+            too_close = np.all(np.abs(candidates[other[earlier]] - candidates[earlier]) < min_spacing, axis=1)
+            accept[earlier[too_close]] = False
+
+        # Candidates sharing a cell with an earlier candidate are always too close
+        first_in_cell = batch[cells[:, 0], cells[:, 1]] == np.arange(len(candidates))
+        accept &= first_in_cell
+
+        accepted = np.flatnonzero(accept)
+        acceptance = len(accepted) / batch_size
+        accepted = accepted[:n - count]
+
+        if len(accepted) == 0:
+            failed_rounds += 1
+            if failed_rounds == max_failed_rounds:
+                raise ValueError(
+                    f"Could only place {count} of {n} nodes with a spacing of {min_spacing} in {bounds}")
+            continue
+
+        failed_rounds = 0
+        points[count:count + len(accepted)] = candidates[accepted]
+        grid[cells[accepted, 0], cells[accepted, 1]] = np.arange(count, count + len(accepted))
+        count += len(accepted)
+
+    return points
+
+
+def receiver_candidates(positions, tx_range):
+    """
+    Find, for every position, all other positions within `tx_range`.
+
+    The result is in compressed sparse row form: the candidates of node `i`
+    are `indices[indptr[i]:indptr[i + 1]]`.
+
+    :param numpy.ndarray positions: (N, 2) array of positions
+    :param float tx_range: Maximum distance between a node and its receivers
+    :return: Tuple of (indptr, indices) arrays
+    """
+    positions = np.asarray(positions, dtype=float)
+    n = len(positions)
+
+    cells = np.floor(positions / tx_range).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    stride = cells[:, 1].max() + 2
+    keys = cells[:, 0] * stride + cells[:, 1]
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    sources, targets = [], []
+    for dx, dy in _NEIGHBOR_CELLS:
+        wanted = keys + dx * stride + dy
+        start = np.searchsorted(sorted_keys, wanted, side="left")
+        counts = np.searchsorted(sorted_keys, wanted, side="right") - start
+
+        src = np.repeat(np.arange(n), counts)
+        offsets = np.arange(len(src)) - np.repeat(np.cumsum(counts) - counts, counts)
+        dst = order[np.repeat(start, counts) + offsets]
+
+        in_range = np.sum((positions[src] - positions[dst]) ** 2, axis=1) <= tx_range ** 2
+        in_range &= src != dst
+        sources.append(src[in_range])
+        targets.append(dst[in_range])
+
+    sources = np.concatenate(sources)
+    targets = np.concatenate(targets)
+    order = np.lexsort((targets, sources))
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+    return indptr, targets[order]
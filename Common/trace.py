@@ -0,0 +1,206 @@
+"""
+Structured event tracing with a compact binary trace format.
+
+Protocol code records events as (time, node, event type, two integer fields)
+instead of formatting log strings. Records are packed into a preallocated
+buffer and written to the trace file in batches, and nothing is formatted
+until the trace is read back. When no trace is being written and logging is
+off, recording an event is a single attribute check.
+
+A trace file is a sequence of chunks, each a 1 byte kind and a 4 byte payload
+length followed by the payload:
+
+- `D`: JSON list of event definitions `[code, name, fmt, fields, style, names]`
+- `R`: packed records, see `RECORD`
+
+Definitions are always written before the first record that uses them. Read a
+trace back with `python -m Common.trace <file>`.
+"""
+import argparse
+import json
+import struct
+import sys
+
+MAGIC = b"WSNTRACE1\n"
+
+# time, node, event code, field a, field b
+RECORD = struct.Struct("<dIHxxii")
+_CHUNK = struct.Struct("<cI")
+
+DEFAULT_CAPACITY = 8192  # records per batch
+
+ENDC = '\033[0m'
+
+EVENTS = []
+
+
+class EventType:
+    """
+    A kind of trace event. `fmt` is formatted with `node` and the names in
+    `fields` (at most two integer fields), `style` is an optional ANSI style
+    the message is shown in. `names` maps a field to the names of its values,
+    e.g. of an enum, which are shown instead of the integers.
+    """
+
+    __slots__ = ("code", "name", "fmt", "fields", "style", "names")
+
+    def __init__(self, code, name, fmt, fields=(), style="", names=None):
+        if len(fields) > 2:
+            raise ValueError(f"Event {name} has {len(fields)} fields, at most 2 are supported")
+
+        self.code = code
+        self.name = name
+        self.fmt = fmt
+        self.fields = tuple(fields)
+        self.style = style
+        # JSON object keys are strings, so are the values here
+        self.names = {field: {str(value): name for value, name in table.items()}
+                      for field, table in (names or {}).items()}
+
+    def format(self, node, a=-1, b=-1, color=True):
+        values = dict(zip(self.fields, (a, b)))
+        for field, table in self.names.items():
+            values[field] = table.get(str(values[field]), values[field])
+        message = self.fmt.format(node=node, **values)
+        if color and self.style:
+            return f"{self.style}{message}{ENDC}"
+        return message
+
+    def __repr__(self):
+        return f"EventType({self.code}, {self.name!r})"
+
+
+def event(name, fmt, fields=(), style="", names=None):
+    """
+    Register a new event type, meant to be called once at module level.
+
+    :param str name: Unique name of the event, e.g. "mac.send_rts"
+    :param str fmt: Format string for the human readable message
+    :param tuple fields: Names of the integer fields used in `fmt`
+    :param str style: ANSI style to show the message in
+    :param dict names: Field name -> {value: name} to show names instead of integers
+    :return: EventType
+    """
+    event_type = EventType(len(EVENTS), name, fmt, fields, style, names)
+    EVENTS.append(event_type)
+    return event_type
+
+
+def log_line(node, time, message):
+    """Same layout as wsnsimpy's `Node.log`"""
+    return f"Node {'#' + str(node):4}[{time:10.5f}] {message}"
+
+
+class Tracer:
+    """
+    Writes trace records to `path` in batches of `capacity` records.
+    """
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY):
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._capacity = capacity
+        self._buffer = bytearray(capacity * RECORD.size)
+        self._count = 0
+        self._defined = 0  # number of EVENTS already written to the file
+
+    def record(self, time, node, code, a=-1, b=-1):
+        RECORD.pack_into(self._buffer, self._count * RECORD.size, time, node, code, a, b)
+        self._count += 1
+        if self._count == self._capacity:
+            self.flush()
+
+    def flush(self):
+        if self._file is None:
+            return
+
+        if self._defined < len(EVENTS):
+            definitions = [[e.code, e.name, e.fmt, e.fields, e.style, e.names] for e in EVENTS[self._defined:]]
+            payload = json.dumps(definitions).encode()
+            self._file.write(_CHUNK.pack(b"D", len(payload)))
+            self._file.write(payload)
+            self._defined = len(EVENTS)
+
+        if self._count:
+            size = self._count * RECORD.size
+            self._file.write(_CHUNK.pack(b"R", size))
+            self._file.write(memoryview(self._buffer)[:size])
+            self._count = 0
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+
+class Traced:
+    """
+    Mixin for wsnsimpy nodes that adds `trace`. Events go to the simulator's
+    `tracer` if one is set, and are printed like `Node.log` if the node's
+    `logging` is on.
+    """
+
+    def trace(self, event_type, a=-1, b=-1):
+        tracer = self.sim.tracer
+        if tracer is not None:
+            tracer.record(self.now, self.id, event_type.code, a, b)
+        if self.logging:
+            print(log_line(self.id, self.now, event_type.format(self.id, a, b)))
+
+
+def read_trace(path):
+    """
+    Read a trace file.
+
+    :param str path: Trace file written by `Tracer`
+    :return: Generator of (time, node, EventType, a, b) tuples
+    """
+    events = {}
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a trace file")
+
+        while True:
+            header = file.read(_CHUNK.size)
+            if not header:
+                break
+            kind, size = _CHUNK.unpack(header)
+            payload = file.read(size)
+
+            if kind == b"D":
+                for code, name, fmt, fields, style, *names in json.loads(payload):
+                    # Traces written before `names` existed have no names
+                    events[code] = EventType(code, name, fmt, fields, style, *names)
+            elif kind == b"R":
+                for time, node, code, a, b in RECORD.iter_unpack(payload):
+                    yield time, node, events[code], a, b
+            else:
+                raise ValueError(f"Unknown chunk {kind!r} in {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a binary trace as a human readable log")
+    parser.add_argument("trace", help="trace file to read")
+    parser.add_argument("--node", type=int, action="append", help="only show events of this node (can be repeated)")
+    parser.add_argument("--event", action="append",
+                        help="only show events whose name starts with this prefix (can be repeated)")
+    parser.add_argument("--no-color", action="store_true", help="do not use ANSI colors")
+    args = parser.parse_args()
+
+    nodes = set(args.node) if args.node else None
+    prefixes = tuple(args.event) if args.event else None
+
+    try:
+        for time, node, event_type, a, b in read_trace(args.trace):
+            if nodes is not None and node not in nodes:
+                continue
+            if prefixes is not None and not event_type.name.startswith(prefixes):
+                continue
+            print(log_line(node, time, event_type.format(node, a, b, color=not args.no_color)))
+    except BrokenPipeError:
+        sys.stderr.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Traffic generators that feed packets to nodes while the simulation runs.
+
+A generator is attached to a source node and runs as a SimPy process that
+creates one packet at a time, so a run can offer millions of packets without
+ever holding more than the ones a node has not sent yet. Nodes accept the
+packets through `offer(dest, length)`.
+
+The per-flow generators all take a `rate` in packets per second:
+
+- `ConstantBitRate`: a packet every `1 / rate` seconds
+- `Poisson`: exponentially distributed gaps with mean `1 / rate`
+- `OnOff`: constant bit rate during on periods, silent during off periods,
+  both with exponentially distributed lengths
+
+`TraceFile` replays the packets of a whole network from a CSV file with the
+columns `time,source,dest,length`, sorted by time.
+"""
+import csv
+import inspect
+from abc import ABC, abstractmethod
+from functools import partial
+from itertools import islice
+
+from Common.rng import TRAFFIC
+
+
+class TrafficGenerator(ABC):
+    """
+    Base class of the per-flow generators. Subclasses implement `gaps`, the
+    times between subsequent packets.
+    """
+
+    def __init__(self, dest, length, start=0, stop=None, count=None):
+        """
+        :param int dest: Destination ID of the packets
+        :param int length: Packet length in bytes
+        :param float start: Simulated time of the first packet
+        :param float stop: Simulated time after which no packets are generated, None to never stop
+        :param int count: Number of packets after which the generator stops, None for no limit
+        """
+        self.dest = dest
+        self.length = length
+        self.start = start
+        self.stop = stop
+        self.count = count
+
+    @abstractmethod
+    def gaps(self, rng):
+        """
+        Seconds before every packet, the first one counted from `start`
+        :param random.Random rng: Random stream of the source node
+        """
+
+    def attach(self, node):
+        """Start generating packets at `node`, returns the SimPy process"""
+        return node.start_process(self._run(node))
+
+    def _run(self, node):
+        if self.start > node.now:
+            yield node.timeout(self.start - node.now)
+
+        for gap in islice(self.gaps(node.sim.rng(TRAFFIC, node.id)), self.count):
+            if self.stop is not None and node.now + gap > self.stop:
+                return
+            if gap > 0:
+                yield node.timeout(gap)
+            node.offer(self.dest, self.length)
+
+
+class ConstantBitRate(TrafficGenerator):
+
+    def __init__(self, dest, length, rate, **kwargs):
+        super().__init__(dest, length, **kwargs)
+        self.rate = rate
+
+    def gaps(self, rng):
+        yield 0
+        interval = 1 / self.rate
+        while True:
+            yield interval
+
+
+class Poisson(TrafficGenerator):
+
+    def __init__(self, dest, length, rate, **kwargs):
+        super().__init__(dest, length, **kwargs)
+        self.rate = rate
+
+    def gaps(self, rng):
+        while True:
+            yield rng.expovariate(self.rate)
+
+
+class OnOff(TrafficGenerator):
+
+    def __init__(self, dest, length, rate, on=1, off=1, **kwargs):
+        """
+        :param float rate: Packets per second during an on period
+        :param float on: Mean length of an on period in seconds
+        :param float off: Mean length of an off period in seconds
+        """
+        super().__init__(dest, length, **kwargs)
+        self.rate = rate
+        self.on = on
+        self.off = off
+
+    def gaps(self, rng):
+        interval = 1 / self.rate
+        gap = 0
+        while True:
+            # Packets at the start of the on period and every interval after it
+            remaining = rng.expovariate(1 / self.on)
+            while remaining > 0:
+                yield gap
+                gap = interval
+                remaining -= interval
+            gap += remaining + rng.expovariate(1 / self.off)
+
+
+GENERATORS = {
+    "cbr": ConstantBitRate,
+    "poisson": Poisson,
+    "onoff": OnOff,
+}
+
+
+class TraceFile:
+    """Replays the packets in a CSV file with the columns time,source,dest,length"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def attach(self, simulator):
+        """Start replaying the file at the nodes of `simulator`, returns the SimPy process"""
+        return simulator.env.process(self._run(simulator))
+
+    def _run(self, simulator):
+        env = simulator.env
+        with open(self.path, newline="") as file:
+            for line, row in enumerate(csv.reader(file), 1):
+                if not row or (line == 1 and not _is_number(row[0])):
+                    continue  # Empty line or header
+
+                time, source, dest, length = float(row[0]), int(row[1]), int(row[2]), int(row[3])
+                if time < env.now:
+                    raise ValueError(f"{self.path}:{line}: packets are not sorted by time")
+                if time > env.now:
+                    yield env.timeout(time - env.now)
+                simulator.nodes[source].offer(dest, length)
+
+
+def _is_number(text):
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def parse_traffic(spec):
+    """
+    Parse a traffic specification like `poisson:rate=5` or
+    `onoff:rate=10,on=2,off=8`, for command line arguments.
+
+    :return: Function that creates a generator for `(dest, length, start=0)`
+    """
+    kind, _, params = spec.partition(":")
+    if kind not in GENERATORS:
+        raise ValueError(f"Unknown traffic generator {kind!r}, possible options: {', '.join(GENERATORS)}")
+
+    generator = GENERATORS[kind]
+    known = _parameters(generator)
+    kwargs = {}
+    for param in filter(None, params.split(",")):
+        key, _, value = param.partition("=")
+        if key not in known:
+            raise ValueError(f"Unknown parameter {key!r} of traffic generator {kind!r},"
+                             f" possible options: {', '.join(sorted(known))}")
+        try:
+            kwargs[key] = int(value) if key == "count" else float(value)
+        except ValueError:
+            raise ValueError(f"Invalid value {value!r} for {key} of traffic generator {kind!r}") from None
+    if "rate" not in kwargs:
+        raise ValueError(f"Traffic generator {kind!r} needs a rate, e.g. {kind}:rate=5")
+    for key in ("rate", "on", "off"):
+        if key in kwargs and kwargs[key] <= 0:
+            raise ValueError(f"The {key} of traffic generator {kind!r} must be positive, got {kwargs[key]:g}")
+
+    return partial(generator, **kwargs)
+
+
+def _parameters(generator):
+    """Names of the parameters a generator class takes besides `dest` and `length`"""
+    names = set()
+    for cls in generator.__mro__:
+        if "__init__" in vars(cls):
+            names.update(name for name, parameter in inspect.signature(cls.__init__).parameters.items()
+                         if parameter.kind is parameter.POSITIONAL_OR_KEYWORD)
+    return names - {"self", "dest", "length"}
@@ -0,0 +1,288 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from math import sqrt
+
+import numpy as np
+
+import config  # noqa: F401, makes the Common package importable
+from BaseStationTopology import BaseStationTopology
+from ExtendedLineTopology import ExtendedLineTopology
+from GridTopology import GridTopology, NODE_SPACING as GRID_NODE_SPACING
+from IsolatedTopology import IsolatedTopology, CLUSTERS
+from LineTopology import LineTopology
+from RandomizedTopology import RandomizedTopology, NUM_NODES as RANDOMIZED_NUM_NODES, GRID_BOUNDS
+from StarTopology import StarTopology
+
+from Scenario import create_simulator
+from Common.rng import TRAFFIC
+from Common.simulator import Simulator
+from Routing.discovery import discovery_summary
+from Routing.main import place_nodes, TERRAIN_SIZE as AODV_TERRAIN_SIZE, UNTIL as AODV_UNTIL
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+SCALES = (10, 100, 1000, 10000)
+SEED = 0
+
+MAC_UNTIL = 60  # simulated second(s), same as the topology demos
+
+
+def build_grid(simulator, num_nodes):
+    # Grow the field instead of packing the nodes closer, so every scale has
+    # the same node density and one sender per 10 nodes like the demo
+    side = max(2, round(sqrt(num_nodes)))
+    bounds = [50, 50, 50 + side * GRID_NODE_SPACING, 50 + side * GRID_NODE_SPACING]
+    return GridTopology(simulator, num_senders=max(1, side * side // 10), grid_bounds=bounds)
+
+
+def build_randomized(simulator, num_nodes):
+    scale = sqrt(num_nodes / RANDOMIZED_NUM_NODES)
+    bounds = [GRID_BOUNDS[0], GRID_BOUNDS[1],
+              GRID_BOUNDS[0] + (GRID_BOUNDS[2] - GRID_BOUNDS[0]) * scale,
+              GRID_BOUNDS[1] + (GRID_BOUNDS[3] - GRID_BOUNDS[1]) * scale]
+    return RandomizedTopology(simulator, num_senders=max(1, num_nodes // 6), num_nodes=num_nodes,
+                              grid_bounds=bounds)
+
+
+def build_isolated(simulator, num_nodes):
+    return IsolatedTopology(simulator, num_nodes_per_cluster=max(2, num_nodes // len(CLUSTERS)))
+
+
+# name -> function building the topology for a number of nodes, None for
+# topologies that only exist at a single size
+MAC_SCENARIOS = {
+    "base-station": (BaseStationTopology, None),
+    "extended-line": (ExtendedLineTopology, None),
+    "grid": (GridTopology, build_grid),
+    "isolated": (IsolatedTopology, build_isolated),
+    "line": (LineTopology, None),
+    "randomized": (RandomizedTopology, build_randomized),
+    "star": (StarTopology, None),
+}
+
+AODV_SCENARIO = "aodv-grid"
+SCENARIOS = sorted(MAC_SCENARIOS) + [AODV_SCENARIO]
+
+
+def setup_mac(scenario, num_nodes, seed, until):
+    simulator = create_simulator(scenario, headless=True, until=until or MAC_UNTIL, seed=seed)
+    topology_class, build = MAC_SCENARIOS[scenario]
+    topology = topology_class(simulator) if build is None else build(simulator, num_nodes)
+    topology.set_nodes()
+    topology.run()
+    return simulator, topology.nodes
+
+
+def setup_aodv(num_nodes, seed, until):
+    simulator = Simulator(
+        until=until or AODV_UNTIL,
+        timescale=0,
+        visual=False,
+        terrain_size=(AODV_TERRAIN_SIZE, AODV_TERRAIN_SIZE),
+        title=AODV_SCENARIO,
+        seed=seed
+    )
+    side = max(2, round(sqrt(num_nodes)))
+    nodes = place_nodes(simulator, side, side)
+
+    # The demo's first route, from the second node to the opposite corner,
+    # plus one random route per 1000 nodes
+    rng = simulator.rng(TRAFFIC)
+    flows = [(1, len(nodes) - 1)] + [tuple(rng.sample(range(len(nodes)), 2)) for _ in range(len(nodes) // 1000)]
+    for source, dest in flows:
+        nodes[source].start_process(nodes[source].start_send_to(dest))
+
+    return simulator, nodes
+
+
+def peak_rss():
+    """Peak resident set size of this process in MiB, None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10)
+
+
+def latency_stats(nodes):
+    latencies = np.concatenate([np.frombuffer(node.latencies, dtype=float) for node in nodes])
+    if len(latencies) == 0:
+        return {"packets": 0, "latency_mean": None, "latency_p50": None, "latency_p95": None, "latency_p99": None}
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]).tolist()
+    return {
+        "packets": len(latencies),
+        "latency_mean": float(latencies.mean()),
+        "latency_p50": p50,
+        "latency_p95": p95,
+        "latency_p99": p99,
+    }
+
+
+def run_case(scenario, num_nodes, seed, until=None):
+    """
+    Run one headless simulation and measure it. Meant to run in a fresh
+    process, so the peak RSS only covers this simulation.
+    """
+    start = time.perf_counter()
+    if scenario == AODV_SCENARIO:
+        simulator, nodes = setup_aodv(num_nodes, seed, until)
+    else:
+        simulator, nodes = setup_mac(scenario, num_nodes, seed, until)
+
+    for node in nodes:
+        node.logging = False
+    setup_time = time.perf_counter() - start
+
+    # Count the SimPy events that are processed
+    env = simulator.env
+    step = env.step
+    events = 0
+
+    def counting_step():
+        nonlocal events
+        events += 1
+        step()
+
+    env.step = counting_step
+
+    start = time.perf_counter()
+    simulator.run()
+    wall_time = time.perf_counter() - start
+
+    row = {
+        "scenario": scenario,
+        "nodes": len(nodes),
+        "seed": seed,
+        "sim_time": simulator.now,
+        "setup_time": setup_time,
+        "wall_time": wall_time,
+        "events": events,
+        "events_per_second": events / wall_time if wall_time > 0 else None,
+        "sim_speed": simulator.now / wall_time if wall_time > 0 else None,
+        "peak_rss_mib": peak_rss(),
+    }
+    row.update(latency_stats(nodes))
+    if scenario == AODV_SCENARIO:
+        # Without a route to the demo flow's destination the run only measured
+        # failing floods, not routing
+        if not nodes[-1].latencies:
+            row["error"] = f"the demo flow to node {len(nodes) - 1} delivered nothing"
+        row.update(discovery_summary(nodes))
+    return row
+
+
+def _run_case(job):
+    return run_case(*job)
+
+
+def cases(scenarios, scales):
+    for scenario in scenarios:
+        if scenario in MAC_SCENARIOS and MAC_SCENARIOS[scenario][1] is None:
+            yield scenario, None
+        else:
+            for num_nodes in scales:
+                yield scenario, num_nodes
+
+
+def benchmark(scenarios=SCENARIOS, scales=SCALES, seed=SEED, until=None, repeat=1, processes=1):
+    """
+    Run every scenario at every scale `repeat` times and yield the fastest run
+    of each case. Every run gets its own process.
+    """
+    jobs = [(scenario, num_nodes, seed, until) for scenario, num_nodes in cases(scenarios, scales)]
+
+    with multiprocessing.Pool(processes, maxtasksperchild=1) as pool:
+        rows = pool.imap(_run_case, [job for job in jobs for _ in range(repeat)])
+        for _ in jobs:
+            yield min((next(rows) for _ in range(repeat)), key=lambda row: row["wall_time"])
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_row(row, baseline=None, file=sys.stderr):
+    line = f"{row['scenario']:>14} {row['nodes']:>6} nodes: {row['events_per_second'] or 0:>10.0f} events/s" \
+           f" {row['sim_speed'] or 0:>10.1f}x realtime"
+    if row["peak_rss_mib"] is not None:
+        line += f" {row['peak_rss_mib']:>8.1f} MiB"
+    if row["latency_p50"] is not None:
+        line += f"  latency p50 {row['latency_p50']:.3f} s p99 {row['latency_p99']:.3f} s"
+    if "rreq_transmissions" in row:
+        line += f"  {row['rreq_transmissions']} RREQs"
+    if baseline is not None and "error" in baseline:
+        line += "  (failed before)"
+    elif baseline is not None and baseline["events_per_second"] and row["events_per_second"]:
+        change = row["events_per_second"] / baseline["events_per_second"] - 1
+        line += f"  ({change:+.1%} events/s)"
+    if "error" in row:
+        line += f"  FAILED: {row['error']}"
+    print(line, file=file)
+
+
+def _parse_scales(text):
+    return [int(scale) for scale in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark headless MACAW and AODV simulations")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append",
+                        help="scenario to run (can be repeated, default: all)")
+    parser.add_argument("--scales", type=_parse_scales, default=SCALES,
+                        help="node counts for the scenarios that can be scaled (default: 10,100,1000,10000)")
+    parser.add_argument("--seed", type=int, default=SEED, help=f"master seed of every run (default: {SEED})")
+    parser.add_argument("--until", type=float, default=None,
+                        help=f"simulated seconds per run (default: {MAC_UNTIL} for MACAW, {AODV_UNTIL} for AODV)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case, the fastest is kept (default: 1)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="number of cases to run in parallel, more than 1 skews the timings (default: 1)")
+    parser.add_argument("--output", default=None,
+                        help="JSON file to write the results to (default: benchmark-<commit>.json)")
+    parser.add_argument("--compare", metavar="JSON", default=None,
+                        help="earlier results to compare the events/second against")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    baseline = {}
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = {(row["scenario"], row["nodes"]): row for row in json.load(file)["results"]}
+
+    results = []
+    for row in benchmark(args.scenario or SCENARIOS, args.scales, args.seed, args.until, args.repeat,
+                         args.processes):
+        print_row(row, baseline.get((row["scenario"], row["nodes"])))
+        results.append(row)
+
+    output = args.output or f"benchmark-{commit}.json"
+    with open(output, "w") as file:
+        json.dump({
+            "commit": commit,
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }, file, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    failed = [row for row in results if "error" in row]
+    if failed:
+        sys.exit(f"{len(failed)} case(s) failed")
+
+
+if __name__ == '__main__':
+    main()
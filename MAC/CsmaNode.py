@@ -0,0 +1,142 @@
+import wsnsimpy.wsnsimpy_tk as wsp
+from config import *
+from Frame import Frame, DATA, ACK
+from MacNode import MacNode, _frame_name
+from Common.profiling import profiled
+from Common.trace import event
+
+# Trace events
+EV_BACKOFF = event("csma.backoff", "Backing off for {slots} slots", ("slots",))
+EV_SEND_DATA = event("csma.send_data", "Send DATA to {target}", ("target",))
+EV_SEND_ACK = event("csma.send_ack", "Send ACK to {target}", ("target",))
+EV_RECV_DATA = event("csma.recv_data", "Got DATA from {sender} with data length {length}", ("sender", "length"))
+EV_RECV_ACK = event("csma.recv_ack", "Received ACK from {sender}", ("sender",))
+EV_NO_ACK = event("csma.no_ack", "No ACK received, retry {retry}", ("retry",))
+EV_DROP = event("csma.drop", "Dropping the packet for {target} after {retries} retries", ("target", "retries"))
+
+
+class CsmaNode(MacNode):
+    """
+    CSMA/CA like the basic access of the 802.11 DCF, without RTS/CTS. Before
+    every DATA a node waits until the medium is idle for DIFS and then counts
+    down a random backoff of up to the contention window in slots, the count
+    is frozen while the medium is busy. The receiver answers with an ACK after
+    SIFS. Without ACK the contention window doubles, up to CW_MAX, and the
+    packet is send again, until it is dropped after `retry_limit` retries.
+    """
+
+    retry_limit = RETRY_LIMIT
+
+    def __init__(self, sim, id, pos):
+        super().__init__(sim, id, pos)
+
+        self._cw = CW_MIN  # Contention window in slots
+        self._packet = None  # Packet waiting for an ACK
+        self._acked = False
+
+    def _label(self):
+        return "Node: " + str(self.id) + "\n" \
+            + "CW: " + str(self._cw) + "\n" \
+            + "Queue: " + str(len(self._data_queue))
+
+    # The packets are send one after the other by a single process, started
+    # when a packet is added or becomes due and ended when none is due.
+    def _schedule_transmission(self):
+        if self._data_queue and not self._transmission_scheduled:
+            self._transmission_scheduled = True
+            self.start_process(self._transmit_queue())
+
+    def _transmit_queue(self):
+        packet = self._data_queue.peek(self.now)
+        while packet is not None:
+            yield from self._transmit(packet)
+            packet = self._data_queue.peek(self.now)
+
+        self._transmission_scheduled = False
+
+    def _get_backoff_slots(self):
+        slots = self._rng.randrange(self._cw)
+        self.trace(EV_BACKOFF, slots)
+        self.backoff_slots[slots] += 1
+        return slots
+
+    def _wait_for_idle(self, duration):
+        # Until no transmission reaches the node for `duration`
+        while True:
+            busy_until = self._channel.busy_until(self.id)
+            if busy_until > self.now:
+                yield self.timeout(busy_until - self.now)
+
+            carrier = self._channel.carrier(self.id)
+            yield carrier | self.timeout(duration)
+            if not carrier.triggered:
+                return
+
+    def _transmit(self, packet):
+        retries = 0
+        slots = self._get_backoff_slots()
+
+        while True:
+            yield from self._wait_for_idle(DIFS)
+
+            # Count the backoff down while the medium stays idle, it is frozen
+            # by the next transmission and resumed after the next DIFS
+            if slots:
+                start = self.now
+                carrier = self._channel.carrier(self.id)
+                yield carrier | self.timeout(slots * CSMA_SLOT_TIME)
+                if carrier.triggered:
+                    slots -= int((self.now - start) / CSMA_SLOT_TIME)
+                    continue
+
+            self._packet = packet
+            self._acked = False
+            self._send_data(packet)
+
+            # wait for the ACK, it starts SIFS after the DATA
+            yield self.timeout((packet.length + DATA_LENGTH["ACK"]) * BYTE_TRANSMISSION_TIME + SIFS + CSMA_SLOT_TIME)
+            self._packet = None
+
+            if self._acked:
+                self._cw = CW_MIN
+                self._data_queue.remove(packet)
+                self._delivered(packet)
+                return
+
+            retries += 1
+            if retries > self.retry_limit:
+                self.trace(EV_DROP, packet.target_id, self.retry_limit)
+                self._cw = CW_MIN
+                self._dropped(packet)
+                return
+
+            self.trace(EV_NO_ACK, retries)
+            self._cw = min(self._cw * 2, CW_MAX)
+            slots = self._get_backoff_slots()
+
+    def _send_data(self, packet):
+        self.trace(EV_SEND_DATA, packet.target_id)
+        self.send(wsp.BROADCAST_ADDR, Frame(DATA, packet.target_id, packet.length, packet=packet))
+
+    def _send_ack(self, target_id):
+        self.trace(EV_SEND_ACK, target_id)
+        self.send(wsp.BROADCAST_ADDR, Frame(ACK, target_id))
+
+    @profiled(_frame_name)
+    def on_receive(self, sender_id, frame):
+        self.receive_counter.record(self.now)
+
+        if frame.target_id != self.id:
+            return
+
+        if frame.type == DATA:
+            # The ACK does not sense the medium, SIFS is shorter than the DIFS
+            # every other node waits
+            self.trace(EV_RECV_DATA, sender_id, frame.data_length)
+            yield self.timeout(SIFS)
+            self._send_ack(sender_id)
+
+        elif frame.type == ACK:
+            if self._packet is not None and self._packet.target_id == sender_id:
+                self.trace(EV_RECV_ACK, sender_id)
+                self._acked = True
@@ -1,43 +1,30 @@
-import threading
-
-from MacawNode import MacawNode
-import wsnsimpy.wsnsimpy_tk as wsp
-
-from Utilization import Utilization
+from Scenario import MACS, parse_args, run_demo, add_flow
 from config import SLOT_TIME
 
 PACKET_SIZE = 256
+TX_RANGE = 100
 
 
 class ExtendedLineTopology:
 
-    def __init__(self):
+    def __init__(self, simulator, packet_size=PACKET_SIZE, tx_range=TX_RANGE, traffic=None, mac="macaw"):
+        self.simulator = simulator
+        self.packet_size = packet_size
+        self.tx_range = tx_range
+        self.traffic = traffic  # traffic generator factory, see Scenario.add_flow
+        self.node_class = MACS[mac]  # MAC protocol of the nodes
         self.nodes = []
 
     def set_nodes(self):
         for x in range(4):
-            self.nodes.append(simulator.add_node(MacawNode, (175 + (100 * x), 200)))
-            self.nodes[x].tx_range = 100
+            self.nodes.append(self.simulator.add_node(self.node_class, (175 + (100 * x), 200)))
+            self.nodes[x].tx_range = self.tx_range
 
     def run(self):
-        for n in range(5):
-            self.nodes[0].add_data(PACKET_SIZE, self.nodes[1])
-            self.nodes[3].add_data(PACKET_SIZE, self.nodes[2], 1)
+        add_flow(self, self.nodes[0], self.nodes[1], packets=5)
+        add_flow(self, self.nodes[3], self.nodes[2], time_offset=1, packets=5)
 
 
 if __name__ == '__main__':
-    simulator = wsp.Simulator(
-        until=60,
-        timescale=SLOT_TIME,
-        visual=True,
-        terrain_size=(650, 650),
-        title="MACAW Extended Line Topology Demo"
-    )
-
-    topology = ExtendedLineTopology()
-    topology.set_nodes()
-    topology.run()
-
-    threading.Thread(target=Utilization, args=(simulator, topology.nodes,)).start()
-
-    simulator.run()
+    args = parse_args("MACAW Extended Line Topology Demo")
+    run_demo("MACAW Extended Line Topology Demo", ExtendedLineTopology, args, timescale=SLOT_TIME)
@@ -0,0 +1,43 @@
+# Frame type codes of the control and data frames, shared by all MAC protocols
+RTS = 0
+CTS = 1
+DS = 2
+DATA = 3
+ACK = 4
+RRTS = 5
+
+FRAME_NAMES = ("RTS", "CTS", "DS", "DATA", "ACK", "RRTS")
+
+
+class Frame:
+    """
+    A MAC frame. One instance is created per transmission and shared by all
+    nodes that receive it, receivers only read it.
+
+    A handshake can carry a burst of DATA frames. The RTS, CTS and DS announce
+    the number of packets in `burst` and their total length in `data_length`.
+    Each DATA has the bit of its position in the burst set in `blocks`, the
+    (block) ACK has the bits of all DATA frames that were received.
+
+    A DATA frame refers to the packet it carries in `packet`. It is only read
+    for the totals of protocols without ACKs, whose receivers account the
+    delivery.
+    """
+
+    __slots__ = ("type", "target_id", "data_length", "backoff", "burst", "blocks", "packet")
+
+    def __init__(self, type, target_id, data_length=-1, burst=1, blocks=1, packet=None):
+        self.type = type
+        self.target_id = target_id
+        self.data_length = data_length
+        self.backoff = 0  # Filled in by the sender when the frame is send
+        self.burst = burst
+        self.blocks = blocks
+        self.packet = packet
+
+    @property
+    def name(self):
+        return FRAME_NAMES[self.type]
+
+    def __repr__(self):
+        return f"<Frame {self.name} to {self.target_id}>"
@@ -1,11 +1,9 @@
-import math
-import random
-import threading
+import numpy as np
 
-from MacawNode import MacawNode
-import wsnsimpy.wsnsimpy_tk as wsp
-
-from Utilization import Utilization
+import config  # noqa: F401, makes the Common package importable
+from Scenario import MACS, parse_args, run_demo, add_flow
+from Common.rng import TRAFFIC
+from Common.topology import grid_positions, receiver_candidates
 
 PACKET_SIZE = 256
 TX_RANGE = 100
@@ -16,50 +14,51 @@ GRID_BOUNDS = [50, 50, 600, 600]
 
 class GridTopology:
 
-    def __init__(self):
+    def __init__(self, simulator, packet_size=PACKET_SIZE, tx_range=TX_RANGE, num_senders=NUM_SENDERS,
+                 node_spacing=NODE_SPACING, grid_bounds=GRID_BOUNDS, traffic=None, mac="macaw"):
+        self.simulator = simulator
+        self.packet_size = packet_size
+        self.tx_range = tx_range
+        self.num_senders = num_senders
+        self.node_spacing = node_spacing
+        self.grid_bounds = grid_bounds
+        self.traffic = traffic  # traffic generator factory, see Scenario.add_flow
+        self.node_class = MACS[mac]  # MAC protocol of the nodes
         self.nodes = []
 
     def set_nodes(self):
-        for x in range(GRID_BOUNDS[0], GRID_BOUNDS[2], NODE_SPACING):
-            for y in range(GRID_BOUNDS[1], GRID_BOUNDS[3], NODE_SPACING):
-                self.nodes.append(simulator.add_node(MacawNode, (x, y)))
+        positions = grid_positions(self.grid_bounds, self.node_spacing)
+
+        for pos in positions.tolist():
+            self.nodes.append(self.simulator.add_node(self.node_class, tuple(pos)))
 
         for node in self.nodes:
-            node.tx_range = TX_RANGE
+            node.tx_range = self.tx_range
+
+        self.receivers = receiver_candidates(positions, self.tx_range)
 
     def get_receiver(self, sender):
-        # Ensure receiver != sender
-        possible_receiver = self.nodes[random.choice([i for i in range(0, len(self.nodes) - 1) if i != sender.id])]
+        # The receivers within range of every node are computed once when the
+        # nodes are placed
+        indptr, indices = self.receivers
+        return self.nodes[self.simulator.rng(TRAFFIC).choice(indices[indptr[sender.id]:indptr[sender.id + 1]])]
 
-        # Ensure receiver is within range of sender (Pythagoras)
-        if math.sqrt((sender.pos[0] - possible_receiver.pos[0]) ** 2 + (sender.pos[1] - possible_receiver.pos[1]) ** 2) > TX_RANGE:
-            return self.get_receiver(sender)
+    def run(self):
+        # Only nodes with at least one other node in range can send
+        senders = np.flatnonzero(np.diff(self.receivers[0])).tolist()
+        if not senders:
+            raise ValueError(f"No node has another node within range {self.tx_range}")
 
-        else:
-            return possible_receiver
+        rng = self.simulator.rng(TRAFFIC)
 
-    def run(self):
-        for cluster in range(NUM_SENDERS):
-            sender = self.nodes[random.randint(0, len(self.nodes) - 1)]
+        for cluster in range(self.num_senders):
+            sender = self.nodes[rng.choice(senders)]
 
             receiver = self.get_receiver(sender)
 
-            sender.add_data(PACKET_SIZE, receiver, time_offset=random.randint(0, int(NUM_SENDERS / 2)))
+            add_flow(self, sender, receiver, time_offset=rng.randint(0, int(self.num_senders / 2)))
 
 
 if __name__ == '__main__':
-    simulator = wsp.Simulator(
-        until=60,
-        timescale=1,
-        visual=True,
-        terrain_size=(650, 650),
-        title="MACAW Grid Topology Demo"
-    )
-
-    topology = GridTopology()
-    topology.set_nodes()
-    topology.run()
-
-    threading.Thread(target=Utilization, args=(simulator, topology.nodes,)).start()
-
-    simulator.run()
+    args = parse_args("MACAW Grid Topology Demo")
+    run_demo("MACAW Grid Topology Demo", GridTopology, args)
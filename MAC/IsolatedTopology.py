@@ -1,12 +1,9 @@
-import random
-import threading
-
-from MacawNode import MacawNode
-import wsnsimpy.wsnsimpy_tk as wsp
-
-from Utilization import Utilization
+import config  # noqa: F401, makes the Common package importable
+from Scenario import MACS, parse_args, run_demo, add_flow
+from Common.rng import TOPOLOGY, TRAFFIC
 
 PACKET_SIZE = 256
+TX_RANGE = 150
 NUM_NODES_PER_CLUSTER = 3
 CLUSTERS = [
     [50, 50, 150, 150],
@@ -18,50 +15,46 @@ CLUSTERS = [
 
 class IsolatedTopology:
 
-    def __init__(self):
+    def __init__(self, simulator, packet_size=PACKET_SIZE, tx_range=TX_RANGE,
+                 num_nodes_per_cluster=NUM_NODES_PER_CLUSTER, traffic=None, mac="macaw"):
+        self.simulator = simulator
+        self.packet_size = packet_size
+        self.tx_range = tx_range
+        self.num_nodes_per_cluster = num_nodes_per_cluster
+        self.traffic = traffic  # traffic generator factory, see Scenario.add_flow
+        self.node_class = MACS[mac]  # MAC protocol of the nodes
         self.nodes = []
 
     def set_nodes(self):
+        rng = self.simulator.rng(TOPOLOGY)
         for cluster in CLUSTERS:
-            for _ in range(NUM_NODES_PER_CLUSTER):
+            for _ in range(self.num_nodes_per_cluster):
                 self.nodes.append(
-                    simulator.add_node(
-                        MacawNode,
+                    self.simulator.add_node(
+                        self.node_class,
                         (
-                            cluster[0] + random.randint(0, cluster[2] - cluster[0]),
-                            cluster[1] + random.randint(0, cluster[3] - cluster[1])
+                            cluster[0] + rng.randint(0, cluster[2] - cluster[0]),
+                            cluster[1] + rng.randint(0, cluster[3] - cluster[1])
                         )
                     )
                 )
 
         for node in self.nodes:
-            node.tx_range = 150
+            node.tx_range = self.tx_range
 
     def run(self):
+        rng = self.simulator.rng(TRAFFIC)
         for cluster in range(len(CLUSTERS)):
-            min_val = cluster * NUM_NODES_PER_CLUSTER
-            max_val = cluster * NUM_NODES_PER_CLUSTER + NUM_NODES_PER_CLUSTER - 1
+            min_val = cluster * self.num_nodes_per_cluster
+            max_val = cluster * self.num_nodes_per_cluster + self.num_nodes_per_cluster - 1
 
-            sender = self.nodes[random.randint(min_val, max_val)]
+            sender = self.nodes[rng.randint(min_val, max_val)]
             # Ensure receiver != sender
-            receiver = self.nodes[random.choice([i for i in range(min_val, max_val) if i != sender.id])]
+            receiver = self.nodes[rng.choice([i for i in range(min_val, max_val + 1) if i != sender.id])]
 
-            sender.add_data(PACKET_SIZE, receiver, time_offset=random.randint(0, 4))
+            add_flow(self, sender, receiver, time_offset=rng.randint(0, 4))
 
 
 if __name__ == '__main__':
-    simulator = wsp.Simulator(
-        until=60,
-        timescale=1,
-        visual=True,
-        terrain_size=(650, 650),
-        title="MACAW Isolated Topology Demo"
-    )
-
-    topology = IsolatedTopology()
-    topology.set_nodes()
-    topology.run()
-
-    threading.Thread(target=Utilization, args=(simulator, topology.nodes,)).start()
-
-    simulator.run()
+    args = parse_args("MACAW Isolated Topology Demo")
+    run_demo("MACAW Isolated Topology Demo", IsolatedTopology, args)
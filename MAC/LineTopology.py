@@ -1,44 +1,32 @@
-import threading
+from Scenario import MACS, parse_args, run_demo, add_flow
 
-from MacawNode import MacawNode
-import wsnsimpy.wsnsimpy_tk as wsp
-
-from Utilization import Utilization
 PACKET_SIZE = 512
+TX_RANGE = 100
 
 
 class LineTopology:
 
-    def __init__(self):
+    def __init__(self, simulator, packet_size=PACKET_SIZE, tx_range=TX_RANGE, traffic=None, mac="macaw"):
+        self.simulator = simulator
+        self.packet_size = packet_size
+        self.tx_range = tx_range
+        self.traffic = traffic  # traffic generator factory, see Scenario.add_flow
+        self.node_class = MACS[mac]  # MAC protocol of the nodes
         self.nodes = []
 
     def set_nodes(self):
         for x in range(3):
-            self.nodes.append(simulator.add_node(MacawNode, (225 + (100 * x), 200)))
-            self.nodes[x].tx_range = 100
+            self.nodes.append(self.simulator.add_node(self.node_class, (225 + (100 * x), 200)))
+            self.nodes[x].tx_range = self.tx_range
 
     def run(self):
         target = self.nodes[2]
-        for n in range(5):
-            self.nodes[1].add_data(PACKET_SIZE, target)
+        add_flow(self, self.nodes[1], target, packets=5)
 
         target = self.nodes[1]
-        self.nodes[0].add_data(PACKET_SIZE, target, time_offset=1)
+        add_flow(self, self.nodes[0], target, time_offset=1)
 
 
 if __name__ == '__main__':
-    simulator = wsp.Simulator(
-        until=60,
-        timescale=1,
-        visual=True,
-        terrain_size=(650, 650),
-        title="MACAW Line Topology Demo"
-    )
-
-    topology = LineTopology()
-    topology.set_nodes()
-    topology.run()
-
-    threading.Thread(target=Utilization, args=(simulator, topology.nodes,)).start()
-
-    simulator.run()
+    args = parse_args("MACAW Line Topology Demo")
+    run_demo("MACAW Line Topology Demo", LineTopology, args)
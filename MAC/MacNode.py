@@ -0,0 +1,153 @@
+from abc import ABC, abstractmethod
+from array import array
+from collections import Counter
+
+import wsnsimpy.wsnsimpy_tk as wsp
+from config import *
+from Frame import DATA
+from PacketQueue import PacketQueue
+from Renderer import TransmissionRenderer
+from Utilization import ThroughputCounter
+from Common.channel import Channel
+from Common.profiling import profiled
+from Common.rng import BACKOFF
+from Common.trace import Traced, event
+
+# Trace events
+EV_COLLISION = event("mac.collision", "ERROR: Collision, lost a frame from {sender}", ("sender",))
+
+
+def _frame_name(address, frame):
+    return frame.name
+
+
+def airtime(frame):
+    """Seconds it takes to transmit `frame`"""
+    if frame.type == DATA:
+        return frame.data_length * BYTE_TRANSMISSION_TIME
+    return DATA_LENGTH[frame.name] * BYTE_TRANSMISSION_TIME
+
+
+class DataPacket:
+    __slots__ = ("length", "target_id", "time_offset", "queued_at")
+
+    def __init__(self, length, target_id, time_offset=0, queued_at=0):
+        self.length = length
+        self.target_id = target_id
+        self.time_offset = time_offset
+        # Time the packet became ready to send, its latency is measured from here
+        self.queued_at = queued_at
+
+
+class MacNode(Traced, wsp.LayeredNode, ABC):
+    """
+    A node running a MAC protocol on the shared channel. This class keeps what
+    all protocols have in common: the queue of data packets, the totals read by
+    the summaries and the transmission of frames. A protocol implements:
+
+    - `_schedule_transmission()`, called whenever a packet is added or becomes
+      due, to start sending the queued packets if the node is idle.
+    - `on_receive(sender_id, frame)`, called by the channel for every intact
+      frame, may be a generator.
+
+    A protocol can override `on_collision(sender_id, frame)` as well.
+    Delivered packets are accounted with `_delivered(packet)`, packets the
+    protocol gives up on with `_dropped(packet)`.
+    """
+
+    # Destinations take turns by deficit round robin with this many bytes per
+    # round, None to send the packets in the order they became due
+    quantum = DRR_QUANTUM
+
+    def __init__(self, sim, id, pos):
+        super().__init__(sim, id, pos)
+
+        self._data_queue = PacketQueue(self.quantum)  # Queue of data packets
+        self._transmission_scheduled = False
+        self._print_info = True
+        self._visual = sim.drawing
+        self._renderer = TransmissionRenderer.of(sim) if self._visual else None
+        self._rng = sim.rng(BACKOFF, id)
+        self._channel = Channel.of(sim)
+
+        self.scene.linestyle('wsnsimpy:data', color=(1, 0, 0), dash=(3, 3))
+
+        # Frames received per bucket of simulated time, read by Utilization
+        self.receive_counter = ThroughputCounter()
+
+        # Totals for the whole run, used for the headless summary
+        self.data_delivered = 0
+        self.bytes_delivered = 0
+        self.collisions = 0
+        self.packets_offered = 0
+        # Packets given up on, e.g. after too many retransmissions
+        self.packets_dropped = 0
+        # Enqueue-to-delivery latency of every delivered packet
+        self.latencies = array("d")
+        # Number of backoffs per backoff length in slots
+        self.backoff_slots = Counter()
+
+    def run(self):
+        self._schedule_transmission()
+
+        # Transmissions are triggered by events, only the node label is still
+        # refreshed periodically and only when it is drawn at all
+        while self._print_info and self._visual:
+            self.scene.nodelabel(self.id, label=self._label())
+            yield self.timeout(0.5)
+
+    def _label(self):
+        return "Node: " + str(self.id) + "\n" \
+            + "Queue: " + str(len(self._data_queue))
+
+    # add data to the queue, data is beeing send when ready
+    def add_data(self, length, target, time_offset=0):
+        # A packet added ahead of its time offset is only queued once it is due
+        queued_at = max(self.now, time_offset)
+        self._data_queue.append(DataPacket(length, target.id, time_offset, queued_at))
+        self.packets_offered += 1
+
+        if time_offset > self.now:
+            self.delayed_exec(time_offset - self.now, self._schedule_transmission)
+        else:
+            self._schedule_transmission()
+
+    # add a packet from a traffic generator (see Common.traffic) to the queue
+    def offer(self, dest, length):
+        self.add_data(length, self.sim.nodes[dest])
+
+    @abstractmethod
+    def _schedule_transmission(self):
+        """Start sending the queued packets if the node is idle"""
+
+    def _delivered(self, packet):
+        self.data_delivered += 1
+        self.bytes_delivered += packet.length
+        self.latencies.append(self.now - packet.queued_at)
+
+    def _dropped(self, packet):
+        self._data_queue.remove(packet)
+        self.packets_dropped += 1
+
+    @profiled(_frame_name)
+    def send(self, dest, frame):
+        if self._visual:
+            self._draw_transmission(frame)
+
+        # The MAC protocol is the MAC layer, the frame goes straight onto the
+        # shared medium instead of through wsnsimpy's default MAC and PHY layers
+        self._channel.transmit(self, wsp.BROADCAST_ADDR, airtime(frame), frame)
+
+    @profiled()
+    def _draw_transmission(self, frame):
+        line_style = "wsnsimpy:data" if frame.type == DATA else "wsnsimpy:tx"
+        self._renderer.add(self.pos, self.tx_range, line_style, airtime(frame))
+
+    @abstractmethod
+    def on_receive(self, sender_id, frame):
+        """Called by the channel for every intact frame, may be a generator"""
+
+    def on_collision(self, sender_id, frame):
+        """Called by the channel for a frame that overlapped another one at this node"""
+        self.trace(EV_COLLISION, sender_id)
+        self.collisions += 1
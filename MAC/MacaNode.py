@@ -0,0 +1,171 @@
+import wsnsimpy.wsnsimpy_tk as wsp
+from config import *
+from Frame import Frame, RTS, CTS, DATA
+from MacNode import MacNode, _frame_name
+from Common.profiling import profiled
+from Common.trace import event
+
+IDLE_STATE = 0
+# Send a RTS, waiting for the CTS
+CONTEND_STATE = 1
+BACKOFF_STATE = 2
+SENDING_STATE = 3
+# Send a CTS, waiting for the DATA
+WAIT_FOR_DATA_STATE = 4
+
+# Trace events
+EV_BACKOFF = event("maca.backoff", "Backing off for {slots} slots", ("slots",))
+EV_SEND_RTS = event("maca.send_rts", "Send RTS to {target}", ("target",))
+EV_SEND_CTS = event("maca.send_cts", "Send CTS to {target}", ("target",))
+EV_SEND_DATA = event("maca.send_data", "Send DATA to {target}", ("target",))
+EV_RECV_RTS = event("maca.recv_rts", "Received RTS from {sender}", ("sender",))
+EV_OVERHEAR_RTS = event("maca.overhear_rts", "\"Received a RTS from {sender}\"", ("sender",))
+EV_RECV_CTS = event("maca.recv_cts", "Received CTS from {sender}", ("sender",))
+EV_OVERHEAR_CTS = event("maca.overhear_cts", "\"Received CTS from {sender}\"", ("sender",))
+EV_RECV_DATA = event("maca.recv_data", "Got DATA from {sender} with data length {length}", ("sender", "length"))
+EV_NO_DATA = event("maca.no_data", "No data received from sender, returning to idle state")
+
+
+class MacaNode(MacNode):
+    """
+    MACA as proposed by Karn, the protocol MACAW extends: a RTS/CTS handshake
+    followed by the DATA, without DS, ACK or RRTS. Nodes that overhear a RTS
+    keep quiet until the CTS could have been send, nodes that overhear a CTS
+    until the DATA is received. After a RTS without CTS the backoff doubles
+    (binary exponential backoff), after a CTS it is reset to the minimum.
+
+    Without ACKs the sender does not know whether the DATA arrived, it is
+    never send again. Deliveries are accounted by the receiver.
+    """
+
+    max_backoff_time = MAX_BACKOFF_TIME
+
+    def __init__(self, sim, id, pos):
+        super().__init__(sim, id, pos)
+
+        self._state = IDLE_STATE
+        self._backoff = MIN_BACKOFF_TIME  # # slots
+        self._quiet_until = 0  # Overheard exchanges of neighbors last until then
+        self._packet = None  # Packet of the ongoing RTS/CTS exchange
+        self._exchange = 0  # Number of the RTS answered last, to expire its timer only
+
+    def _label(self):
+        return "Node: " + str(self.id) + "\n" \
+            + "BO: " + str(self._backoff) + "\n" \
+            + "Queue: " + str(len(self._data_queue))
+
+    def _set_idle(self):
+        self._state = IDLE_STATE
+        self._schedule_transmission()
+
+    def _schedule_transmission(self):
+        if self._state == IDLE_STATE and self._data_queue and not self._transmission_scheduled:
+            self._transmission_scheduled = True
+            self.start_process(self._start_transmission())
+
+    def _quiet(self, duration):
+        self._quiet_until = max(self._quiet_until, self.now + duration)
+
+    def _get_backoff_time(self):
+        backoff_time = round(self._rng.uniform(1, self._backoff))
+        self.trace(EV_BACKOFF, backoff_time)
+        self.backoff_slots[backoff_time] += 1
+        return backoff_time * SLOT_TIME
+
+    def _start_transmission(self):
+        while self.now < self._quiet_until:
+            yield self.timeout(self._quiet_until - self.now)
+
+        self._transmission_scheduled = False
+        if self._state != IDLE_STATE:
+            return
+
+        packet = self._data_queue.peek(self.now)
+        if packet is None:
+            return
+
+        self._packet = packet
+        self._state = CONTEND_STATE
+        self._send_rts(packet.target_id, packet.length)
+
+        # wait for a CTS packet to arrive.
+        yield self.timeout(SLOT_TIME * 3)
+
+        # the state is still CONTEND_STATE a CTS is not arrived
+        if self._state == CONTEND_STATE and self._packet is packet:
+            self._state = BACKOFF_STATE
+            yield self.timeout(self._get_backoff_time())
+            self._backoff = min(self._backoff * 2, self.max_backoff_time)
+
+            # if a RTS was answered during backoff, we should not go into
+            # idle mode
+            if self._state == BACKOFF_STATE:
+                self._set_idle()
+
+    def _send_rts(self, target_id, data_length):
+        self.trace(EV_SEND_RTS, target_id)
+        self.send(wsp.BROADCAST_ADDR, Frame(RTS, target_id, data_length))
+
+    def _send_cts(self, target_id, data_length):
+        self.trace(EV_SEND_CTS, target_id)
+        self.send(wsp.BROADCAST_ADDR, Frame(CTS, target_id, data_length))
+
+    def _send_data(self, packet):
+        self.trace(EV_SEND_DATA, packet.target_id)
+        self.send(wsp.BROADCAST_ADDR, Frame(DATA, packet.target_id, packet.length, packet=packet))
+
+    @profiled(_frame_name)
+    def on_receive(self, sender_id, frame):
+        self.receive_counter.record(self.now)
+
+        msg = frame.type
+        target_id = frame.target_id
+        data_length = frame.data_length
+
+        if msg == RTS:
+            if self.id == target_id:
+                if self._state in (IDLE_STATE, BACKOFF_STATE) and self.now >= self._quiet_until:
+                    self.trace(EV_RECV_RTS, sender_id)
+                    self._state = WAIT_FOR_DATA_STATE
+                    self._exchange += 1
+                    exchange = self._exchange
+                    self._send_cts(sender_id, data_length)
+
+                    # The DATA follows the CTS right away
+                    yield self.timeout(SLOT_TIME + data_length * BYTE_TRANSMISSION_TIME + SLOT_TIME)
+                    if self._state == WAIT_FOR_DATA_STATE and self._exchange == exchange:
+                        self.trace(EV_NO_DATA)
+                        self._set_idle()
+            else:
+                # Give the target the time to answer with a CTS
+                self.trace(EV_OVERHEAR_RTS, sender_id)
+                self._quiet(SLOT_TIME * 2)
+
+        elif msg == CTS:
+            if self.id == target_id:
+                if self._state == CONTEND_STATE:
+                    self.trace(EV_RECV_CTS, sender_id)
+                    self._state = SENDING_STATE
+                    self._backoff = MIN_BACKOFF_TIME
+
+                    # Nobody tells whether the DATA arrives, the packet is done
+                    # once it is send
+                    packet = self._packet
+                    self._packet = None
+                    self._data_queue.remove(packet)
+                    self._send_data(packet)
+                    yield self.timeout(packet.length * BYTE_TRANSMISSION_TIME)
+                    self._set_idle()
+            else:
+                # Avoid collision by waiting until data transmission is done
+                self.trace(EV_OVERHEAR_CTS, sender_id)
+                self._quiet(data_length * BYTE_TRANSMISSION_TIME + SLOT_TIME)
+
+        elif msg == DATA:
+            # we don't have carrier sensing, so we do not do anything
+            # with a data packet that is not meant for us
+            if self.id == target_id:
+                self.trace(EV_RECV_DATA, sender_id, data_length)
+                self._delivered(frame.packet)
+                if self._state == WAIT_FOR_DATA_STATE:
+                    self._set_idle()
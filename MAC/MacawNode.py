@@ -1,7 +1,9 @@
 import wsnsimpy.wsnsimpy_tk as wsp
-import random
-
 from config import *
+from Frame import Frame, RTS, CTS, DS, DATA, ACK, RRTS
+from MacNode import MacNode, _frame_name
+from Common.profiling import profiled
+from Common.trace import event
 
 IDLE_STATE = 0
 SENDING_STATE = 1
@@ -16,26 +18,49 @@ WAIT_STATE = 4
 WAIT_FOR_DATA = 5
 RTS_RECEIVED_STATE = 6
 
+# Send the ACK for the received DATA. Only becomes idle once it is
+# transmitted completely, our own RTS would collide with it otherwise
+SENDING_ACK_STATE = 7
+
+# Trace events
+EV_BACKOFF = event("mac.backoff", "Backing off for {slots} slots", ("slots",))
+EV_SEND_RTS = event("mac.send_rts", "Send RTS to {target} for {count} packet(s)", ("target", "count"))
+EV_SEND_RRTS = event("mac.send_rrts", "Send RRTS to {target}", ("target",))
+EV_SEND_CTS = event("mac.send_cts", "Send CTS to {target}", ("target",))
+EV_SEND_DS = event("mac.send_ds", "Send DS to {target}", ("target",))
+EV_SEND_DATA = event("mac.send_data", "Send DATA to {target}", ("target",))
+EV_SEND_ACK = event("mac.send_ack", "Send ACK to {target}", ("target",))
+EV_RECV_RTS = event("mac.recv_rts", "Received RTS from {sender}", ("sender",))
+EV_NO_DATA = event("mac.no_data", "No data received from sender, returning to idle state")
+EV_RTS_IGNORED = event("mac.rts_ignored", "We already received a RTS from someone else")
+EV_OVERHEAR_RTS = event("mac.overhear_rts", "\"Received a RTS from {sender}\"", ("sender",))
+EV_RECV_CTS = event("mac.recv_cts", "Received CTS from {sender}", ("sender",))
+EV_NO_ACK = event("mac.no_ack", "No ACK received, trying again when possible")
+EV_OVERHEAR_CTS = event("mac.overhear_cts", "\"Received CTS from {sender}\"", ("sender",))
+EV_RECV_DS = event("mac.recv_ds", "Received DS from {sender}", ("sender",))
+EV_RECV_DATA = event("mac.recv_data", "Got DATA from {sender} with data length {length}", ("sender", "length"))
+EV_LATE_ACK = event("mac.late_ack", "Ignoring late ACK from {sender}", ("sender",))
+EV_RECV_ACK = event("mac.recv_ack", "Received ACK from {sender} for {count} packet(s)", ("sender", "count"))
+
+
+class MacawNode(MacNode):
+    max_backoff_time = MAX_BACKOFF_TIME
+    # Packets for the same target send after a single RTS/CTS/DS, at most 64
+    # (the bits of the block ACK), and their total length in bytes (None for
+    # no limit)
+    max_burst = 1
+    max_burst_bytes = None
 
-def delay():
-    return random.uniform(1, 2)
-
-
-class DataPacket:
-    def __init__(self, length, target_id, time_offset=0):
-        self.length = length
-        self.target_id = target_id
-        self.time_offset = time_offset
-
-
-class MacawNode(wsp.LayeredNode):
     def __init__(self, sim, id, pos):
         super().__init__(sim, id, pos)
 
         self._state = IDLE_STATE
-        self._data_queue = []  # Queue of data packets
-        self._backoff_time = MIN_BACKOFF_TIME
-        self._print_info = True
+        self._current_burst = None  # Packets of the ongoing RTS/CTS exchange
+        self._blocks_received = 0  # Bits of the DATA frames received since the last DS
+        # Backoff in slots per destination, like the per-stream backoff of
+        # MACAW, so a congested destination does not slow down the others.
+        # Only the destinations above MIN_BACKOFF_TIME are stored.
+        self._backoff = {}
 
         # Store node ids that are bussy transmitting data. It is useless to send
         # a RTS to that node. Set when a DS is received
@@ -46,60 +71,75 @@ class MacawNode(wsp.LayeredNode):
         # these nodes
         self._received_rts = set()
 
-        self.scene.linestyle('wsnsimpy:data', color=(1, 0, 0), dash=(3, 3))
-
         # if this value exceeds CTS_TIMEOUT a cts is not received in time
         self._cts_timeout_counter = 0
 
-        self.packets_received = 0
-
-    def run(self):
-        while True:
-            if len(self._data_queue) > 0 and self._state == IDLE_STATE:
-                self.start_process(self._start_transmission())
-
-            if self._print_info:
-                info = "Node: " + str(self.id) + "\n" \
-                    + "BO: " + str(self._backoff_time) + "\n" \
-                    + "Queue: " + str(len(self._data_queue))
+    def _label(self):
+        return "Node: " + str(self.id) + "\n" \
+            + "BO: " + str(max(self._backoff.values(), default=MIN_BACKOFF_TIME)) + "\n" \
+            + "Queue: " + str(len(self._data_queue))
 
-                self.scene.nodelabel(self.id, label=info)
-
-            # allow others to execute, because python somehow cannot do things i
-            # in parallel -.-'
-            yield self.timeout(0.5)
-
-    # add data to the queue, data is beeing send when ready
-    def add_data(self, length, target, time_offset=0):
-        self._data_queue.append(DataPacket(length, target.id, time_offset))
+    def _set_idle(self):
+        self._state = IDLE_STATE
+        self._schedule_transmission()
+
+    # Try to send the next packet as soon as the node is idle. Called whenever
+    # the node becomes idle, a packet is added or becomes due, or a target is
+    # no longer bussy.
+    def _schedule_transmission(self):
+        if self._state == IDLE_STATE and self._data_queue and not self._transmission_scheduled:
+            self._transmission_scheduled = True
+            self.start_process(self._start_transmission())
+
+    def _backoff_of(self, target_id):
+        return self._backoff.get(target_id, MIN_BACKOFF_TIME)
+
+    def _set_backoff(self, target_id, backoff):
+        if backoff <= MIN_BACKOFF_TIME:
+            self._backoff.pop(target_id, None)
+        else:
+            self._backoff[target_id] = backoff
 
-    def _get_backoff_time(self):
-        backoff_time = round(random.uniform(1, self._backoff_time))
-        self.log(f"Backing off for {backoff_time} slots")
+    def _get_backoff_time(self, target_id):
+        backoff_time = round(self._rng.uniform(1, self._backoff_of(target_id)))
+        self.trace(EV_BACKOFF, backoff_time)
+        self.backoff_slots[backoff_time] += 1
         return backoff_time * SLOT_TIME
     # use MILD algorithm to increase backoftime F_inc(x) = MAX[1.5x, BO_max]
 
-    def _inc_backoff(self):
-        self._backoff_time = round(self._backoff_time * 1.5)
-        if self._backoff_time > MAX_BACKOFF_TIME:
-            self._backoff_time = MAX_BACKOFF_TIME
+    def _inc_backoff(self, target_id):
+        self._set_backoff(target_id, min(round(self._backoff_of(target_id) * 1.5), self.max_backoff_time))
 
     # use MILD algorithm to decrease backoftime F_inc(x) = MAX[x-1, BO_max]
-    def _dec_backoff(self):
-        self._backoff_time -= 1
-        if self._backoff_time < MIN_BACKOFF_TIME:
-            self._backoff_time = MIN_BACKOFF_TIME
-
-    def _start_transmission(self):
-        if len(self._data_queue) > 0:
-            packet = self._data_queue[0]
-            current_slot = self.now
+    def _dec_backoff(self, target_id):
+        self._set_backoff(target_id, self._backoff_of(target_id) - 1)
+
+    def _start_transmission(self, target_id=None):
+        current_slot = self.now
+        if target_id is None:
+            self._transmission_scheduled = False
+            if self._state != IDLE_STATE:
+                return
+
+            # The earliest packet that is due and whose target is not bussy
+            packet = self._data_queue.peek(current_slot, self._nodes_bussy)
+        else:
+            # Answering a RRTS, unless another RRTS got us out of the backoff
+            # at the same time already
+            if self._state != BACKOFF_STATE:
+                return
+            packet = self._data_queue.head(target_id)
+
+        if packet is not None:
             # Check if it is time for the packet to be send and that the node
             # to send it to is not bussy.
             if packet.time_offset <= current_slot \
                     and packet.target_id not in self._nodes_bussy:
+                burst = self._data_queue.burst(packet.target_id, current_slot, min(self.max_burst, 64),
+                                               self.max_burst_bytes)
+                self._current_burst = burst
                 self._state = WAIT_STATE
-                self._send_rts(packet.target_id, packet.length)
+                self._send_rts(packet.target_id, sum(packet.length for packet in burst), len(burst))
 
                 # wait for a CTS packet to arrive.
                 yield self.timeout(SLOT_TIME * 3)
@@ -107,73 +147,56 @@ class MacawNode(wsp.LayeredNode):
                 # the state is still WAIT_FOR_CTS_STATE a CTS is not arrived
                 if self._state == WAIT_STATE:
                     self._state = BACKOFF_STATE
-                    backoff_time = self._get_backoff_time()
+                    backoff_time = self._get_backoff_time(packet.target_id)
                     yield self.timeout(backoff_time)
-                    self._inc_backoff()
+                    self._inc_backoff(packet.target_id)
 
                     # if DS is received during backoff, we should not go into
                     # idle mode
                     if self._state == BACKOFF_STATE:
-                        self._state = IDLE_STATE
-
-    def send(self, dest, *args, **kwargs):
-        circles = []
-        msg = kwargs['msg']
-
-        kwargs['backoff'] = self._backoff_time
-        # time the packet need to send the data
-        if msg == "DATA":
-            radius_time = kwargs['data_length'] * BYTE_TRANSMISSION_TIME
-            line_style = "wsnsimpy:data"
+                        self._set_idle()
 
-        else:
-            radius_time = DATA_LENGTH[msg] * BYTE_TRANSMISSION_TIME
-            line_style = "wsnsimpy:tx"
-
-        for circle_diam in range(0, self.tx_range + TX_CIRCLE_DELTA, TX_CIRCLE_DELTA):
-            circle = self.scene.circle(
-                self.pos[0], self.pos[1], circle_diam, line=line_style)
-            circles.append(circle)
-
-        super().send(dest, *args, **kwargs)
-
-        self.delayed_exec(radius_time, self._clear_circles, circles)
+    def send(self, dest, frame):
+        frame.backoff = self._backoff_of(frame.target_id)
+        super().send(dest, frame)
 
-    def _clear_circles(self, circles):
-        for circle in circles:
-            self.scene.delshape(circle)
-
-    def _send_rts(self, target_id, data_length):
-        self.log(f"Send RTS to {target_id}")
-        self.send(wsp.BROADCAST_ADDR, msg='RTS', target_id=target_id, data_length=data_length)
+    def _send_rts(self, target_id, data_length, burst):
+        self.trace(EV_SEND_RTS, target_id, burst)
+        self.send(wsp.BROADCAST_ADDR, Frame(RTS, target_id, data_length, burst))
 
     def _send_rrts(self, target_id):
-        self.log(f"Send RRTS to {target_id}")
-        self.send(wsp.BROADCAST_ADDR, msg='RRTS',
-                  target_id=target_id)
+        self.trace(EV_SEND_RRTS, target_id)
+        self.send(wsp.BROADCAST_ADDR, Frame(RRTS, target_id))
 
-    def _send_cts(self, target_id, data_length):
-        self.log(f"Send CTS to {target_id}")
-        self.send(wsp.BROADCAST_ADDR, msg='CTS', target_id=target_id, data_length=data_length)
+    def _send_cts(self, target_id, data_length, burst):
+        self.trace(EV_SEND_CTS, target_id)
+        self.send(wsp.BROADCAST_ADDR, Frame(CTS, target_id, data_length, burst))
 
     def _send_ds(self):
-        if len(self._data_queue) > 0:
+        if self._current_burst is not None:
             self._state = SENDING_STATE
-            packet = self._data_queue[0]
-            self.log(f"Send DS to {packet.target_id}")
-            self.send(wsp.BROADCAST_ADDR, msg='DS',
-                      target_id=packet.target_id, data_length=packet.length)
+            burst = self._current_burst
+            target_id = burst[0].target_id
+            self.trace(EV_SEND_DS, target_id)
+            self.send(wsp.BROADCAST_ADDR, Frame(DS, target_id, sum(packet.length for packet in burst), len(burst)))
 
-    def _send_data(self):
-        if len(self._data_queue) > 0:
+    def _send_data(self, position):
+        if self._current_burst is not None:
             self._state = SENDING_STATE
-            packet = self._data_queue[0]
-            self.log(f"Send DATA to {packet.target_id}")
-            self.send(wsp.BROADCAST_ADDR, msg='DATA', target_id=packet.target_id, data_length=packet.length)
+            burst = self._current_burst
+            packet = burst[position]
+            self.trace(EV_SEND_DATA, packet.target_id)
+            self.send(wsp.BROADCAST_ADDR, Frame(DATA, packet.target_id, packet.length, len(burst), 1 << position))
+
+    def _send_ack(self, target_id, blocks=1):
+        self.trace(EV_SEND_ACK, target_id)
+        self.send(wsp.BROADCAST_ADDR, Frame(ACK, target_id, blocks=blocks))
 
-    def _send_ack(self, target_id):
-        self.log(f"Send ACK to {target_id}")
-        self.send(wsp.BROADCAST_ADDR, msg='ACK', target_id=target_id)
+    def _acknowledge(self, target_id, blocks):
+        self._state = SENDING_ACK_STATE
+        self._send_ack(target_id, blocks)
+        yield self.timeout(DATA_LENGTH["ACK"] * BYTE_TRANSMISSION_TIME)
+        self._set_idle()
 
     # def _send_rrts(self):
     #    if self._rrts_target is not None:
@@ -181,52 +204,46 @@ class MacawNode(wsp.LayeredNode):
     #        self.send(wsp.BROADCAST_ADDR, msg='RRTS', target=self._rrts_target)
     #        self._rrts_target = None
 
-    def on_receive(self, sender_id, msg, **kwargs):
-        self.packets_received += 1
-
-        target_id = kwargs['target_id']
-        data_length = -1
-
-        if 'data_length' in kwargs:
-            data_length = kwargs['data_length']
+    @profiled(_frame_name)
+    def on_receive(self, sender_id, frame):
+        self.receive_counter.record(self.now)
 
-        if 'backoff' in kwargs:
-            self._backoff_time = kwargs['backoff']
+        msg = frame.type
+        target_id = frame.target_id
+        data_length = frame.data_length
 
-        # Detect collisions
-        if self._state == RECEIVING_STATE and msg != "DATA":
-            self.log(f"ERROR: Collision detected while receiving data")
+        # Copy the backoff of the stream the frame belongs to, the congestion
+        # it reports is around its sender and its target only
+        self._set_backoff(sender_id, frame.backoff)
+        if target_id != self.id:
+            self._set_backoff(target_id, frame.backoff)
 
         ################
         # Received RTS #
         ################
-        if msg == 'RTS':
+        if msg == RTS:
             # self.scene.addlink(sender, self.id, "parent")
 
-            # Simulate the time a RTS packets takes to receive the node
-            yield self.timeout(BYTE_TRANSMISSION_TIME * DATA_LENGTH["RTS"])
-
             if self.id == target_id:
                 if self._state == IDLE_STATE:
 
                     # Cannot send any other RTS if already send one
                     self._state = RTS_RECEIVED_STATE
-                    self.log(f"Received RTS from {sender_id}")
+                    self.trace(EV_RECV_RTS, sender_id)
                     # self.scene.clearlinks()
 
-                    self._send_cts(sender_id, data_length)
+                    self._send_cts(sender_id, data_length, frame.burst)
 
                     yield self.timeout(SLOT_TIME * 3)
 
                     # If the state is not update to RECEIVING_STATE something went
                     # wrong and we should reset to IDLE state
                     if self._state == RTS_RECEIVED_STATE:
-                        self.log(
-                            f"No data received from sender, returning to idle state")
-                        self._state = IDLE_STATE
+                        self.trace(EV_NO_DATA)
+                        self._set_idle()
 
                 elif self._state == RTS_RECEIVED_STATE:
-                    self.log(f"We already received a RTS from someone else")
+                    self.trace(EV_RTS_IGNORED)
 
                 elif self._state == WAIT_FOR_DATA:
                     # store sender_id to received_rts list to send a RRTS to alteron
@@ -234,7 +251,7 @@ class MacawNode(wsp.LayeredNode):
 
             # RTS is not meant for us we should wait and the the reiver time to send a CTS (1 time slot)
             elif self.id != target_id:
-                self.log(f"\"Received a RTS from {sender_id}\"")
+                self.trace(EV_OVERHEAR_RTS, sender_id)
                 # Allow others to receive the CTS of this RTC message
                 if self._state == IDLE_STATE:
                     self._state = WAIT_STATE
@@ -242,99 +259,124 @@ class MacawNode(wsp.LayeredNode):
                     # make sure a CTS for someone else has not arrived in
                     # the meaintime
                     if(self._state == WAIT_STATE):
-                        self._state = IDLE_STATE
+                        self._set_idle()
 
         #################
         # Received RRTS #
         #################
-        elif msg == "RRTS":
+        elif msg == RRTS:
             if self._state == BACKOFF_STATE:
-                if(self._data_queue[0].target_id == sender_id):
-                    self.start_process(self._start_transmission())
+                if self._data_queue.head(sender_id) is not None:
+                    self.start_process(self._start_transmission(sender_id))
 
         ################
         # Received CTS #
         ################
-        elif msg == 'CTS':
+        elif msg == CTS:
             if self.id == target_id:
-                # Simulate the time a CTS packets takes to receive the node
-                yield self.timeout(BYTE_TRANSMISSION_TIME * DATA_LENGTH["RTS"])
-                self._dec_backoff()
-                self.log(f"Received CTS from {sender_id}")
+                self._dec_backoff(sender_id)
+                self.trace(EV_RECV_CTS, sender_id)
                 self._state = SENDING_STATE
 
                 self._send_ds()
-                # If we do not add a small delay here, the simulator sees a
-                # collision between the DS and DATA packet somehow.
-                yield self.timeout(0.1)
-                # We can send data now #lifegoals
-                self._send_data()
+                # The DATA would collide with our own DS if it started before
+                # the DS is transmitted completely
+                yield self.timeout(DATA_LENGTH["DS"] * BYTE_TRANSMISSION_TIME)
+                # We can send data now #lifegoals, the DATA frames of a burst
+                # back to back
+                for position, packet in enumerate(self._current_burst or ()):
+                    self._send_data(position)
+                    yield self.timeout(packet.length * BYTE_TRANSMISSION_TIME)
 
                 # Wait for ACK
-                yield self.timeout(data_length * BYTE_TRANSMISSION_TIME)
                 yield self.timeout(DATA_LENGTH["ACK"] * BYTE_TRANSMISSION_TIME)
                 yield self.timeout(SLOT_TIME)
 
                 # If still in sending state, we did not receive a ACK and should try it again
                 if self._state == SENDING_STATE:
-                    self.log(f"No ACK received, trying again when possible")
-                    self._state = IDLE_STATE
+                    self.trace(EV_NO_ACK)
+                    self._set_idle()
 
             # Message is not meant for us we should wait until data transfer is finished
             else:
-                self.log(f"\"Received CTS from {sender_id}\"")
+                self.trace(EV_OVERHEAR_CTS, sender_id)
                 # Avoid collision by waiting until data transmission is done
                 self._state = WAIT_FOR_DATA
                 yield self.timeout(DATA_LENGTH["DS"] * BYTE_TRANSMISSION_TIME)
                 yield self.timeout(data_length * BYTE_TRANSMISSION_TIME)
                 yield self.timeout(DATA_LENGTH["ACK"] * BYTE_TRANSMISSION_TIME)
-                self._state = IDLE_STATE
+                # and one more slot, so our next RTS cannot clip the tail of
+                # the ACK at the sender
+                yield self.timeout(SLOT_TIME)
+                self._set_idle()
 
         ###############
         # Received DS #
         ###############
-        elif msg == 'DS':
+        elif msg == DS:
             if self.id != target_id:
-                # Simulate the time a DS packets takes to receive the node
-                yield self.timeout(BYTE_TRANSMISSION_TIME * DATA_LENGTH["DS"])
-                self.log(f"Received DS from {sender_id}")
+                self.trace(EV_RECV_DS, sender_id)
 
                 # No need to set the state to waiting because you can still send
                 # RTSs to other nodes
                 self._nodes_bussy.add(sender_id)
-                yield self.timeout(DATA_LENGTH["DS"] * BYTE_TRANSMISSION_TIME)
                 yield self.timeout(data_length * BYTE_TRANSMISSION_TIME)
-                # yield self.timeout(DATA_LENGTH["ACK"] * BYTE_TRANSMISSION_TIME)
-                self._nodes_bussy.remove(sender_id)
+                yield self.timeout(DATA_LENGTH["ACK"] * BYTE_TRANSMISSION_TIME + SLOT_TIME)
+                self._nodes_bussy.discard(sender_id)
+                self._schedule_transmission()
+
+            # The DATA starts right after the DS. If the last DATA of the
+            # burst does not arrive it was lost in a collision, the ones that
+            # did arrive are still acknowledged
+            elif self._state == RTS_RECEIVED_STATE:
+                self._state = RECEIVING_STATE
+                self._blocks_received = 0
+                yield self.timeout((data_length + 1) * BYTE_TRANSMISSION_TIME)
+                if self._state == RECEIVING_STATE:
+                    if self._blocks_received:
+                        yield from self._acknowledge(sender_id, self._blocks_received)
+                    else:
+                        self.trace(EV_NO_DATA)
+                        self._set_idle()
 
         #################
         # Received DATA #
         #################
-        elif msg == 'DATA':
+        elif msg == DATA:
             # we don't have carrier sensing, so we do not do anything
             # with a data packet that is not meant for us
             if self.id == target_id:
+                self.trace(EV_RECV_DATA, sender_id, data_length)
+                self._blocks_received |= frame.blocks
 
-                # Simulate time it takes to transmit data
-                self._state = RECEIVING_STATE
-                yield self.timeout(BYTE_TRANSMISSION_TIME * data_length)
-                self.log(f"Got DATA from {sender_id} with data length {data_length}")
-
-                self._state = IDLE_STATE
-                self._send_ack(sender_id)
+                # (Block) ACK after the last DATA of the burst
+                if frame.blocks >> (frame.burst - 1):
+                    blocks = self._blocks_received
+                    self._blocks_received = 0
+                    yield from self._acknowledge(sender_id, blocks)
 
         ################
         # Received ACK #
         ################
-        elif msg == 'ACK':
+        elif msg == ACK:
             if self.id == target_id:
-                # Simulate time it takes to transmit ACK message
-                yield self.timeout(BYTE_TRANSMISSION_TIME * DATA_LENGTH["ACK"])
-                # we can finally remove the data packet from the queue yeah
-                self.log(f"Received ACK from {sender_id}")
-                self._data_queue.pop(0)
-                self._state = IDLE_STATE
-                self._backoff_time = MIN_BACKOFF_TIME
+                # A late ACK for a DATA packet we already gave up on, the packet
+                # is still in the queue and will be send again
+                if self._state != SENDING_STATE:
+                    self.trace(EV_LATE_ACK, sender_id)
+                    return
+
+                # we can finally remove the data packets from the queue yeah,
+                # the ones that were not received are send again
+                acked = [packet for position, packet in enumerate(self._current_burst)
+                         if frame.blocks >> position & 1]
+                self.trace(EV_RECV_ACK, sender_id, len(acked))
+                for packet in acked:
+                    self._data_queue.remove(packet)
+                    self._delivered(packet)
+                self._current_burst = None
+                self._set_idle()
+                self._set_backoff(sender_id, MIN_BACKOFF_TIME)
 
             # Neigboard data transmission is done, we can send RRTSs
             else:
@@ -0,0 +1,144 @@
+from collections import deque
+from itertools import count
+from math import ceil
+
+
+class PacketQueue:
+    """
+    Queue of data packets with a FIFO deque per destination, each ordered by
+    time_offset. Appending and removing a head packet are O(1), picking the
+    next packet to send only looks at the head of every destination queue, so
+    a packet for a busy node (or one that is not due yet) no longer blocks the
+    packets behind it for other destinations.
+
+    With a `quantum`, the destinations take turns by deficit round robin: each
+    round a destination may send `quantum` more bytes, so one destination with
+    many (or large) packets cannot starve the others. Without one, the earliest
+    packet of all destinations goes first.
+    """
+
+    def __init__(self, quantum=None):
+        """
+        :param int quantum: Bytes every destination may send per round, None for FIFO order
+        """
+        self.quantum = quantum
+        self._queues = {}  # target_id -> deque of (order, packet)
+        self._length = 0
+        self._order = count()
+        self._round = deque()  # target_ids with packets, in round robin order
+        self._deficit = {}  # target_id -> bytes it may still send this round
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def append(self, packet):
+        queue = self._queues.get(packet.target_id)
+        if queue is None:
+            queue = self._queues[packet.target_id] = deque()
+            self._round.append(packet.target_id)
+            self._deficit[packet.target_id] = 0
+
+        entry = (next(self._order), packet)
+        if queue and queue[-1][1].time_offset > packet.time_offset:
+            # Packets are normally added in time order, only walk the queue
+            # when this one has to go before the tail
+            index = len(queue) - 1
+            while index > 0 and queue[index - 1][1].time_offset > packet.time_offset:
+                index -= 1
+            queue.insert(index, entry)
+        else:
+            queue.append(entry)
+
+        self._length += 1
+
+    def head(self, target_id):
+        """First packet for `target_id`, or None if there is none"""
+        queue = self._queues.get(target_id)
+        return queue[0][1] if queue else None
+
+    def burst(self, target_id, now, limit, max_bytes=None):
+        """
+        The first due packets for `target_id`, at most `limit` and together at
+        most `max_bytes` long (None for no limit), but always the first one
+        """
+        packets = []
+        length = 0
+        for _, packet in self._queues.get(target_id, ()):
+            if len(packets) == limit or packet.time_offset > now:
+                break
+            length += packet.length
+            if packets and max_bytes is not None and length > max_bytes:
+                break
+            packets.append(packet)
+        return packets
+
+    def peek(self, now, busy=()):
+        """
+        The packet that should be send next, of the due packets whose target is
+        not in `busy`: by deficit round robin if there is a quantum, otherwise
+        the earliest (by time_offset, then by the order they were added).
+        Returns None if no packet can be send right now.
+        """
+        if self.quantum is not None:
+            return self._next_in_round(now, busy)
+
+        best = None
+        for target_id, queue in self._queues.items():
+            order, packet = queue[0]
+            if packet.time_offset > now or target_id in busy:
+                continue
+            if best is None or (packet.time_offset, order) < (best[1].time_offset, best[0]):
+                best = queue[0]
+
+        return best[1] if best is not None else None
+
+    def _next_in_round(self, now, busy):
+        ready = []
+        for target_id in self._round:
+            packet = self._queues[target_id][0][1]
+            if packet.time_offset <= now and target_id not in busy:
+                if self._deficit[target_id] >= packet.length:
+                    return packet
+                ready.append((target_id, packet))
+
+        if not ready:
+            return None
+
+        # Nobody may send in this round, skip to the first round in which one
+        # of the ready destinations can
+        rounds = min(ceil((packet.length - self._deficit[target_id]) / self.quantum) for target_id, packet in ready)
+        for target_id, _ in ready:
+            self._deficit[target_id] += rounds * self.quantum
+        for target_id, packet in ready:
+            if self._deficit[target_id] >= packet.length:
+                return packet
+
+    def remove(self, packet):
+        """Remove `packet`, O(1) when it is the head packet for its target"""
+        queue = self._queues[packet.target_id]
+        if queue[0][1] is packet:
+            queue.popleft()
+        else:
+            # Only happens when an earlier packet was added for the same target
+            # while this one was being send
+            for entry in queue:
+                if entry[1] is packet:
+                    queue.remove(entry)
+                    break
+            else:
+                raise ValueError(f"Packet for {packet.target_id} is not in the queue")
+
+        target_id = packet.target_id
+        self._deficit[target_id] -= packet.length
+        if not queue:
+            del self._queues[target_id]
+            del self._deficit[target_id]
+            self._round.remove(target_id)
+        elif self._deficit[target_id] < queue[0][1].length:
+            # Its turn is over, the others go first
+            self._round.remove(target_id)
+            self._round.append(target_id)
+        self._length -= 1
@@ -1,11 +1,9 @@
-import math
-import random
-import threading
+import numpy as np
 
-from MacawNode import MacawNode
-import wsnsimpy.wsnsimpy_tk as wsp
-
-from Utilization import Utilization
+import config  # noqa: F401, makes the Common package importable
+from Scenario import MACS, parse_args, run_demo, add_flow
+from Common.rng import TOPOLOGY, TRAFFIC
+from Common.topology import poisson_disk, receiver_candidates
 
 PACKET_SIZE = 256
 TX_RANGE = 100
@@ -17,61 +15,53 @@ GRID_BOUNDS = [50, 50, 600, 600]
 
 class RandomizedTopology:
 
-    def __init__(self):
+    def __init__(self, simulator, packet_size=PACKET_SIZE, tx_range=TX_RANGE, num_senders=NUM_SENDERS,
+                 node_spacing=NODE_SPACING, num_nodes=NUM_NODES, grid_bounds=GRID_BOUNDS, traffic=None, mac="macaw"):
+        self.simulator = simulator
+        self.packet_size = packet_size
+        self.tx_range = tx_range
+        self.num_senders = num_senders
+        self.node_spacing = node_spacing
+        self.num_nodes = num_nodes
+        self.grid_bounds = grid_bounds
+        self.traffic = traffic  # traffic generator factory, see Scenario.add_flow
+        self.node_class = MACS[mac]  # MAC protocol of the nodes
         self.nodes = []
 
     def set_nodes(self):
-        for x in range(NUM_NODES):
-            self.nodes.append(simulator.add_node(MacawNode, self.get_pos()))
-
-        for node in self.nodes:
-            node.tx_range = TX_RANGE
+        rng = np.random.default_rng(self.simulator.rng(TOPOLOGY).getrandbits(64))
+        positions = poisson_disk(self.num_nodes, self.grid_bounds, self.node_spacing, rng)
 
-    def get_pos(self):
-        pos = (
-            random.randint(GRID_BOUNDS[0], GRID_BOUNDS[2]),
-            random.randint(GRID_BOUNDS[0], GRID_BOUNDS[2])
-        )
+        for pos in positions.tolist():
+            self.nodes.append(self.simulator.add_node(self.node_class, tuple(pos)))
 
         for node in self.nodes:
-            if abs(node.pos[0] - pos[0]) < NODE_SPACING and abs(node.pos[1] - pos[1]) < NODE_SPACING:
-                return self.get_pos()
+            node.tx_range = self.tx_range
 
-        return pos
+        self.receivers = receiver_candidates(positions, self.tx_range)
 
     def get_receiver(self, sender):
-        # Ensure receiver != sender
-        possible_receiver = self.nodes[random.choice([i for i in range(0, NUM_NODES - 1) if i != sender.id])]
+        # The receivers within range of every node are computed once when the
+        # nodes are placed
+        indptr, indices = self.receivers
+        return self.nodes[self.simulator.rng(TRAFFIC).choice(indices[indptr[sender.id]:indptr[sender.id + 1]])]
 
-        # Ensure receiver is within range of sender (Pythagoras)
-        if math.sqrt((sender.pos[0] - possible_receiver.pos[0]) ** 2 + (sender.pos[1] - possible_receiver.pos[1]) ** 2) > TX_RANGE:
-            return self.get_receiver(sender)
+    def run(self):
+        # Only nodes with at least one other node in range can send
+        senders = np.flatnonzero(np.diff(self.receivers[0])).tolist()
+        if not senders:
+            raise ValueError(f"No node has another node within range {self.tx_range}")
 
-        else:
-            return possible_receiver
+        rng = self.simulator.rng(TRAFFIC)
 
-    def run(self):
-        for cluster in range(NUM_SENDERS):
-            sender = self.nodes[random.randint(0, NUM_NODES - 1)]
+        for cluster in range(self.num_senders):
+            sender = self.nodes[rng.choice(senders)]
 
             receiver = self.get_receiver(sender)
 
-            sender.add_data(PACKET_SIZE, receiver, time_offset=random.randint(0, int(NUM_SENDERS / 2)))
+            add_flow(self, sender, receiver, time_offset=rng.randint(0, int(self.num_senders / 2)))
 
 
 if __name__ == '__main__':
-    simulator = wsp.Simulator(
-        until=60,
-        timescale=1,
-        visual=True,
-        terrain_size=(650, 650),
-        title="MACAW Randomized Topology Demo"
-    )
-
-    topology = RandomizedTopology()
-    topology.set_nodes()
-    topology.run()
-
-    threading.Thread(target=Utilization, args=(simulator, topology.nodes,)).start()
-
-    simulator.run()
+    args = parse_args("MACAW Randomized Topology Demo")
+    run_demo("MACAW Randomized Topology Demo", RandomizedTopology, args)
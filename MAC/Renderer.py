@@ -0,0 +1,111 @@
+from itertools import count
+
+from wsnsimpy.topovis.TkPlotter import colorStr
+
+from config import TX_CIRCLE_DELTA
+
+TARGET_FPS = 25  # frames per wall-clock second
+
+
+class TransmissionRenderer:
+    """
+    Draws the TX circles of all MacawNodes of a simulator. Nodes only register
+    their transmissions, on visual runs a SimPy process draws all of them at
+    most `fps` times per wall-clock second in a single canvas update. The
+    circles are a pool of canvas items that are moved and restyled instead of
+    created and deleted for every transmission.
+
+    When the simulator is recording, every ring is also recorded as a circle
+    when the transmission starts and deleted when it ends.
+    """
+
+    def __init__(self, simulator, fps=TARGET_FPS):
+        self._simulator = simulator
+        self._scene = simulator.scene
+        self._transmissions = {}  # key -> (x, y, tx_range, style, recorded shape ids)
+        self._keys = count()
+        self._items = []  # pooled canvas items
+        self._drawn = []  # (x1, y1, x2, y2, style) each item shows right now
+        self._visible = 0  # number of items in use
+        self._dirty = False
+
+        if simulator.visual:
+            self._canvas = simulator.tkplot.canvas
+            interval = 1 / fps
+            if simulator.timescale > 0:
+                # Realtime runs take `timescale` wall-clock seconds per simulated second
+                interval /= simulator.timescale
+            simulator.env.process(self._render_loop(interval))
+
+    @classmethod
+    def of(cls, simulator):
+        """The renderer of `simulator`, created on first use"""
+        renderer = getattr(simulator, "transmission_renderer", None)
+        if renderer is None:
+            renderer = simulator.transmission_renderer = cls(simulator)
+        return renderer
+
+    def add(self, pos, tx_range, style, duration):
+        """
+        Show a transmission as circles every TX_CIRCLE_DELTA up to `tx_range`
+        around `pos` for `duration` simulated seconds.
+        """
+        shapes = ()
+        recorder = self._simulator.recorder
+        if recorder is not None:
+            line = self._scene.lineStyles[style]
+            shapes = []
+            for radius in range(0, tx_range + TX_CIRCLE_DELTA, TX_CIRCLE_DELTA):
+                shape = self._scene._getUniqueId()
+                recorder.circle(pos[0], pos[1], radius, shape, line, None)
+                shapes.append(shape)
+
+        key = next(self._keys)
+        self._transmissions[key] = (pos[0], pos[1], tx_range, style, shapes)
+        self._dirty = True
+        self._simulator.delayed_exec(duration, self._remove, key)
+
+    def _remove(self, key):
+        shapes = self._transmissions.pop(key)[4]
+        for shape in shapes:
+            self._simulator.recorder.delshape(shape)
+        self._dirty = True
+
+    def _render_loop(self, interval):
+        while True:
+            yield self._simulator.timeout(interval)
+            if self._dirty:
+                self._dirty = False
+                self._draw()
+
+    def _draw(self):
+        canvas = self._canvas
+        rings = [
+            (x - radius, y - radius, x + radius, y + radius, style)
+            for x, y, tx_range, style, _ in self._transmissions.values()
+            for radius in range(0, tx_range + TX_CIRCLE_DELTA, TX_CIRCLE_DELTA)
+        ]
+
+        while len(self._items) < len(rings):
+            self._items.append(canvas.create_oval(0, 0, 0, 0, state="hidden"))
+            self._drawn.append(None)
+
+        for index, ring in enumerate(rings):
+            drawn = self._drawn[index]
+            if drawn == ring and index < self._visible:
+                continue
+
+            item = self._items[index]
+            canvas.coords(item, *ring[:4])
+            if drawn is None or drawn[4] != ring[4]:
+                line = self._scene.lineStyles[ring[4]]
+                canvas.itemconfigure(item, outline=colorStr(line.color), width=line.width, dash=line.dash)
+            if index >= self._visible:
+                canvas.itemconfigure(item, state="normal")
+            self._drawn[index] = ring
+
+        for index in range(len(rings), self._visible):
+            canvas.itemconfigure(self._items[index], state="hidden")
+        self._visible = len(rings)
+
+        self._simulator.tk.update()
@@ -0,0 +1,337 @@
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from statistics import mean, stdev
+
+import numpy as np
+
+import config  # noqa: F401, makes the Common package importable
+from Sweep import TOPOLOGIES, _parse_value
+from Scenario import create_simulator
+from Common.traffic import GENERATORS, parse_traffic
+
+# Offered load per flow in packets per second, ramped until the goodput saturates
+RATES = (0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20)
+UNTIL = 60  # simulated second(s) per run
+
+MIN_RUNS = 5
+MAX_RUNS = 30
+TOLERANCE = 0.05  # a point is done when the 95% confidence intervals are within 5% of the means
+
+# The ramp stops after this many rates in a row add less than SATURATION_GAIN goodput
+SATURATION_PATIENCE = 2
+SATURATION_GAIN = 0.05
+
+# 97.5% quantiles of Student's t-distribution for 1 to 30 degrees of freedom
+_T_975 = (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145,
+          2.131, 2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048,
+          2.045, 2.042)
+
+# Metrics whose confidence intervals decide when a point has enough runs
+CONVERGENCE_METRICS = ("goodput", "latency_p95")
+
+
+def _percentiles(values, percentiles):
+    if len(values) == 0:
+        return [None] * len(percentiles)
+    return np.percentile(values, percentiles).tolist()
+
+
+def run_point(topology_name, traffic, rate, seed, until=UNTIL, params=None):
+    """
+    Run one headless simulation with every flow of the topology generating
+    `rate` packets per second.
+
+    :return: Tuple of the results row and the Counter of backoff lengths in slots
+    """
+    simulator = create_simulator(topology_name, headless=True, until=until, seed=seed)
+    topology = TOPOLOGIES[topology_name](simulator, traffic=parse_traffic(f"{traffic}:rate={rate}"),
+                                         **(params or {}))
+    topology.set_nodes()
+    for node in topology.nodes:
+        node.logging = False
+    topology.run()
+
+    start = time.perf_counter()
+    simulator.run()
+    wall_time = time.perf_counter() - start
+
+    nodes = topology.nodes
+    sim_time = simulator.now
+    offered = sum(node.packets_offered for node in nodes)
+    delivered = sum(node.data_delivered for node in nodes)
+    latencies = np.concatenate([np.frombuffer(node.latencies, dtype=float) for node in nodes])
+    backoff_slots = Counter()
+    for node in nodes:
+        backoff_slots.update(node.backoff_slots)
+    backoffs = np.repeat(list(backoff_slots), list(backoff_slots.values()))
+
+    latency_p50, latency_p95, latency_p99 = _percentiles(latencies, [50, 95, 99])
+    backoff_p50, backoff_p95 = _percentiles(backoffs, [50, 95])
+    row = {
+        "topology": topology_name,
+        "traffic": traffic,
+        "rate": rate,
+        "seed": seed,
+        "sim_time": sim_time,
+        "wall_time": wall_time,
+        "offered_load": offered / sim_time,
+        "goodput": delivered / sim_time,
+        "goodput_bytes": sum(node.bytes_delivered for node in nodes) / sim_time,
+        "delivery_ratio": delivered / offered if offered else None,
+        "dropped": sum(node.packets_dropped for node in nodes),
+        "latency_mean": float(latencies.mean()) if len(latencies) else None,
+        "latency_p50": latency_p50,
+        "latency_p95": latency_p95,
+        "latency_p99": latency_p99,
+        "collisions": sum(node.collisions for node in nodes),
+        "backoffs": len(backoffs),
+        "backoff_mean": float(backoffs.mean()) if len(backoffs) else None,
+        "backoff_p50": backoff_p50,
+        "backoff_p95": backoff_p95,
+    }
+    return row, backoff_slots
+
+
+def _run_point(job):
+    return run_point(*job)
+
+
+def confidence_interval(values):
+    """Half width of the 95% confidence interval of the mean of `values`"""
+    if len(values) < 2:
+        return float("inf")
+    t = _T_975[len(values) - 2] if len(values) - 1 <= len(_T_975) else 1.96
+    return t * stdev(values) / len(values) ** 0.5
+
+
+def converged(rows, tolerance=TOLERANCE, metrics=CONVERGENCE_METRICS):
+    """Whether the confidence intervals of all `metrics` are within `tolerance` of their means"""
+    for metric in metrics:
+        values = [row[metric] for row in rows if row[metric] is not None]
+        if not values:
+            continue
+        if confidence_interval(values) > tolerance * abs(mean(values)):
+            return False
+    return True
+
+
+def summarize(rows):
+    """Means and confidence intervals of the runs of one point of the curve"""
+    summary = {key: rows[0][key] for key in ("topology", "traffic", "rate")}
+    summary["runs"] = len(rows)
+    for metric in ("offered_load", "goodput", "goodput_bytes", "delivery_ratio", "latency_p50", "latency_p95",
+                   "latency_p99", "collisions", "backoff_mean", "backoff_p95"):
+        values = [row[metric] for row in rows if row[metric] is not None]
+        summary[metric] = mean(values) if values else None
+        if metric in ("goodput", "latency_p95"):
+            summary[f"{metric}_ci"] = confidence_interval(values) if values else None
+    return summary
+
+
+def saturation_curve(pool, topology_name, traffic="poisson", rates=RATES, until=UNTIL, params=None,
+                     min_runs=MIN_RUNS, max_runs=MAX_RUNS, tolerance=TOLERANCE, batch_size=1):
+    """
+    Ramp the offered load of a topology. Every rate is run with seeds 0, 1, ...
+    in batches of `batch_size` parallel runs until the confidence intervals
+    converge or `max_runs` is reached. The ramp stops once the goodput has
+    saturated.
+
+    :return: Generator of (runs, backoff Counter) per rate
+    """
+    best_goodput = 0
+    stalled = 0
+    for rate in rates:
+        rows = []
+        backoff_slots = Counter()
+        while len(rows) < max_runs:
+            count = min(max(min_runs - len(rows), batch_size), max_runs - len(rows))
+            seeds = range(len(rows), len(rows) + count)
+            jobs = [(topology_name, traffic, rate, seed, until, params) for seed in seeds]
+            for row, slots in pool.imap_unordered(_run_point, jobs):
+                rows.append(row)
+                backoff_slots.update(slots)
+            if len(rows) >= min_runs and converged(rows, tolerance):
+                break
+
+        rows.sort(key=lambda row: row["seed"])
+        yield rows, backoff_slots
+
+        goodput = mean(row["goodput"] for row in rows)
+        if goodput > best_goodput * (1 + SATURATION_GAIN):
+            best_goodput = goodput
+            stalled = 0
+        else:
+            stalled += 1
+            if stalled >= SATURATION_PATIENCE:
+                return
+
+
+def _format(value, fmt):
+    return "-" if value is None else format(value, fmt)
+
+
+def print_summary(summary, file=sys.stderr):
+    print(f"{summary['topology']:>14} {summary['rate']:>6g} pkt/s per flow ({summary['runs']:>2} runs):"
+          f" offered {summary['offered_load']:8.2f} goodput {summary['goodput']:8.2f}"
+          f" ±{_format(summary['goodput_ci'], '.2f')} pkt/s,"
+          f" latency p50/p95/p99 {_format(summary['latency_p50'], '.3f')}/{_format(summary['latency_p95'], '.3f')}"
+          f"/{_format(summary['latency_p99'], '.3f')} s, {summary['collisions']:.1f} collisions", file=file)
+
+
+def _import_pyplot():
+    try:
+        import matplotlib
+    except ImportError:
+        return None
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def plot(curves, directory):
+    """
+    Plot goodput and latency against the offered load and the backoff
+    distribution at the highest load of every topology.
+
+    :param dict curves: topology name -> list of (summary, backoff Counter) per rate
+    :param str directory: Directory to write the PNG files to
+    """
+    plt = _import_pyplot()
+    os.makedirs(directory, exist_ok=True)
+
+    figure, axes = plt.subplots()
+    for topology_name, points in curves.items():
+        summaries = [summary for summary, _ in points]
+        axes.errorbar([summary["offered_load"] for summary in summaries],
+                      [summary["goodput"] for summary in summaries],
+                      yerr=[summary["goodput_ci"] for summary in summaries], marker="o", capsize=3,
+                      label=topology_name)
+    axes.set_xscale("log")
+    axes.set_xlabel("Offered load (packets/s)")
+    axes.set_ylabel("Goodput (packets/s)")
+    axes.legend()
+    figure.savefig(os.path.join(directory, "goodput.png"), dpi=150)
+    plt.close(figure)
+
+    figure, plots = plt.subplots(len(curves), 1, sharex=True, squeeze=False, figsize=(6.4, 2.4 * len(curves)))
+    for (topology_name, points), (axes,) in zip(curves.items(), plots):
+        summaries = [summary for summary, _ in points if summary["latency_p50"] is not None]
+        offered = [summary["offered_load"] for summary in summaries]
+        for percentile in ("p50", "p95", "p99"):
+            axes.plot(offered, [summary[f"latency_{percentile}"] for summary in summaries], marker="o",
+                      label=percentile)
+        axes.set_xscale("log")
+        axes.set_yscale("log")
+        axes.set_title(topology_name)
+        axes.set_ylabel("Latency (s)")
+        axes.legend()
+    plots[-1][0].set_xlabel("Offered load (packets/s)")
+    figure.tight_layout()
+    figure.savefig(os.path.join(directory, "latency.png"), dpi=150)
+    plt.close(figure)
+
+    figure, axes = plt.subplots()
+    for topology_name, points in curves.items():
+        backoff_slots = points[-1][1]
+        total = sum(backoff_slots.values())
+        if total:
+            slots = sorted(backoff_slots)
+            axes.step(slots, [backoff_slots[slot] / total for slot in slots], where="mid", label=topology_name)
+    axes.set_xlabel("Backoff (slots)")
+    axes.set_ylabel("Fraction of backoffs")
+    axes.set_title("Backoff distribution at the highest offered load")
+    axes.legend()
+    figure.savefig(os.path.join(directory, "backoff.png"), dpi=150)
+    plt.close(figure)
+
+
+def _parse_rates(text):
+    return [float(rate) for rate in text.split(",")]
+
+
+def _parse_param(text):
+    name, sep, value = text.partition("=")
+    if not sep or not value:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text!r}")
+    return name, _parse_value(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Ramp the offered load of headless MACAW simulations to find where they saturate")
+    parser.add_argument("--topology", choices=sorted(TOPOLOGIES), action="append",
+                        help="topology to run (can be repeated, default: all)")
+    parser.add_argument("--traffic", choices=sorted(GENERATORS), default="poisson",
+                        help="traffic generator of every flow (default: poisson)")
+    parser.add_argument("--rates", type=_parse_rates, default=RATES,
+                        help="packets per second per flow to ramp through (default: 0.05,0.1,...,20)")
+    parser.add_argument("--param", type=_parse_param, action="append", default=[],
+                        help="topology parameter, e.g. num_senders=20 (can be repeated)")
+    parser.add_argument("--until", type=float, default=UNTIL,
+                        help=f"number of simulated seconds per run (default: {UNTIL})")
+    parser.add_argument("--min-runs", type=int, default=MIN_RUNS, help=f"runs per rate at least (default: {MIN_RUNS})")
+    parser.add_argument("--max-runs", type=int, default=MAX_RUNS, help=f"runs per rate at most (default: {MAX_RUNS})")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="stop adding runs once the 95%% confidence intervals of the goodput and p95 latency"
+                             f" are within this fraction of their means (default: {TOLERANCE})")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--output", default="-",
+                        help="CSV file to write one row per run to (default: stdout)")
+    parser.add_argument("--summary", metavar="CSV", default=None,
+                        help="CSV file to write the means and confidence intervals per rate to")
+    parser.add_argument("--plots", metavar="DIR", default=None,
+                        help="directory to write goodput.png, latency.png and backoff.png to (needs matplotlib)")
+    args = parser.parse_args()
+
+    if args.plots is not None and _import_pyplot() is None:
+        parser.error("--plots needs matplotlib, install it with `pip install matplotlib`")
+
+    processes = args.processes or os.cpu_count()
+    output = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    curves = {}
+    summaries = []
+
+    try:
+        writer = None
+        with multiprocessing.Pool(processes) as pool:
+            for topology_name in args.topology or sorted(TOPOLOGIES):
+                curves[topology_name] = []
+                for rows, backoff_slots in saturation_curve(
+                        pool, topology_name, args.traffic, args.rates, args.until, dict(args.param),
+                        args.min_runs, args.max_runs, args.tolerance, processes):
+                    if writer is None:
+                        writer = csv.DictWriter(output, fieldnames=list(rows[0]))
+                        writer.writeheader()
+                    writer.writerows(rows)
+                    output.flush()
+
+                    summary = summarize(rows)
+                    print_summary(summary)
+                    summaries.append(summary)
+                    curves[topology_name].append((summary, backoff_slots))
+
+                best = max((summary for summary, _ in curves[topology_name]), key=lambda summary: summary["goodput"])
+                print(f"{topology_name:>14} saturates at {best['goodput']:.2f} packets/s"
+                      f" ({best['offered_load']:.2f} packets/s offered)", file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if args.summary is not None:
+        with open(args.summary, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=list(summaries[0]))
+            writer.writeheader()
+            writer.writerows(summaries)
+
+    if args.plots is not None:
+        plot(curves, args.plots)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+import argparse
+import time
+
+import numpy as np
+
+import config  # noqa: F401, makes the Common package importable
+from CsmaNode import CsmaNode
+from MacaNode import MacaNode
+from MacawNode import MacawNode
+from Utilization import Utilization
+from Common.channel import CHANNELS
+from Common.simulator import Simulator
+from Common.traffic import TraceFile, parse_traffic
+
+TERRAIN_SIZE = (650, 650)
+
+# MAC protocols the topologies can run, by the name passed as their `mac`
+MACS = {
+    "macaw": MacawNode,
+    "maca": MacaNode,
+    "csma": CsmaNode,
+}
+
+
+def _traffic_spec(spec):
+    try:
+        return parse_traffic(spec)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def parse_args(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--headless", action="store_true",
+                        help="run without Tk visualization at unbounded speed and print a summary")
+    parser.add_argument("--until", type=float, default=60,
+                        help="number of simulated seconds to run (default: 60)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="master seed for all random streams (default: random, printed in the summary)")
+    parser.add_argument("--trace", metavar="PATH", default=None,
+                        help="write a binary event trace to PATH, read it with `python -m Common.trace PATH`")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="profile the node methods and write a collapsed-stack (flamegraph) file to PATH")
+    parser.add_argument("--record", metavar="PATH", default=None,
+                        help="record the visualization to PATH, play it with `python -m Common.replay PATH`")
+    parser.add_argument("--traffic", metavar="SPEC", type=_traffic_spec, default=None,
+                        help="generate packets on every flow of the topology instead of a fixed few, e.g."
+                             " cbr:rate=2, poisson:rate=5 or onoff:rate=10,on=2,off=8"
+                             " (optional start, stop and count)")
+    parser.add_argument("--traffic-trace", metavar="CSV", default=None,
+                        help="replay the packets in CSV (time,source,dest,length) instead of the topology's flows")
+    parser.add_argument("--channel", choices=list(CHANNELS), default="disk",
+                        help="how receptions are decided: disk loses every frame that overlaps another one, sinr"
+                             " decides by the signal to interference plus noise ratio (default: disk)")
+    parser.add_argument("--mac", choices=list(MACS), action="append", default=None,
+                        help="MAC protocol of the nodes (default: macaw), give it more than once to run the same"
+                             " scenario with each of them and compare their results (headless only)")
+    args = parser.parse_args()
+
+    if args.mac is None:
+        args.mac = ["macaw"]
+    if len(args.mac) > 1:
+        if not args.headless:
+            parser.error("more than one --mac needs --headless")
+        if args.trace is not None or args.profile is not None or args.record is not None:
+            parser.error("more than one --mac cannot write a single --trace, --profile or --record")
+    return args
+
+
+def create_simulator(title, headless=False, until=60, timescale=1, seed=None, trace=None, profile=None,
+                     record=None, channel="disk"):
+    """
+    Create the simulator for a topology demo. Headless runs use a plain SimPy
+    environment (timescale 0) and no Tk window, visual runs keep the realtime
+    behaviour of the original demos. Running again with the same `seed`
+    reproduces the run exactly. If `trace` is given, events are written to
+    that file, if `profile` is given, the collapsed profiling stacks are. If
+    `record` is given, the visualization is recorded to that file, headless
+    runs included. `channel` is the medium model the nodes transmit on, see
+    `Common.channel`.
+    """
+    simulator = Simulator(
+        until=until,
+        timescale=0 if headless else timescale,
+        visual=not headless,
+        terrain_size=TERRAIN_SIZE,
+        title=title,
+        seed=seed
+    )
+    if not headless:
+        print(f"Seed: {simulator.seed}")
+    if trace is not None:
+        simulator.start_trace(trace)
+    if profile is not None:
+        simulator.start_profile(profile)
+    if record is not None:
+        simulator.start_recording(record)
+    simulator.use_channel(channel)
+    return simulator
+
+
+def add_flow(topology, sender, receiver, time_offset=0, packets=1):
+    """
+    Let `sender` send to `receiver` from `time_offset` on. Without a traffic
+    generator (`topology.traffic`) that is `packets` packets of the
+    topology's packet size, with one it is a generator for the flow.
+    """
+    if topology.traffic is None:
+        for _ in range(packets):
+            sender.add_data(topology.packet_size, receiver, time_offset=time_offset)
+    else:
+        topology.traffic(receiver.id, topology.packet_size, start=time_offset).attach(sender)
+
+
+def start_traffic(simulator, topology, trace=None):
+    """Start the flows of `topology`, or replay the packets in the CSV file `trace` instead"""
+    if trace is None:
+        topology.run()
+    else:
+        TraceFile(trace).attach(simulator)
+
+
+def run_demo(title, topology_class, args, timescale=1, utilization=True):
+    """
+    Run the demo of `topology_class` with the arguments of `parse_args`. With
+    more than one `--mac` the scenario is run once per MAC protocol with the
+    same seed, and their results are printed side by side. `utilization`
+    tells whether visual runs show the utilization plot.
+    """
+    seed = args.seed
+    results = []
+
+    for mac in args.mac:
+        simulator = create_simulator(title, args.headless, args.until, timescale=timescale, seed=seed,
+                                     trace=args.trace, profile=args.profile, record=args.record,
+                                     channel=args.channel)
+        seed = simulator.seed
+
+        topology = topology_class(simulator, traffic=args.traffic, mac=mac)
+        topology.set_nodes()
+        start_traffic(simulator, topology, args.traffic_trace)
+
+        if not args.headless:
+            if utilization:
+                Utilization(simulator, topology.nodes)
+            simulator.run()
+        elif len(args.mac) == 1:
+            run_headless(simulator, topology.nodes)
+        else:
+            wall_time = _run_timed(simulator, topology.nodes)
+            results.append((mac, collect_summary(simulator, topology.nodes, wall_time)))
+
+    if results:
+        print_comparison(results)
+
+
+def _run_timed(simulator, nodes):
+    # Printing every RTS/CTS is by far the slowest part of a headless run
+    for node in nodes:
+        node.logging = False
+
+    start = time.perf_counter()
+    simulator.run()
+    return time.perf_counter() - start
+
+
+def run_headless(simulator, nodes):
+    wall_time = _run_timed(simulator, nodes)
+    print_summary(simulator, nodes, wall_time)
+
+
+def collect_summary(simulator, nodes, wall_time):
+    offered = sum(node.packets_offered for node in nodes)
+    delivered = sum(node.data_delivered for node in nodes)
+    queued = sum(len(node._data_queue) for node in nodes)
+    dropped = sum(node.packets_dropped for node in nodes)
+    frames = sum(node.receive_counter.total for node in nodes)
+    sim_time = simulator.now
+    latencies = np.concatenate([np.frombuffer(node.latencies, dtype=float) for node in nodes])
+    latency_p50, latency_p95 = np.percentile(latencies, [50, 95]).tolist() if len(latencies) else (None, None)
+
+    return {
+        "seed": simulator.seed,
+        "nodes": len(nodes),
+        "sim_time": sim_time,
+        "wall_time": wall_time,
+        "offered": offered,
+        "delivered": delivered,
+        "delivered_bytes": sum(node.bytes_delivered for node in nodes),
+        "queued": queued,
+        "dropped": dropped,
+        # Taken off the queue but never delivered, e.g. MACA's DATA that did
+        # not arrive, which its sender cannot know about
+        "lost": offered - delivered - queued - dropped,
+        "collisions": sum(node.collisions for node in nodes),
+        "throughput": delivered / sim_time if sim_time > 0 else 0,
+        "frames_received": frames,
+        "frame_rate": frames / sim_time if sim_time > 0 else 0,
+        "latency_mean": float(latencies.mean()) if len(latencies) else None,
+        "latency_p50": latency_p50,
+        "latency_p95": latency_p95,
+    }
+
+
+def _seconds(value):
+    return "-" if value is None else f"{value:.2f} s"
+
+
+def print_summary(simulator, nodes, wall_time):
+    summary = collect_summary(simulator, nodes, wall_time)
+    speedup = summary["sim_time"] / wall_time if wall_time > 0 else float("inf")
+
+    print(f"Seed:               {summary['seed']}")
+    print(f"Nodes:              {summary['nodes']}")
+    print(f"Simulated time:     {summary['sim_time']:.2f} s")
+    print(f"Wall-clock time:    {summary['wall_time']:.3f} s ({speedup:.1f}x realtime)")
+    print(f"Packets offered:    {summary['offered']}")
+    print(f"Packets delivered:  {summary['delivered']} ({summary['delivered_bytes']} bytes)")
+    print(f"Packets queued:     {summary['queued']}")
+    print(f"Packets dropped:    {summary['dropped']}")
+    print(f"Packets lost:       {summary['lost']}")
+    print(f"Collisions:         {summary['collisions']}")
+    print(f"Throughput:         {summary['throughput']:.3f} packets/second")
+    print(f"Frames received:    {summary['frames_received']} ({summary['frame_rate']:.3f} frames/second)")
+    print(f"Latency:            mean {_seconds(summary['latency_mean'])}, p50 {_seconds(summary['latency_p50'])},"
+          f" p95 {_seconds(summary['latency_p95'])}")
+
+    if simulator.profiler is not None:
+        print()
+        print(simulator.profiler.report())
+
+
+def print_comparison(results):
+    """Print the summaries of runs with different MAC protocols side by side, `results` are (mac, summary)"""
+    print(f"Seed:    {results[0][1]['seed']}")
+    print(f"Nodes:   {results[0][1]['nodes']}")
+    print()
+    print(f"{'MAC':<8}{'Offered':>8}{'Delivered':>10}{'Bytes':>9}{'Queued':>8}{'Dropped':>9}{'Lost':>6}"
+          f"{'Collisions':>12}{'Packets/s':>11}{'Latency':>10}{'p50':>10}{'p95':>10}{'Wall':>9}")
+    for mac, summary in results:
+        print(f"{mac:<8}{summary['offered']:>8}{summary['delivered']:>10}{summary['delivered_bytes']:>9}"
+              f"{summary['queued']:>8}{summary['dropped']:>9}{summary['lost']:>6}{summary['collisions']:>12}"
+              f"{summary['throughput']:>11.3f}{_seconds(summary['latency_mean']):>10}"
+              f"{_seconds(summary['latency_p50']):>10}{_seconds(summary['latency_p95']):>10}"
+              f"{summary['wall_time']:>8.2f}s")
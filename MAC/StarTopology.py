@@ -1,10 +1,6 @@
-import threading
 from math import sin, cos, pi
 
-from MacawNode import MacawNode
-import wsnsimpy.wsnsimpy_tk as wsp
-
-from Utilization import Utilization
+from Scenario import MACS, parse_args, run_demo, add_flow
 
 PACKET_SIZE = 256
 NUM_STAR_TIPS = 5
@@ -15,43 +11,37 @@ ORIGIN_Y = 325
 
 class StarTopology:
 
-    def __init__(self):
+    def __init__(self, simulator, packet_size=PACKET_SIZE, num_star_tips=NUM_STAR_TIPS, circle_radius=CIRCLE_RADIUS,
+                 traffic=None, mac="macaw"):
+        self.simulator = simulator
+        self.packet_size = packet_size
+        self.num_star_tips = num_star_tips
+        self.circle_radius = circle_radius
+        self.traffic = traffic  # traffic generator factory, see Scenario.add_flow
+        self.node_class = MACS[mac]  # MAC protocol of the nodes
         self.nodes = []
 
     def set_nodes(self):
-        node = simulator.add_node(MacawNode, (ORIGIN_X, ORIGIN_Y))
-        node.tx_range = CIRCLE_RADIUS
+        node = self.simulator.add_node(self.node_class, (ORIGIN_X, ORIGIN_Y))
+        node.tx_range = self.circle_radius
         self.nodes.append(node)
 
-        for angle in range(0, 360, int(360 / NUM_STAR_TIPS)):
+        for angle in range(0, 360, int(360 / self.num_star_tips)):
             angle = angle * pi/180  # To radians
 
-            x = ORIGIN_X + int(CIRCLE_RADIUS * cos(angle))
-            y = ORIGIN_Y + int(CIRCLE_RADIUS * sin(angle))
+            x = ORIGIN_X + int(self.circle_radius * cos(angle))
+            y = ORIGIN_Y + int(self.circle_radius * sin(angle))
 
-            node = simulator.add_node(MacawNode, (x, y))
-            node.tx_range = CIRCLE_RADIUS
+            node = self.simulator.add_node(self.node_class, (x, y))
+            node.tx_range = self.circle_radius
             self.nodes.append(node)
 
     def run(self):
         target = self.nodes[0]
-        self.nodes[1].add_data(PACKET_SIZE, target)
-        self.nodes[4].add_data(PACKET_SIZE, target)
+        add_flow(self, self.nodes[1], target)
+        add_flow(self, self.nodes[4], target)
 
 
 if __name__ == '__main__':
-    simulator = wsp.Simulator(
-        until=60,
-        timescale=1,
-        visual=True,
-        terrain_size=(650, 650),
-        title="MACAW Star Topology Demo"
-    )
-
-    topology = StarTopology()
-    topology.set_nodes()
-    topology.run()
-
-    threading.Thread(target=Utilization, args=(simulator, topology.nodes,)).start()
-
-    simulator.run()
+    args = parse_args("MACAW Star Topology Demo")
+    run_demo("MACAW Star Topology Demo", StarTopology, args)
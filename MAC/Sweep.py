@@ -0,0 +1,146 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import sys
+import time
+
+from BaseStationTopology import BaseStationTopology
+from ExtendedLineTopology import ExtendedLineTopology
+from GridTopology import GridTopology
+from IsolatedTopology import IsolatedTopology
+from LineTopology import LineTopology
+from RandomizedTopology import RandomizedTopology
+from StarTopology import StarTopology
+
+from Scenario import create_simulator, collect_summary
+
+TOPOLOGIES = {
+    "base-station": BaseStationTopology,
+    "extended-line": ExtendedLineTopology,
+    "grid": GridTopology,
+    "isolated": IsolatedTopology,
+    "line": LineTopology,
+    "randomized": RandomizedTopology,
+    "star": StarTopology,
+}
+
+# Parameters that are set on every node instead of being passed to the topology
+NODE_PARAMETERS = ("max_backoff_time", "max_burst", "max_burst_bytes")
+
+
+def run_scenario(topology_name, seed, until, params):
+    """
+    Run a single headless simulation and return its results row. Every run
+    builds its own simulator, so runs are independent of each other and can be
+    executed in separate processes.
+    """
+    simulator = create_simulator(topology_name, headless=True, until=until, seed=seed)
+
+    topology_params = {key: value for key, value in params.items() if key not in NODE_PARAMETERS}
+    topology = TOPOLOGIES[topology_name](simulator, **topology_params)
+    topology.set_nodes()
+
+    for node in topology.nodes:
+        node.logging = False
+        for key in NODE_PARAMETERS:
+            if key in params:
+                setattr(node, key, params[key])
+
+    topology.run()
+
+    start = time.perf_counter()
+    simulator.run()
+    wall_time = time.perf_counter() - start
+
+    row = {"topology": topology_name, "seed": seed}
+    row.update(params)
+    row.update(collect_summary(simulator, topology.nodes, wall_time))
+    return row
+
+
+def _run_scenario(job):
+    return run_scenario(*job)
+
+
+def expand_grid(grid):
+    """
+    Turn {"tx_range": [100, 150], "num_senders": [5]} into one dict per
+    combination of parameter values.
+    """
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def sweep(topology_name, grid, seeds, until=60, processes=None):
+    """
+    Run every parameter combination in `grid` for every seed in `seeds` and
+    yield the results rows as they complete.
+    """
+    jobs = [(topology_name, seed, until, params) for params in expand_grid(grid) for seed in seeds]
+
+    with multiprocessing.Pool(processes) as pool:
+        for row in pool.imap_unordered(_run_scenario, jobs):
+            yield row
+
+
+def _parse_value(value):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _parse_param(text):
+    name, sep, values = text.partition("=")
+    if not sep or not values:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE[,VALUE...], got {text!r}")
+    return name, [_parse_value(value) for value in values.split(",")]
+
+
+def _parse_seeds(text):
+    seeds = []
+    for part in text.split(","):
+        first, sep, last = part.partition("-")
+        if sep:
+            seeds.extend(range(int(first), int(last) + 1))
+        else:
+            seeds.append(int(first))
+    return seeds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a parameter sweep over headless MACAW simulations")
+    parser.add_argument("topology", choices=sorted(TOPOLOGIES))
+    parser.add_argument("--param", type=_parse_param, action="append", default=[],
+                        help="parameter to sweep, e.g. tx_range=100,150 (can be repeated)")
+    parser.add_argument("--seeds", type=_parse_seeds, default=[0],
+                        help="seeds to run for every combination, e.g. 0-99 or 1,5,7 (default: 0)")
+    parser.add_argument("--until", type=float, default=60,
+                        help="number of simulated seconds per run (default: 60)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--output", default="-",
+                        help="CSV file to write the results to (default: stdout)")
+    args = parser.parse_args()
+
+    grid = dict(args.param)
+    output = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+
+    try:
+        writer = None
+        for row in sweep(args.topology, grid, args.seeds, args.until, args.processes):
+            if writer is None:
+                writer = csv.DictWriter(output, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,76 @@
-import time
+BUCKET_WIDTH = 1  # simulated second(s)
+HISTORY_SIZE = 60  # number of buckets kept per counter
 
-from wsnsimpy.wsnsimpy_tk import Simulator
+
+class ThroughputCounter:
+    """
+    Counts packets per bucket of simulated time in a ring buffer of the last
+    HISTORY_SIZE buckets. Buckets are only rotated when a packet is recorded or
+    the counter is read, so an idle counter costs nothing.
+    """
+
+    def __init__(self, bucket_width=BUCKET_WIDTH, size=HISTORY_SIZE):
+        self.bucket_width = bucket_width
+        self.total = 0
+        self._buckets = [0] * size
+        self._current = 0  # index of the newest bucket since the start of the simulation
+
+    def _advance(self, bucket):
+        # clear the buckets that passed without any packets
+        size = len(self._buckets)
+        for skipped in range(self._current + 1, min(bucket, self._current + size) + 1):
+            self._buckets[skipped % size] = 0
+        self._current = bucket
+
+    def record(self, now, count=1):
+        bucket = int(now // self.bucket_width)
+        if bucket > self._current:
+            self._advance(bucket)
+
+        self._buckets[bucket % len(self._buckets)] += count
+        self.total += count
+
+    def count(self, bucket):
+        """Number of packets in an absolute bucket, 0 if it is no longer kept"""
+        if bucket > self._current or bucket <= self._current - len(self._buckets) or bucket < 0:
+            return 0
+        return self._buckets[bucket % len(self._buckets)]
+
+    def rate(self, now):
+        """Packets per simulated second during the last completed bucket"""
+        return self.count(int(now // self.bucket_width) - 1) / self.bucket_width
+
+    def history(self, now):
+        """Packet counts of the kept buckets before `now`, oldest first"""
+        last = int(now // self.bucket_width) - 1
+        return [self.count(bucket) for bucket in range(last - len(self._buckets) + 1, last + 1)]
 
 
 class Utilization:
-    def __init__(self, simulator: Simulator, nodes: list):
+    """
+    Shows the network utilization in the Tk window. The value is computed from
+    the nodes' throughput counters by a SimPy process, so it is measured in
+    simulated time regardless of the simulator's timescale.
+    """
+
+    def __init__(self, simulator, nodes):
         self._simulator = simulator
         self._nodes = nodes
 
         self._simulator.tkplot.canvas.create_text(100, 590, font="Times 12", text="Network Utilization:")
         self._text = self._simulator.tkplot.canvas.create_text(100, 615, font="Times 12", text="0 packets/second")
 
-        self.start_utilization_update_loop()
+        self._simulator.env.process(self._update_loop())
+
+    def packets_per_second(self):
+        now = self._simulator.now
+        return sum(node.receive_counter.rate(now) for node in self._nodes)
 
-    def update_utilization(self, utilization: int):
+    def update_utilization(self, utilization):
         plural = "" if utilization == 1 else "s"
-        self._simulator.tkplot.canvas.itemconfigure(self._text, text=str(utilization) + " packet" + plural + "/second")
+        self._simulator.tkplot.canvas.itemconfigure(self._text, text=f"{utilization:g} packet{plural}/second")
 
-    def start_utilization_update_loop(self):
+    def _update_loop(self):
         while True:
-            total_packets = 0
-
-            for node in self._nodes:
-                total_packets += node.packets_received
-                node.packets_received = 0
-
-            self.update_utilization(total_packets)
-
-            time.sleep(1)
+            yield self._simulator.timeout(BUCKET_WIDTH)
+            self.update_utilization(self.packets_per_second())
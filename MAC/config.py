@@ -1,9 +1,18 @@
+import os
+import sys
+
+# The MAC demos are started from this directory, make the shared Common package
+# in the repository root importable as well.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 BYTE_TRANSMISSION_TIME = 0.01  # second(s)
 TX_CIRCLE_DELTA = 50  # how close are subsequent TX circles to one another
 
 MIN_BACKOFF_TIME = 2  # # slots
 MAX_BACKOFF_TIME = 64  # # slots
 
+DRR_QUANTUM = 512  # bytes every destination may send per round robin round
+
 
 DATA_LENGTH = {
     "ACK": 8,
@@ -15,3 +24,11 @@ DATA_LENGTH = {
 
 # One time slot is considered the time a CTS packet can be send
 SLOT_TIME = (BYTE_TRANSMISSION_TIME * DATA_LENGTH["CTS"])
+
+# CSMA/CA (802.11 DCF) timing, the slot is the time to sense the medium
+CSMA_SLOT_TIME = BYTE_TRANSMISSION_TIME
+SIFS = CSMA_SLOT_TIME
+DIFS = SIFS + 2 * CSMA_SLOT_TIME
+CW_MIN = 16  # # slots
+CW_MAX = 1024  # # slots
+RETRY_LIMIT = 7  # retransmissions before a packet is dropped
@@ -1,44 +1,134 @@
-import random
+from array import array
+from collections import Counter
+
 import wsnsimpy.wsnsimpy_tk as wsp
-from Routing.message import MTypes, Message
+from wsnsimpy.wsnsimpy import distance
+from Common.profiling import profiled
+from Common.rng import JITTER, TRAFFIC
+from Common.trace import Traced, event
+from Routing.discovery import RateLimiter, ring_steps, ring_traversal_time
+from Routing.message import MESSAGE_SIZE, MTypes, Message
+from Routing.rreq_cache import SeenCache
+from Routing.send_buffer import SendBuffer
+from Routing.routing_table import RoutingTable, INFINITE, NET_DIAMETER, net_traversal_time, forward_route_lifetime, \
+    reverse_route_lifetime
 from Routing.textstyles import TStyle
 from Routing.demo_control import demo_control_callback
 
 # global demo_control_callback
 
+# Trace events
+EV_START = event("aodv.start", "Initiating sending to node {dest}", ("dest",), TStyle.GREEN)
+EV_ROUTE_KNOWN = event("aodv.route_known", "Route to {dest} found in routing table", ("dest",), TStyle.LIGHTGREEN)
+EV_START_DATA = event("aodv.start_data", "Start sending data", (), TStyle.BLUE)
+EV_ROUTE_SEARCH = event("aodv.route_search", "New RREQ route search for {dest}", ("dest",), TStyle.BLUE)
+EV_UNREACHABLE = event("aodv.unreachable", "Node {next} cannot be reached", ("next",), TStyle.RED)
+EV_NO_ROUTE = event("aodv.no_route", "Node {dest} not in routing table", ("dest",), TStyle.RED)
+EV_BUFFER_DATA = event("aodv.buffer_data", "Buffer data for {dest} with seq {seq}", ("dest", "seq"))
+EV_BUFFER_DROP = event("aodv.buffer_drop", "Send buffer full, dropped data for {dest} with seq {seq}",
+                       ("dest", "seq"), TStyle.RED)
+EV_FLUSH_BUFFER = event("aodv.flush_buffer", "Route to {dest} found, send {count} buffered data",
+                        ("dest", "count"), TStyle.BLUE)
+EV_SEND_DATA = event("aodv.send_data", "Send data to {dest} with seq {seq}", ("dest", "seq"), TStyle.PINK)
+EV_FORWARD_DATA = event("aodv.forward_data", "Forward data with seq {seq} via {next}", ("seq", "next"))
+EV_SEND_RERR = event("aodv.send_rerr", "Sending RERR", (), TStyle.BLUE)
+EV_DISCONNECTED = event("aodv.disconnected", "Node {next} is disconnected ", ("next",), TStyle.RED)
+EV_RECV_RREQ = event("aodv.recv_rreq", "Received RREQ from {src}", ("src",), TStyle.LIGHTGREEN)
+EV_SEND_RREP = event("aodv.send_rrep", "Send RREP to {dest}", ("dest",), TStyle.BLUE)
+EV_HAS_ROUTE = event("aodv.has_route", "Node {node} has route to {dest}", ("dest",), TStyle.LIGHTGREEN)
+EV_RECV_RREP = event("aodv.recv_rrep", "Received RREP from {src}", ("src",), TStyle.LIGHTGREEN)
+EV_RECV_DATA = event("aodv.recv_data", "Got data from {src} with seq {seq}", ("src", "seq"), TStyle.LIGHTGREEN)
+EV_RECV_RERR = event("aodv.recv_rerr", "Received RERR for {dest} from {src}", ("dest", "src"), TStyle.LIGHTGREEN)
+EV_RING = event("aodv.ring", "RREQ ring {ring} for {dest}", ("ring", "dest"), TStyle.BLUE)
+EV_DISCOVERY_FAILED = event("aodv.discovery_failed", "No route to {dest} found", ("dest",), TStyle.RED)
+EV_ROUTES_BROKEN = event("aodv.routes_broken", "Link to {next} broke {count} route(s)", ("next", "count"), TStyle.RED)
+EV_COLLISION = event("aodv.collision", "Lost a {type} message from {sender}", ("type", "sender"), TStyle.RED,
+                     names={"type": {msg_type.value: msg_type.name for msg_type in MTypes}})
+
+
+def _message_type(msg, hops):
+    return msg.type.name
+
+
+def _received_message_type(sender, msg, hops):
+    return msg.type.name
+
 
 def delay(a=0.2, b=0.8):
     """Random delay between `a=0.2` and `b=0.8`"""
     return 0.3
 
 
-class MyNode(wsp.Node):
+# second(s) between which a node rebroadcasts a RREQ on the simulator's channel,
+# drawn at random so that neighbors do not forward the same flood at once
+REBROADCAST_JITTER = (0.2, 0.8)
+
+
+REPLY_DELAY = 3  # second(s) the destination waits before it answers a RREQ
+
+
+class MyNode(Traced, wsp.Node):
     """
     Node class that implements all routing behaviour of our node.
     """
 
     tx_range = 100
     draw_arrows = True
-    cancel_data_transfer = False
+    send_interval = 1  # second(s) between the data messages the application generates
+    bitrate = 250e3  # bit/s on the simulator's channel, if it has one
     seq = 1
-    RREQ_queue = []
+    # TTLs of the expanding ring search
+    ring_ttls = ring_steps()
 
     def __init__(self, sim, id, pos):
         """Define variables and initiate node superclass"""
         super().__init__(sim, id, pos)
 
         # Routing table,
-        # the seq in the table entry to itself is very high
-        self.table = {id: {"dest": id, "next": id, "seq": 1000, "hops": 0}}
+        # the seq in the table entry to itself is very high and it never expires
+        self.table = RoutingTable(sim.env)
+        self.table.update(id, id, 1000, 0, lifetime=INFINITE)
+
+        # RREQs that were already handled, so each is rebroadcast at most once
+        self.rreq_seen = SeenCache(sim.env)
+        self._net_diameter = NET_DIAMETER
+        self.rreq_id = 0
+        self.rreq_limiter = RateLimiter(sim.env)
+        # Destinations we're searching a route to -> event triggered by the RREP
+        self.discovering = {}
+
+        # Data waiting for a route
+        self.send_buffer = SendBuffer()
+
+        # Route discovery metrics, see `Routing.discovery.discovery_summary`
+        self.discoveries = []  # (latency, number of rings) of every discovered route
+        self.discovery_failures = 0
+        self.rreq_sent = Counter()  # RREQ ttl -> number of RREQs sent or forwarded
+
+        # Latency of every DATA message delivered to this node
+        self.latencies = array("d")
+        # Messages lost on the simulator's channel
+        self.collisions = 0
+        self._jitter = sim.rng(JITTER, id)
 
     def init(self):
         super().init()
 
+    @property
+    def net_diameter(self):
+        """Maximum number of hops of a route, the RREQ timeouts and lifetimes grow with it"""
+        return self._net_diameter
+
+    @net_diameter.setter
+    def net_diameter(self, hops):
+        self._net_diameter = hops
+        self.rreq_seen.lifetime = 2 * net_traversal_time(hops)
+
     def run(self):
         self.scene.nodecolor(self.id, .7, .7, .7)
 
     def start_send_to(self, dest):
-        self.log(f"{TStyle.GREEN}Initiating sending to node {dest}{TStyle.ENDC}")
+        self.trace(EV_START, dest)
 
         yield self.timeout(0.01)  # Very small delay to make sure we're initialised.
 
@@ -51,25 +141,52 @@ class MyNode(wsp.Node):
         self.scene.nodewidth(dest, 2)
 
         yield self.timeout(1)
-        # Start by sending rreq
         if dest in self.table:
-            self.log(f"{TStyle.LIGHTGREEN}Route to {dest} found in routing table{TStyle.ENDC}")
-            self.log(f"{TStyle.BLUE}Start sending data{TStyle.ENDC}")
-            # Start new process to send data and keep simulating at the same time
-            self.start_process(self.start_send_data(dest))
-        else:
-            self.find_route(dest)
-        # For the first RREQ the seq of the node is taken
+            self.trace(EV_ROUTE_KNOWN, dest)
+        self.trace(EV_START_DATA)
+        # Start new process to send data and keep simulating at the same time,
+        # without a route the data is buffered until the RREQ comes back
+        self.start_process(self.start_send_data(dest))
 
     def find_route(self, dest):
         # If we're already searching for a route, ignore
-        if dest in self.RREQ_queue:
+        if dest in self.discovering:
             return
-        # Else, say that we're searching and broadcast RREQ message
-        self.RREQ_queue.append(dest)
-        self.log(f"{TStyle.BLUE}New RREQ route search for {dest}{TStyle.ENDC}")
-        msg = Message(MTypes.RREQ, self.id, self.seq, dest)
-        self.send_rreq(msg)
+        # Else, say that we're searching and broadcast RREQ messages
+        self.discovering[dest] = self.sim.env.event()
+        self.trace(EV_ROUTE_SEARCH, dest)
+        self.start_process(self.expanding_ring_search(dest))
+
+    def expanding_ring_search(self, dest):
+        """
+        Send RREQs with growing TTLs until a RREP comes back
+        :param int dest: Destination to find a route to
+        """
+        found = self.discovering[dest]
+        start = self.now
+        for ring, ttl in enumerate(self.ring_ttls, 1):
+            wait = self.rreq_limiter.delay()
+            if wait > 0:
+                yield self.timeout(wait)
+            self.rreq_limiter.record()
+
+            self.trace(EV_RING, ring, dest)
+            self.rreq_id += 1
+            # Don't handle our own RREQ when a neighbor rebroadcasts it
+            self.rreq_seen.seen(self.id, self.rreq_id)
+            msg = Message(MTypes.RREQ, self.id, self.seq, dest, payload={"rreq_id": self.rreq_id}, ttl=ttl)
+            self.send_rreq(msg, 0)
+
+            yield found | self.timeout(ring_traversal_time(ttl, REPLY_DELAY, self._net_diameter))
+            if found.triggered:
+                self.discoveries.append((self.now - start, ring))
+                return
+
+        # Give up, and with it on the data for this destination
+        self.discovering.pop(dest).succeed(False)
+        self.discovery_failures += 1
+        self.trace(EV_DISCOVERY_FAILED, dest)
+        self.send_buffer.drop_all(dest)
 
     def print_table(self):
         """Pretty print routing table"""
@@ -78,220 +195,307 @@ class MyNode(wsp.Node):
         print('+' + '-' * dashes + '+')  # Row of ---
         print(f"| {'Dest':<8}| {'Next':<8}| {'Seq':<8}| {'Hops':<8}|")
         print('+' + '-' * dashes + '+')  # Row of ---
-        for i, row in self.table.items():
-            print(f"| {row['dest']:<8}| {row['next']:<8}| {row['seq']:<8}| {row['hops']:<8}|")
+        for route in self.table.routes():
+            print(f"| {route.dest:<8}| {route.next:<8}| {route.seq:<8}| {route.hops:<8}|")
         print('+' + '-' * dashes + '+')  # Row of ---
 
+    def is_neighbor(self, node_id):
+        """
+        Check whether a node is within our TX range, without scanning the neighbor list
+        :param int node_id: Id of the node to check
+        :return: Whether the node can be reached directly
+        """
+        if node_id == self.id:
+            return False
+        return distance(self.pos, self.sim.nodes[node_id].pos) <= self.tx_range
+
     def next_reachable(self, msg):
         """
         Check if the path still exists and send RERR if not
         :param Message msg: The message to check the path for
         :return: Whether path is available
         """
-        reachable = False
         next_hop = None
+        route = self.table.get(msg.dest)
         # If the destination is not in our table (anymore), send
-        if msg.dest in self.table:
-            next_hop = self.table[msg.dest]["next"]
-            for node in self.neighbors:
-                if next_hop == node.id:
-                    reachable = True
-                    break
-            if not reachable:
-                self.log(f"{TStyle.RED}Node {next_hop} cannot be reached{TStyle.ENDC}")
+        if route is not None:
+            next_hop = route.next
+            if self.is_neighbor(next_hop):
+                return True
+            self.trace(EV_UNREACHABLE, next_hop)
+            # The link is gone, so is every route over it
+            broken = self.table.break_link(next_hop)
+            self.trace(EV_ROUTES_BROKEN, next_hop, len(broken))
+            unreachable = [route.dest for route in broken]
+            precursors = set().union(*(route.precursors for route in broken))
         else:
-            self.log(f"{TStyle.RED}Node {msg.dest} not in routing table{TStyle.ENDC}")
-
-        if not reachable:
-            # Remove original destination from the routing table
-            if msg.dest in self.table:
-                del self.table[msg.dest]
-            # Message type = RERR
-            # Src = destination, this will be used to restart the RREQ to this destination
-            # seq = making it 0 ensures that no table will be updated
-            # Dest = the source of the data message
-            self.send_rerr(
-                Message(MTypes.RERR, self.id, 0, msg.src, payload={"orig_dest": msg.dest, "broken_link": next_hop})
-            )
-
-        return reachable
-
-    def send_rreq(self, msg):
+            self.trace(EV_NO_ROUTE, msg.dest)
+            unreachable = [msg.dest]
+            precursors = set()
+
+        # Message type = RERR
+        # Src = destination, this will be used to restart the RREQ to this destination
+        # seq = making it 0 ensures that no table will be updated
+        # Dest = the source of the data message
+        payload = {"orig_dest": msg.dest, "broken_link": next_hop, "unreachable": unreachable}
+        self.send_rerr(Message(MTypes.RERR, self.id, 0, msg.src, payload=payload), 0, precursors)
+        return False
+
+    def send(self, dest, msg, hops):
+        """
+        Send `msg` over the simulator's channel (see `Common.channel`), or
+        without a channel straight to the nodes in range like wsnsimpy does
+        """
+        channel = self.sim.channel
+        if channel is None:
+            super().send(dest, msg, hops)
+            return
+
+        if self.sim.drawing:
+            self._draw_send(dest)
+        channel.transmit(self, dest, MESSAGE_SIZE[msg.type] * 8 / self.bitrate, msg, hops)
+
+    def _draw_send(self, dest):
+        # The same shapes as wsnsimpy's Node.send
+        shape = self.scene.circle(self.pos[0], self.pos[1], self.tx_range, line="wsnsimpy:tx")
+        self.delayed_exec(0.2, self.scene.delshape, shape)
+        if dest != wsp.BROADCAST_ADDR:
+            dest_pos = self.sim.nodes[dest].pos
+            shape = self.scene.line(self.pos[0], self.pos[1], dest_pos[0], dest_pos[1], line="wsnsimpy:unicast")
+            self.delayed_exec(0.2, self.scene.delshape, shape)
+
+    def on_collision(self, sender, msg, hops):
+        """Called by the channel for a message that could not be received"""
+        self.trace(EV_COLLISION, msg.type.value, sender)
+        self.collisions += 1
+
+    def rebroadcast_delay(self):
+        """
+        Seconds to wait before rebroadcasting a RREQ. Without a channel every
+        neighbor waits the same `delay()`, on a channel their messages would
+        collide, so each draws a random delay from its jitter stream.
+        """
+        if self.sim.channel is None:
+            return delay()
+        return self._jitter.uniform(*REBROADCAST_JITTER)
+
+    @profiled(_message_type)
+    def send_rreq(self, msg, hops):
         """
         Broadcast RREQ to all nodes in TX range
         :param Message msg: Message to send
+        :param int hops: Number of hops the message has taken so far
         """
-        message = msg.hop()
-        self.send(wsp.BROADCAST_ADDR, msg=message)
+        self.rreq_sent[msg.ttl] += 1
+        self.send(wsp.BROADCAST_ADDR, msg, hops + 1)
 
-    def send_rreply(self, msg):
+    def send_rreply(self, msg, hops):
         """
         Send RREP to next link to destination
         :param Message msg: Message to send
+        :param int hops: Number of hops the message has taken so far
         """
-        if self.id is not msg.dest:
-            if self.id is not msg.src:
+        if self.id != msg.dest:
+            if self.id != msg.src:
                 # If we're a node in the path, make node cyan and bold
                 self.scene.nodecolor(self.id, 0, .7, .9)
                 self.scene.nodewidth(self.id, 2)
 
             # Forward RREP to previous link in the "routing table"
             if self.next_reachable(msg):
-                message = msg.hop()
-                self.send(self.table[msg.dest]["next"], msg=message)
+                next_hop = self.table[msg.dest].next
+                # The previous link will send its data for the RREP's source over us
+                self.table.add_precursor(msg.src, next_hop)
+                self.send(next_hop, msg, hops + 1)
 
     def start_send_data(self, dest):
-        # Remove visual links/pointers
-        self.scene.clearlinks()
         # First the seq is updated and for each data message a higher seq is taken
         self.seq += 1
-        # Send a random amount of data with frequency of 1/s
-        for i in range(random.randint(4, 9)):
-            yield self.timeout(1)
-            if self.cancel_data_transfer:
-                self.log("Canceled data transfer")
-                break
-            self.log(f"{TStyle.PINK}Send data to {dest} with seq {self.seq}{TStyle.ENDC}")
-            message = Message(MTypes.DATA, self.id, self.seq, dest)
-            self.send_data(message)
+        # Generate a random amount of data every `send_interval`
+        for i in range(self.sim.rng(TRAFFIC, self.id).randint(4, 9)):
+            self.submit(Message(MTypes.DATA, self.id, self.seq, dest, created=self.now))
             self.seq += 1
+            yield self.timeout(self.send_interval)
 
-        if self.cancel_data_transfer:
-            self.cancel_data_transfer = False
-        else:
-            yield self.timeout(2)
-            demo_control_callback()
+        # Wait until the buffered data is sent, or dropped when no route was found
+        if dest in self.discovering:
+            yield self.discovering[dest]
+        yield self.timeout(2)
+        demo_control_callback()
 
-    def send_data(self, msg):
+    def submit(self, msg):
+        """
+        Send a DATA message of the application, buffer it while there is no route
+        :param Message msg: Message to send
+        """
+        if msg.dest in self.table and msg.dest not in self.send_buffer:
+            self.trace(EV_SEND_DATA, msg.dest, msg.seq)
+            self.send_data(msg, 0)
+            return
+
+        self.trace(EV_BUFFER_DATA, msg.dest, msg.seq)
+        dropped = self.send_buffer.push(msg)
+        if dropped is not None:
+            self.trace(EV_BUFFER_DROP, dropped.dest, dropped.seq)
+        self.find_route(msg.dest)
+
+    def offer(self, dest, length):
+        """
+        Send a DATA message for a traffic generator, see `Common.traffic`
+        :param int dest: Destination ID
+        :param int length: Ignored, AODV messages have no size
+        """
+        self.submit(Message(MTypes.DATA, self.id, self.seq, dest, created=self.now))
+        self.seq += 1
+
+    def flush_send_buffer(self, dest):
+        """Send all buffered data for `dest` at once, now that there is a route"""
+        messages = self.send_buffer.pop_all(dest)
+        self.trace(EV_FLUSH_BUFFER, dest, len(messages))
+        for msg in messages:
+            self.trace(EV_SEND_DATA, msg.dest, msg.seq)
+            self.send_data(msg, 0)
+
+    @profiled(_message_type)
+    def send_data(self, msg, hops):
         """
         Send data to next link to destination
         :param Message msg: Message to send
+        :param int hops: Number of hops the message has taken so far
         """
         if self.next_reachable(msg):
-            self.log(f"Forward data with seq {msg.seq} via {self.table[msg.dest]['next']}")
-            message = msg.hop()
-            self.send(self.table[msg.dest]["next"], msg=message)
-
-    def send_rerr(self, msg):
+            route = self.table[msg.dest]
+            self.table.refresh(msg.dest)
+            self.trace(EV_FORWARD_DATA, msg.seq, route.next)
+            self.send(route.next, msg, hops + 1)
 
-        if self.id is not msg.dest:
+    def send_rerr(self, msg, hops, precursors):
+        """
+        Send RERR to the neighbors that route over the broken routes
+        :param Message msg: Message to send
+        :param int hops: Number of hops the message has taken so far
+        :param set precursors: Neighbors that used the broken routes
+        """
+        if self.id != msg.dest:
             # If we're a node in the path, make node orange and bold
             self.scene.nodecolor(self.id, 1, .7, 0)
             self.scene.nodewidth(self.id, 2)
 
-            self.log(f"{TStyle.BLUE}Sending RERR{TStyle.ENDC}")
-            # Forward rreply to previous link in the "routing table"
-            nxt = self.table[msg.dest]["next"]
-            message = msg.hop()
-            self.send(nxt, msg=message)
-
-            # Check if the path still exists
-
-            messagesent = 0
-            for node in self.neighbors:
-                if nxt == node.id:
-                    messagesent = 1
-                    break
-
-            if messagesent == 0:
-                nxt = self.table[msg.dest]["next"]
-                self.log(f"{TStyle.RED}Node {nxt} is disconnected ")
-                self.send(wsp.BROADCAST_ADDR, msg=message)
-
-    def on_receive(self, sender, msg, **kwargs):
+            # Without precursors, send it back to the source of the data
+            if not precursors:
+                route = self.table.get(msg.dest)
+                if route is not None:
+                    precursors = {route.next}
+
+            self.trace(EV_SEND_RERR)
+            if len(precursors) == 1:
+                nxt, = precursors
+                # Check if the path still exists
+                if self.is_neighbor(nxt):
+                    self.send(nxt, msg, hops + 1)
+                    return
+                self.trace(EV_DISCONNECTED, nxt)
+            self.send(wsp.BROADCAST_ADDR, msg, hops + 1)
+
+    @profiled(_received_message_type)
+    def on_receive(self, sender, msg, hops):
         """
         All responses to a particular cls (`msg`) type
         :param int sender: Sender id
         :param Message msg: Received message
+        :param int hops: Number of hops the message has taken to get here
         """
 
         if msg.type == MTypes.RREQ:
             # If this destination is new, or this msg is newer, or has a lower hop count, save
-            if msg.src not in self.table or \
-               msg.seq > self.table[msg.src]["seq"] or \
-               (self.table[msg.src]["seq"] == msg.seq and self.table[msg.src]["hops"] > msg.hops):
+            route = self.table.get(msg.src)
+            if route is None or msg.seq > route.seq or (route.seq == msg.seq and route.hops > hops):
+                self.table.update(msg.src, sender, msg.seq, hops,
+                                  lifetime=reverse_route_lifetime(hops, self._net_diameter))
 
-                self.table[msg.src] = {"dest": msg.dest, "next": sender, "seq": msg.seq, "hops": msg.hops}
-            # Else, do nothing
-            else:
-                return
+                # Draw arrow to parent as defined in __main__
+                if self.draw_arrows:
+                    self.scene.addlink(sender, self.id, "parent")
 
-            # Draw arrow to parent as defined in __main__
-            if self.draw_arrows:
-                self.scene.addlink(sender, self.id, "parent")
+            # A copy of this RREQ was handled before, a shorter route was saved but that's it
+            if self.rreq_seen.seen(msg.src, msg.payload["rreq_id"]):
+                return
 
             # If destination receives the RREQ, reply with RREP
-            if self.id is msg.dest:
-                self.log(f"{TStyle.LIGHTGREEN}Received RREQ from {msg.src}{TStyle.ENDC}")
-                yield self.timeout(3)
-                self.log(f"{TStyle.BLUE}Send RREP to {msg.src}{TStyle.ENDC}")
+            if self.id == msg.dest:
+                self.trace(EV_RECV_RREQ, msg.src)
+                yield self.timeout(REPLY_DELAY)
+                self.trace(EV_SEND_RREP, msg.src)
                 # The seq is updated with 10 when DEST receives a RREQ
                 self.seq += 10
-                self.send_rreply(Message(MTypes.RREP, self.id, self.seq, msg.src))
+                self.send_rreply(Message(MTypes.RREP, self.id, self.seq, msg.src), 0)
             # If this node has the route (and it's not stale), reply with RREP
-            elif msg.dest in self.table and self.table[msg.dest]["seq"] >= msg.seq:
-                self.log(f"{TStyle.LIGHTGREEN}Node {self.id} has route to {msg.dest}{TStyle.ENDC}")
+            elif msg.dest in self.table and self.table[msg.dest].seq >= msg.seq:
+                route = self.table[msg.dest]
+                self.trace(EV_HAS_ROUTE, msg.dest)
                 yield self.timeout(1)
-                self.log(f"{TStyle.BLUE}Send RREP to {msg.src}{TStyle.ENDC}")
-                # The seq is updated with 10 when DEST receives a RREQ
-                self.seq += 10
-                self.send_rreply(Message(MTypes.RREP, self.id, self.seq, msg.src))
+                self.trace(EV_SEND_RREP, msg.src)
+                # Reply on behalf of the destination, as if the RREP already took our route to it
+                self.send_rreply(Message(MTypes.RREP, msg.dest, route.seq, msg.src), route.hops)
 
-            # If not destination, broadcast rreq again (with random delay)
-            else:
-                yield self.timeout(delay())
-                self.send_rreq(msg)
+            # If not destination, broadcast rreq again (with random delay) as long as its TTL allows
+            elif msg.ttl is None or hops < msg.ttl:
+                yield self.timeout(self.rebroadcast_delay())
+                self.send_rreq(msg, hops)
 
         elif msg.type == MTypes.RREP:
             # If this destination is new, or this msg is newer, or has a lower hop count, save
-            if msg.src not in self.table or \
-                    msg.seq > self.table[msg.src]["seq"] or \
-                    (self.table[msg.src]["seq"] == msg.seq and self.table[msg.src]["hops"] > msg.hops):
-
-                self.table[msg.src] = {"dest": msg.src, "next": sender, "seq": msg.seq, "hops": msg.hops}
+            route = self.table.get(msg.src)
+            if route is None or msg.seq > route.seq or (route.seq == msg.seq and route.hops > hops):
+                self.table.update(msg.src, sender, msg.seq, hops, lifetime=forward_route_lifetime(self._net_diameter))
             # Else, do nothing
             else:
                 return
 
-            # If we're the source, route is established. Start the data sending process
-            if self.id is msg.dest:
-                self.log(f"{TStyle.LIGHTGREEN}Received RREP from {msg.src}{TStyle.ENDC}")
-                # Remove origin from route finding queue
-                if msg.src in self.RREQ_queue:
-                    self.RREQ_queue.remove(msg.src)
-                yield self.timeout(5)
-                self.log(f"{TStyle.BLUE}Start sending data{TStyle.ENDC}")
-                # Start new process to send data and keep simulating at the same time
-                self.start_process(self.start_send_data(msg.src))
+            # If we're the source, route is established. Send the data that was waiting for it
+            if self.id == msg.dest:
+                self.trace(EV_RECV_RREP, msg.src)
+                # Stop the route search, only the first RREP sends the buffered data
+                found = self.discovering.pop(msg.src, None)
+                if found is None:
+                    return
+                # Remove visual links/pointers
+                self.scene.clearlinks()
+                self.flush_send_buffer(msg.src)
+                found.succeed(True)
             # If not, forward rreply
             else:
                 yield self.timeout(.2)
-                self.send_rreply(msg)
+                self.send_rreply(msg, hops)
 
         elif msg.type == MTypes.DATA:
+            # The route back to the source is in use
+            self.table.refresh(msg.src)
             # If not destination, forward data
-            if self.id is not msg.dest:
+            if self.id != msg.dest:
+                self.table.add_precursor(msg.dest, sender)
                 yield self.timeout(.2)
-                self.send_data(msg)
+                self.send_data(msg, hops)
             else:
-                self.log(f"{TStyle.LIGHTGREEN}Got data from {msg.src} with seq {msg.seq}{TStyle.ENDC}")
+                self.trace(EV_RECV_DATA, msg.src, msg.seq)
+                self.latencies.append(self.now - msg.created)
 
         elif msg.type == MTypes.RERR:
-            # Remove original destination from the routing table
-            if msg.payload["orig_dest"] in self.table:
-                del self.table[msg.payload["orig_dest"]]
+            # Remove the routes that the sender can no longer serve
+            orig_dest = msg.payload["orig_dest"]
+            broken = self.table.invalidate(msg.payload["unreachable"], sender)
+            # Only the nodes that routed over the sender react, so duplicates die out
+            if not broken:
+                return
             # If we get notified that our destination is unreachable
-            if self.id is msg.dest:
-                # Stop the current data transfer
-                self.cancel_data_transfer = True
-                self.log(f"{TStyle.LIGHTGREEN}Received RERR for {msg.payload['orig_dest']} from {msg.src}{TStyle.ENDC}")
-                yield self.timeout(3)
+            if self.id == msg.dest:
+                self.trace(EV_RECV_RERR, msg.payload["orig_dest"], msg.src)
                 # Broadcast a RREQ to find a new path to orig_dest
                 # The seq is updated by 2 when starting a new RREQ
                 self.seq += 2
-                # Restart data sending is automatically triggered when the RREQ comes back
-                self.find_route(msg.payload["orig_dest"])
+                # Data generated in the meantime is buffered and sent when the RREQ comes back
+                self.find_route(orig_dest)
             # If not, forward RERR
             else:
                 yield self.timeout(.2)
-                self.send_rerr(msg)
+                self.send_rerr(msg, hops, set().union(*(route.precursors for route in broken)))
@@ -1,5 +1,5 @@
 from Routing.textstyles import TStyle
-import random
+from Common.rng import TRAFFIC
 import Routing
 
 
@@ -17,8 +17,13 @@ def clear_board():
 def demo_control_callback():
     """Function that defines the demo that we're showing"""
     global demo_index, available_nodes
+    # Nodes simulated outside of the demo (e.g. in benchmarks) have no demo to advance
+    if Routing.simulator is None:
+        return
+
     demo_index += 1
     n_nodes = len(Routing.simulator.nodes)
+    rng = Routing.simulator.rng(TRAFFIC)
 
     print(f"\n{TStyle.RED}{TStyle.BOLD}Demo control callback {demo_index}{TStyle.ENDC}")
 
@@ -44,12 +49,17 @@ def demo_control_callback():
         dest_id = n_nodes - 1
         # Remove a node in the path
         node = source_node
-        # Follow the route for 3 links
+        # Follow the route for 3 links, as far as it goes when messages were
+        # lost on the channel and no (complete) route was found
         for i in range(4):
-            node = Routing.simulator.nodes[node.table[dest_id]["next"]]
-        node.move(5000, 5000)  # Move the node far away to "remove" it.
-        print(f"{TStyle.UNDERLINE}Removing node {node.id}{TStyle.ENDC}")
-        available_nodes.remove(node)  # Remove removed node from available nodes
+            route = node.table.get(dest_id)
+            if route is None or route.next == dest_id:
+                break
+            node = Routing.simulator.nodes[route.next]
+        if node is not source_node:
+            node.move(5000, 5000)  # Move the node far away to "remove" it.
+            print(f"{TStyle.UNDERLINE}Removing node {node.id}{TStyle.ENDC}")
+            available_nodes.remove(node)  # Remove removed node from available nodes
 
         source_node.start_process(source_node.start_send_to(dest_id))
 
@@ -60,9 +70,9 @@ def demo_control_callback():
         clear_board()
 
         # Fixme: make sure the nodes are not too close together and also not the removed node and also not itself!
-        new_sender = random.choice(available_nodes)
+        new_sender = rng.choice(available_nodes)
         available_nodes.remove(new_sender)  # Temporarily remove new sender so it doesn't choose itself for dest
-        new_receiver = random.choice(available_nodes)
+        new_receiver = rng.choice(available_nodes)
         available_nodes.append(new_sender)  # Re-add
 
         new_sender.start_process(new_sender.start_send_to(new_receiver.id))
@@ -77,10 +87,10 @@ def demo_control_callback():
         # Start 3 simultaneous processes
         print(f"{TStyle.UNDERLINE}Starting 3 processes{TStyle.ENDC}")
         for i in range(3):
-            new_sender = random.choice(available_nodes)
+            new_sender = rng.choice(available_nodes)
             available_nodes.remove(new_sender)
 
-            new_receiver = random.choice(available_nodes)
+            new_receiver = rng.choice(available_nodes)
             available_nodes.remove(new_receiver)
 
             new_sender.start_process(new_sender.start_send_to(new_receiver.id))
@@ -89,4 +99,4 @@ def demo_control_callback():
     else:
         clear_board()
         # Print a random node's table
-        Routing.simulator.nodes[random.randint(0, n_nodes - 1)].print_table()
+        Routing.simulator.nodes[rng.randint(0, n_nodes - 1)].print_table()
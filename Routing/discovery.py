@@ -0,0 +1,89 @@
+"""
+Route discovery with an expanding ring search (RFC 3561 section 6.4).
+
+A RREQ first goes out with a small TTL. When no RREP comes back within the
+ring's traversal time, the next one goes out with a larger TTL, and only the
+last ring floods the whole network. Originating RREQs is rate limited per
+node.
+"""
+from collections import Counter, deque
+from statistics import mean, median
+
+from Routing.routing_table import NET_DIAMETER, NODE_TRAVERSAL_TIME, net_traversal_time
+
+TTL_START = 1
+TTL_INCREMENT = 2
+TTL_THRESHOLD = 7
+TIMEOUT_BUFFER = 2  # extra hops of waiting time per ring
+RREQ_RATELIMIT = 10  # RREQs a node originates per second at most
+
+
+def ring_steps(start=TTL_START, increment=TTL_INCREMENT, threshold=TTL_THRESHOLD):
+    """
+    TTLs of the rings to search, e.g. (1, 3, 5, 7, None). The last ring has
+    no TTL and reaches the whole network.
+    """
+    return tuple(range(start, threshold + 1, increment)) + (None,)
+
+
+def ring_traversal_time(ttl, reply_delay=0, net_diameter=NET_DIAMETER):
+    """
+    Seconds to wait for a RREP to a RREQ with `ttl`
+    :param int ttl: TTL of the RREQ, None for a network-wide RREQ
+    :param float reply_delay: Seconds a node waits before it answers a RREQ
+    :param int net_diameter: Maximum number of hops of a route in the network
+    """
+    if ttl is None:
+        return 2 * net_traversal_time(net_diameter) + reply_delay
+    return 2 * NODE_TRAVERSAL_TIME * (ttl + TIMEOUT_BUFFER) + reply_delay
+
+
+class RateLimiter:
+    """Allows at most `rate` actions in every second of simulated time"""
+
+    def __init__(self, env, rate=RREQ_RATELIMIT):
+        self._env = env
+        self.rate = rate
+        self._times = deque()  # times of the actions in the last second
+
+    def delay(self):
+        """Seconds to wait before the next action is allowed"""
+        now = self._env.now
+        while self._times and self._times[0] <= now - 1:
+            self._times.popleft()
+        if len(self._times) < self.rate:
+            return 0
+        return self._times[0] + 1 - now
+
+    def record(self):
+        self._times.append(self._env.now)
+
+
+def _ring_name(ttl):
+    return "network" if ttl is None else str(ttl)
+
+
+def discovery_summary(nodes):
+    """
+    Route discovery metrics of a finished simulation
+    :param list nodes: The simulated MyNodes
+    :return: dict with the number of (failed) discoveries, their latency, the
+             RREQ transmissions per ring TTL and the data dropped while waiting
+             for a route
+    """
+    latencies = [latency for node in nodes for latency, _ in node.discoveries]
+    rings = [ring for node in nodes for _, ring in node.discoveries]
+    transmissions = Counter()
+    for node in nodes:
+        transmissions.update(node.rreq_sent)
+
+    return {
+        "discoveries": len(latencies),
+        "discovery_failures": sum(node.discovery_failures for node in nodes),
+        "discovery_latency_mean": mean(latencies) if latencies else None,
+        "discovery_latency_p50": median(latencies) if latencies else None,
+        "discovery_rings_mean": mean(rings) if rings else None,
+        "rreq_transmissions": sum(transmissions.values()),
+        "rreq_per_ring": {_ring_name(ttl): count for ttl, count in transmissions.items()},
+        "buffer_drops": sum(node.send_buffer.dropped for node in nodes),
+    }
@@ -1,35 +1,87 @@
 import Routing
+from Common.rng import TOPOLOGY
+from Routing.discovery import discovery_summary
+from Routing.AODVNode import MyNode
+from Routing.routing_table import NET_DIAMETER
+
+TERRAIN_SIZE = 600
+TERRAIN_MARGIN = 80
+GRID_SIZE = 7
+NODE_DISTANCE = (TERRAIN_SIZE - 2 * TERRAIN_MARGIN) / (GRID_SIZE - 1)
+TX_RANGE = 95
+UNTIL = 250  # simulated second(s), long enough for the whole demo
+
+
+def place_nodes(simulator, columns=GRID_SIZE, rows=GRID_SIZE):
+    """
+    Place nodes in a grid with a random offset, the demo uses a 7x7 grid.
+    Larger grids keep the same node distance and grow the field instead.
+
+    :param Simulator simulator: Simulator to add the nodes to
+    :param int columns: Number of nodes along the x axis
+    :param int rows: Number of nodes along the y axis
+    :return: List of the added nodes
+    """
+    rng = simulator.rng(TOPOLOGY)
+    # Routes along the edges of a large grid take more hops than the default
+    # network diameter, their RREPs would come back after the reverse routes
+    # expired
+    net_diameter = max(NET_DIAMETER, columns + rows - 2)
+    nodes = []
+    for x in range(columns):
+        for y in range(rows):
+            px = TERRAIN_MARGIN + x * NODE_DISTANCE + rng.uniform(-20, 20)
+            py = TERRAIN_MARGIN + y * NODE_DISTANCE + rng.uniform(-20, 20)
+            node = simulator.add_node(MyNode, (px, py))
+            node.tx_range = TX_RANGE
+            node.net_diameter = net_diameter
+            nodes.append(node)
+    return nodes
+
 
 if __name__ == '__main__':
-    import random
-    import wsnsimpy.wsnsimpy_tk as wsp
-    from Routing.AODVNode import MyNode
+    import argparse
+    from Common.channel import CHANNELS
+    from Common.simulator import Simulator
 
-    terrain_size = 600
-    terrain_margin = 80
-    playfield = terrain_size - 2 * terrain_margin
+    parser = argparse.ArgumentParser(description="Dynamic AODV Demo")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="master seed for all random streams (default: random)")
+    parser.add_argument("--trace", metavar="PATH", default=None,
+                        help="write a binary event trace to PATH, read it with `python -m Common.trace PATH`")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="profile the node methods and write a collapsed-stack (flamegraph) file to PATH")
+    parser.add_argument("--record", metavar="PATH", default=None,
+                        help="record the visualization to PATH, play it with `python -m Common.replay PATH`")
+    parser.add_argument("--channel", choices=list(CHANNELS), default=None,
+                        help="send over a shared medium on which messages can be lost: disk loses every message"
+                             " that overlaps another one, sinr decides by the signal to interference plus noise"
+                             " ratio (default: no medium, every message in range arrives)")
+    args = parser.parse_args()
 
     # Initiate simulator
-    Routing.simulator = wsp.Simulator(
-        until=150,
+    Routing.simulator = Simulator(
+        until=UNTIL,
         timescale=1,
         visual=True,
-        terrain_size=(terrain_size, terrain_size),
-        title="Dynamic AODV Demo"
+        terrain_size=(TERRAIN_SIZE, TERRAIN_SIZE),
+        title="Dynamic AODV Demo",
+        seed=args.seed
     )
+    print(f"Seed: {Routing.simulator.seed}")
+    if args.trace is not None:
+        Routing.simulator.start_trace(args.trace)
+    if args.profile is not None:
+        Routing.simulator.start_profile(args.profile)
+    if args.record is not None:
+        Routing.simulator.start_recording(args.record)
+    if args.channel is not None:
+        Routing.simulator.use_channel(args.channel)
 
     # Define a line style for parent links
     Routing.simulator.scene.linestyle("parent", color=(0, .8, 0), arrow="tail", width=2)
 
-    # Place nodes in grid with random offset
-    node_distance = playfield / 6
-    for x in range(7):
-        for y in range(7):
-            px = terrain_margin + x * node_distance + random.uniform(-20, 20)
-            py = terrain_margin + y * node_distance + random.uniform(-20, 20)
-            node = Routing.simulator.add_node(MyNode, (px, py))
-            node.tx_range = 95
-            node.logging = True
+    place_nodes(Routing.simulator)
 
     source_node = Routing.simulator.nodes[1]
     # In order to allow a function to use timeouts (delays),
@@ -39,3 +91,7 @@ if __name__ == '__main__':
 
     # Start simulation
     Routing.simulator.run()
+
+    summary = discovery_summary(Routing.simulator.nodes)
+    print(f"{summary['discoveries']} routes discovered, {summary['discovery_failures']} failed,"
+          f" {summary['rreq_transmissions']} RREQs sent, per ring TTL: {summary['rreq_per_ring']}")
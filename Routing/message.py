@@ -9,21 +9,41 @@ class MTypes(Enum):
     DATA = 4
 
 
+# Bytes on the air per message type, the control messages as in RFC 3561
+MESSAGE_SIZE = {
+    MTypes.RREQ: 24,
+    MTypes.RREP: 20,
+    MTypes.RERR: 12,
+    MTypes.DATA: 64,
+}
+
+
 def delay(a=0.2, b=0.8):
     """Random delay between `a=0.2` and `b=0.8`"""
     return 0.3
 
 
 class Message:
-    """AODV message class"""
+    """
+    AODV message class.
+
+    A message is never changed after it is created, so a single instance is
+    shared by every node that receives or forwards it. The number of hops a
+    copy has taken travels next to the message (see `MyNode.on_receive`),
+    which means forwarding does not have to allocate a new message.
+    """
+
+    __slots__ = ("type", "src", "seq", "dest", "payload", "created", "ttl")
 
-    def __init__(self, type, src, seq, dest, hops=0, payload=None):
+    def __init__(self, type, src, seq, dest, payload=None, created=None, ttl=None):
         """
         :param MTypes type: Message type
         :param int src: Source ID
         :param int seq: Sequence ID
         :param int dest: Destination ID
-        :param int hops: Number of hops taken
+        :param dict payload: Extra fields, e.g. the broken link of a RERR
+        :param float created: Simulated time a DATA message was generated, used to measure its latency
+        :param int ttl: Number of hops a RREQ may take, None for no limit
         """
         # if type not in message_types:
         #     raise Exception(f"Message type ${type} not supported, possible options: ${repr(message_types)}.")
@@ -31,16 +51,6 @@ class Message:
         self.src = src
         self.seq = seq
         self.dest = dest
-        self.hops = hops
         self.payload = payload
-
-    @classmethod
-    def from_other(cls, message):
-        """
-        :param Message cls: Class
-        :param Message message: Message object to clone
-        """
-        return Message(message.type, message.src, message.seq, message.dest, message.hops + 1, message.payload)
-
-    def hop(self):
-        return Message(self.type, self.src, self.seq, self.dest, self.hops + 1, self.payload)
+        self.created = created
+        self.ttl = ttl
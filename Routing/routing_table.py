@@ -0,0 +1,171 @@
+# Timeouts as in RFC 3561 section 10, scaled to the delays of the simulation
+ACTIVE_ROUTE_TIMEOUT = 10  # second(s) a route stays valid after it was last used
+MY_ROUTE_TIMEOUT = 2 * ACTIVE_ROUTE_TIMEOUT  # lifetime of a route learned from a RREP
+NODE_TRAVERSAL_TIME = 0.3  # second(s) a message takes per hop
+NET_DIAMETER = 35  # maximum number of hops of a route, must cover the network
+INFINITE = float("inf")
+
+
+def net_traversal_time(net_diameter=NET_DIAMETER):
+    """Seconds a message may take to cross a network of `net_diameter` hops"""
+    return 2 * NODE_TRAVERSAL_TIME * net_diameter
+
+
+NET_TRAVERSAL_TIME = net_traversal_time()
+PATH_DISCOVERY_TIME = 2 * NET_TRAVERSAL_TIME  # second(s) a RREQ is remembered
+
+
+def reverse_route_lifetime(hops, net_diameter=NET_DIAMETER):
+    """
+    Lifetime of the route back to the source of a RREQ that has taken `hops`
+    hops, long enough for the RREP to come back over it.
+    """
+    return max(ACTIVE_ROUTE_TIMEOUT, 2 * net_traversal_time(net_diameter) - 2 * hops * NODE_TRAVERSAL_TIME)
+
+
+def forward_route_lifetime(net_diameter=NET_DIAMETER):
+    """
+    Lifetime of the route to the destination learned from a RREP, long enough
+    for the RREP to reach the source and the first data to come back over it.
+    """
+    return max(MY_ROUTE_TIMEOUT, net_traversal_time(net_diameter))
+
+
+class Route:
+    """Routing table entry"""
+
+    __slots__ = ("dest", "next", "seq", "hops", "expires", "precursors")
+
+    def __init__(self, dest, next_hop, seq, hops, expires):
+        """
+        :param int dest: Destination ID
+        :param int next_hop: Neighbor to forward messages for `dest` to
+        :param int seq: Sequence number of the destination the route was learned with
+        :param int hops: Number of hops to the destination
+        :param float expires: Simulated time the route is no longer valid at
+        """
+        self.dest = dest
+        self.next = next_hop
+        self.seq = seq
+        self.hops = hops
+        self.expires = expires
+        self.precursors = set()  # neighbors that forward over this route
+
+
+class RoutingTable:
+    """
+    Routes by destination. Every route has a lifetime that is extended
+    whenever it is used, expired routes are only removed when they are looked
+    up. A reverse index from next hop to destinations lets a link break
+    invalidate every route over that link at once, without scanning the
+    table.
+    """
+
+    def __init__(self, env, lifetime=ACTIVE_ROUTE_TIMEOUT):
+        """
+        :param simpy.Environment env: Environment to read the simulated time from
+        :param float lifetime: Seconds a route stays valid after it was last used
+        """
+        self._env = env
+        self.lifetime = lifetime
+        self._routes = {}  # dest -> Route
+        self._via = {}  # next hop -> set of destinations routed over it
+
+    def get(self, dest):
+        """The valid route to `dest`, or None"""
+        route = self._routes.get(dest)
+        if route is not None and route.expires <= self._env.now:
+            self._remove(route)
+            return None
+        return route
+
+    def __contains__(self, dest):
+        return self.get(dest) is not None
+
+    def __getitem__(self, dest):
+        route = self.get(dest)
+        if route is None:
+            raise KeyError(dest)
+        return route
+
+    def routes(self):
+        """All valid routes"""
+        return [route for route in list(self._routes.values()) if self.get(route.dest) is not None]
+
+    def update(self, dest, next_hop, seq, hops, lifetime=None):
+        """
+        Add or replace the route to `dest`. The precursors of an existing
+        route are kept.
+
+        :param float lifetime: Seconds the route is valid, the table's lifetime if None
+        :return: Route
+        """
+        expires = self._env.now + (self.lifetime if lifetime is None else lifetime)
+        route = self._routes.get(dest)
+        if route is None:
+            route = self._routes[dest] = Route(dest, next_hop, seq, hops, expires)
+        else:
+            if route.next != next_hop:
+                self._unlink(route)
+                route.next = next_hop
+            route.seq = seq
+            route.hops = hops
+            route.expires = expires
+
+        self._via.setdefault(next_hop, set()).add(dest)
+        return route
+
+    def refresh(self, dest):
+        """Extend the lifetime of the route to `dest` because it is in use"""
+        route = self.get(dest)
+        if route is not None:
+            route.expires = max(route.expires, self._env.now + self.lifetime)
+
+    def add_precursor(self, dest, node_id):
+        route = self.get(dest)
+        if route is not None and node_id != route.next:
+            route.precursors.add(node_id)
+
+    def remove(self, dest):
+        """Remove the route to `dest`, returns the removed Route or None"""
+        route = self._routes.get(dest)
+        if route is not None:
+            self._remove(route)
+        return route
+
+    def break_link(self, next_hop):
+        """
+        Remove every route that goes over `next_hop`.
+
+        :return: List of the removed routes
+        """
+        return [self._routes.pop(dest) for dest in self._via.pop(next_hop, ())]
+
+    def invalidate(self, dests, next_hop):
+        """
+        Remove the routes to `dests` that go over `next_hop`, e.g. because
+        `next_hop` reported them unreachable.
+
+        :return: List of the removed routes
+        """
+        broken = []
+        via = self._via.get(next_hop)
+        if via is None:
+            return broken
+
+        for dest in dests:
+            if dest in via:
+                broken.append(self._routes[dest])
+                self._remove(self._routes[dest])
+        return broken
+
+    def _unlink(self, route):
+        via = self._via.get(route.next)
+        if via is not None:
+            via.discard(route.dest)
+            if not via:
+                del self._via[route.next]
+
+    def _remove(self, route):
+        del self._routes[route.dest]
+        self._unlink(route)
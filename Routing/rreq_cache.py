@@ -0,0 +1,45 @@
+from collections import OrderedDict
+
+from Routing.routing_table import PATH_DISCOVERY_TIME
+
+SEEN_CAPACITY = 1024  # RREQs a node remembers at most
+
+
+class SeenCache:
+    """
+    The RREQs a node has already handled, by (originator, RREQ ID). Every
+    entry lives for the same time, so insertion order is also expiry order
+    and expired entries are removed from the front when a new one is added.
+    When full, the oldest entry is dropped.
+    """
+
+    def __init__(self, env, lifetime=PATH_DISCOVERY_TIME, capacity=SEEN_CAPACITY):
+        """
+        :param simpy.Environment env: Environment to read the simulated time from
+        :param float lifetime: Seconds a RREQ is remembered
+        :param int capacity: Maximum number of RREQs to remember
+        """
+        self._env = env
+        self.lifetime = lifetime
+        self.capacity = capacity
+        self._expires = OrderedDict()  # (originator, RREQ ID) -> expiry time
+
+    def seen(self, originator, rreq_id):
+        """
+        Check whether a RREQ was seen before and remember it if not
+        :return: Whether the RREQ was already seen
+        """
+        now = self._env.now
+        key = (originator, rreq_id)
+        expires = self._expires.get(key)
+        if expires is not None and expires > now:
+            return True
+
+        while self._expires:
+            oldest = next(iter(self._expires.values()))
+            if oldest > now and len(self._expires) < self.capacity:
+                break
+            self._expires.popitem(last=False)
+
+        self._expires[key] = now + self.lifetime
+        return False
@@ -0,0 +1,60 @@
+from collections import deque
+
+SEND_BUFFER_SIZE = 64  # packets buffered per destination at most
+
+DROP_OLDEST = "oldest"
+DROP_NEWEST = "newest"
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST)
+
+
+class SendBuffer:
+    """
+    DATA messages waiting for a route, with a bounded queue per destination.
+    When the queue of a destination is full, `policy` decides whether the
+    oldest buffered message or the new one is dropped.
+    """
+
+    def __init__(self, capacity=SEND_BUFFER_SIZE, policy=DROP_OLDEST):
+        """
+        :param int capacity: Maximum number of messages per destination
+        :param str policy: DROP_OLDEST or DROP_NEWEST
+        """
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy {policy!r}, possible options: {DROP_POLICIES}")
+
+        self.capacity = capacity
+        self.policy = policy
+        self._queues = {}  # dest -> deque of messages
+        self.dropped = 0
+
+    def __contains__(self, dest):
+        return dest in self._queues
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def push(self, msg):
+        """
+        Buffer `msg` until there is a route to its destination
+        :return: The dropped message, or None
+        """
+        queue = self._queues.setdefault(msg.dest, deque())
+        dropped = None
+        if len(queue) >= self.capacity:
+            if self.policy == DROP_NEWEST:
+                self.dropped += 1
+                return msg
+            dropped = queue.popleft()
+            self.dropped += 1
+        queue.append(msg)
+        return dropped
+
+    def pop_all(self, dest):
+        """Remove and return the buffered messages for `dest`, oldest first"""
+        return self._queues.pop(dest, ())
+
+    def drop_all(self, dest):
+        """Drop the buffered messages for `dest`, e.g. because no route was found"""
+        dropped = len(self._queues.pop(dest, ()))
+        self.dropped += dropped
+        return dropped
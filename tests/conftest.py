@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The tests are run from any directory, make the packages in the repository
+# root and the MAC modules importable like the demos do
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "MAC")]
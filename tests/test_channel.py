@@ -0,0 +1,146 @@
+import pytest
+import simpy
+from wsnsimpy.wsnsimpy import BROADCAST_ADDR, ensure_generator
+
+from Common.channel import CHANNELS, PROPAGATION_SPEED
+
+AIRTIME = 0.001  # second(s)
+TX_RANGE = 60
+
+
+class StubNode:
+    """Just what the channel needs of a wsnsimpy node, records what it gets"""
+
+    def __init__(self, env, id, pos):
+        self.env = env
+        self.id = id
+        self.pos = pos
+        self.tx_range = TX_RANGE
+        self.neighbor_distance_list = []
+        self.received = []  # (time, sender_id, frame)
+        self.lost = []  # (time, sender_id, frame)
+
+    def create_process(self, func, *args):
+        return ensure_generator(self.env, func, *args)
+
+    def start_process(self, process):
+        return self.env.process(process)
+
+    def on_receive(self, sender_id, frame):
+        self.received.append((self.env.now, sender_id, frame))
+
+    def on_collision(self, sender_id, frame):
+        self.lost.append((self.env.now, sender_id, frame))
+
+
+@pytest.fixture(params=sorted(CHANNELS))
+def network(request):
+    """
+    Two senders out of each other's range with a receiver in the middle:
+    left (0) -- 50 m -- middle (1) -- 50 m -- right (2)
+    """
+    env = simpy.Environment()
+    nodes = [StubNode(env, id, (x, 0)) for id, x in enumerate((0, 50, 100))]
+    for node in nodes:
+        node.neighbor_distance_list = sorted(
+            ((abs(node.pos[0] - other.pos[0]), other) for other in nodes if other is not node),
+            key=lambda entry: entry[0])
+    return env, CHANNELS[request.param](env), nodes
+
+
+def transmit_at(env, channel, time, sender, frame, duration=AIRTIME, dest=BROADCAST_ADDR):
+    def process():
+        yield env.timeout(time)
+        channel.transmit(sender, dest, duration, frame)
+
+    env.process(process())
+
+
+def frames(records):
+    return [frame for _, _, frame in records]
+
+
+def test_single_frame_is_received(network):
+    env, channel, (left, middle, right) = network
+    transmit_at(env, channel, 0, left, "a")
+    env.run()
+
+    assert frames(middle.received) == ["a"]
+    assert not middle.lost
+    # Out of range
+    assert not right.received and not right.lost
+
+
+def test_overlapping_frames_are_both_corrupted(network):
+    env, channel, (left, middle, right) = network
+    transmit_at(env, channel, 0, left, "a")
+    transmit_at(env, channel, AIRTIME / 2, right, "b")
+    env.run()
+
+    assert not middle.received
+    assert sorted(frames(middle.lost)) == ["a", "b"]
+    assert channel.corrupted == 2
+
+
+def test_back_to_back_frames_are_both_intact(network):
+    env, channel, (left, middle, right) = network
+    # The second frame starts exactly when the first one ends
+    transmit_at(env, channel, 0, left, "a")
+    transmit_at(env, channel, AIRTIME, right, "b")
+    env.run()
+
+    assert frames(middle.received) == ["a", "b"]
+    assert not middle.lost
+    assert channel.corrupted == 0
+
+
+def test_reception_during_own_transmission_is_lost(network):
+    env, channel, (left, middle, right) = network
+    transmit_at(env, channel, 0, left, "a")
+    transmit_at(env, channel, AIRTIME / 2, middle, "b")
+    env.run()
+
+    # Half-duplex: the middle node cannot hear while it transmits
+    assert frames(middle.lost) == ["a"]
+    assert not middle.received
+
+
+def test_deferred_frame_starts_at_the_end_of_the_previous_one(network):
+    env, channel, (left, middle, right) = network
+    transmit_at(env, channel, 0, left, "a")
+    transmit_at(env, channel, AIRTIME / 4, left, "b", duration=2 * AIRTIME)
+    env.run()
+
+    assert channel.deferred == 1
+    assert frames(middle.received) == ["a", "b"]
+    assert not middle.lost
+    # Received when it ends, AIRTIME after "a" started plus its own airtime
+    (_, _, _), (received_at, _, _) = middle.received
+    assert received_at == pytest.approx(3 * AIRTIME, abs=1e-6)
+
+
+def test_frame_for_another_node_is_not_delivered(network):
+    env, channel, (left, middle, right) = network
+    transmit_at(env, channel, 0, middle, "a", dest=right.id)
+    env.run()
+
+    assert frames(right.received) == ["a"]
+    assert not left.received and not left.lost
+
+
+def test_busy_until_and_carrier(network):
+    env, channel, (left, middle, right) = network
+    carrier = channel.carrier(middle.id)
+    assert not channel.busy(middle.id)
+    assert channel.busy_until(middle.id) == 0
+
+    channel.transmit(left, BROADCAST_ADDR, AIRTIME, "a")
+    assert carrier.triggered
+    assert channel.busy(left.id)
+    assert channel.busy_until(left.id) == pytest.approx(AIRTIME)
+    assert channel.busy_until(middle.id) == pytest.approx(AIRTIME + 50 / PROPAGATION_SPEED, abs=1e-6)
+    assert not channel.busy(right.id)
+
+    env.run()
+    assert not channel.busy(middle.id)
+    assert channel.busy_until(middle.id) == env.now
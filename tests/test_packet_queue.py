@@ -0,0 +1,154 @@
+import pytest
+
+from PacketQueue import PacketQueue
+
+QUANTUM = 512
+
+
+class Packet:
+    def __init__(self, target_id, length, time_offset=0):
+        self.target_id = target_id
+        self.length = length
+        self.time_offset = time_offset
+
+    def __repr__(self):
+        return f"Packet({self.target_id}, {self.length}, {self.time_offset})"
+
+
+def send(queue, now=0, busy=()):
+    """Send the next packet like a MAC node does, None if there is none"""
+    packet = queue.peek(now, busy)
+    if packet is not None:
+        queue.remove(packet)
+    return packet
+
+
+def test_fifo_without_quantum():
+    queue = PacketQueue()
+    packets = [Packet(1, 100, 2), Packet(2, 100, 1), Packet(1, 100, 1), Packet(2, 100, 3)]
+    for packet in packets:
+        queue.append(packet)
+
+    assert [send(queue, now=10) for _ in packets] == [packets[1], packets[2], packets[0], packets[3]]
+    assert not queue
+
+
+def test_fair_between_destinations_with_unequal_packet_sizes():
+    queue = PacketQueue(QUANTUM)
+    for _ in range(40):
+        queue.append(Packet(1, 100))
+    for _ in range(10):
+        queue.append(Packet(2, 400))
+
+    # Both destinations have 4000 bytes queued, while both are backlogged
+    # they get about the same bytes however many packets that takes
+    sent = {1: 0, 2: 0}
+    while sum(sent.values()) < 4000:
+        packet = send(queue)
+        sent[packet.target_id] += packet.length
+    assert abs(sent[1] - sent[2]) <= QUANTUM
+
+    while queue:
+        packet = send(queue)
+        sent[packet.target_id] += packet.length
+    assert sent == {1: 4000, 2: 4000}
+
+
+def test_packet_longer_than_quantum_skips_rounds():
+    queue = PacketQueue(QUANTUM)
+    large = Packet(1, 3 * QUANTUM + 1)
+    queue.append(large)
+
+    assert send(queue) is large
+    assert not queue
+
+
+def test_large_packets_do_not_starve_small_ones():
+    queue = PacketQueue(QUANTUM)
+    large = [Packet(1, 1500) for _ in range(3)]
+    small = [Packet(2, 100) for _ in range(20)]
+    for packet in large + small:
+        queue.append(packet)
+
+    order = [send(queue).target_id for _ in range(len(large) + len(small))]
+    # The large packet takes three rounds of quantum, the small packets are
+    # sent in those rounds instead of waiting for it
+    before_large = order.index(1)
+    assert 0 < before_large * 100 <= 3 * QUANTUM
+    assert order.count(2) == len(small)
+
+
+def test_skips_busy_destination():
+    queue = PacketQueue(QUANTUM)
+    first, second = Packet(1, 100), Packet(2, 100)
+    queue.append(first)
+    queue.append(second)
+
+    assert queue.peek(0, busy={1}) is second
+    assert queue.peek(0, busy={1, 2}) is None
+    assert queue.peek(0, busy={2}) is first
+
+
+def test_skips_packet_that_is_not_due():
+    queue = PacketQueue(QUANTUM)
+    later, now = Packet(1, 100, time_offset=5), Packet(2, 100)
+    queue.append(later)
+    queue.append(now)
+
+    assert send(queue, now=0) is now
+    assert send(queue, now=0) is None
+    assert send(queue, now=5) is later
+
+
+def test_append_keeps_destination_queue_in_time_order():
+    queue = PacketQueue(QUANTUM)
+    late, early = Packet(1, 100, time_offset=5), Packet(1, 100, time_offset=1)
+    queue.append(late)
+    queue.append(early)
+
+    assert queue.head(1) is early
+
+
+def test_remove_packet_that_is_not_the_head():
+    queue = PacketQueue(QUANTUM)
+    first, second, third = Packet(1, 100), Packet(1, 100), Packet(1, 100)
+    for packet in (first, second, third):
+        queue.append(packet)
+    other = Packet(2, 100)
+    queue.append(other)
+
+    queue.remove(second)
+    assert len(queue) == 3
+    assert queue.head(1) is first
+    assert queue.burst(1, 0, limit=10) == [first, third]
+
+    with pytest.raises(ValueError):
+        queue.remove(second)
+
+    sent = [send(queue) for _ in range(3)]
+    assert sorted(sent, key=id) == sorted([first, third, other], key=id)
+    assert not queue
+
+
+def test_remove_rotates_round_once_the_turn_is_over():
+    queue = PacketQueue(QUANTUM)
+    for _ in range(10):
+        queue.append(Packet(1, 200))
+    other = Packet(2, 200)
+    queue.append(other)
+
+    # Destination 1 may send two packets of its quantum, then it is the other's turn
+    assert [send(queue).target_id for _ in range(3)] == [1, 1, 2]
+
+
+def test_burst_limits():
+    queue = PacketQueue(QUANTUM)
+    packets = [Packet(1, 100) for _ in range(4)] + [Packet(1, 100, time_offset=5)]
+    for packet in packets:
+        queue.append(packet)
+
+    assert queue.burst(1, 0, limit=10) == packets[:4]
+    assert queue.burst(1, 0, limit=2) == packets[:2]
+    assert queue.burst(1, 0, limit=10, max_bytes=250) == packets[:2]
+    # The first packet always goes, even when it is longer than max_bytes
+    assert queue.burst(1, 0, limit=10, max_bytes=50) == packets[:1]
@@ -0,0 +1,29 @@
+from Common.trace import Tracer, event, read_trace
+
+EV_PLAIN = event("test.plain", "Node {node} got {a} and {b}", ("a", "b"))
+EV_NAMED = event("test.named", "Lost a {kind} from {sender}", ("kind", "sender"), names={"kind": {1: "RTS", 2: "CTS"}})
+
+
+def test_format():
+    assert EV_PLAIN.format(3, 1, 2) == "Node 3 got 1 and 2"
+    assert EV_NAMED.format(3, 2, 7) == "Lost a CTS from 7"
+    # Values without a name are shown as they are
+    assert EV_NAMED.format(3, 9, 7) == "Lost a 9 from 7"
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "run.trace"
+    tracer = Tracer(path, capacity=2)
+    tracer.record(0.5, 1, EV_PLAIN.code, 4, 5)
+    tracer.record(1.0, 2, EV_NAMED.code, 1, 3)
+    tracer.record(1.5, 3, EV_PLAIN.code)
+    tracer.close()
+
+    records = list(read_trace(path))
+    assert [(time, node, event_type.name, a, b) for time, node, event_type, a, b in records] == [
+        (0.5, 1, "test.plain", 4, 5),
+        (1.0, 2, "test.named", 1, 3),
+        (1.5, 3, "test.plain", -1, -1),
+    ]
+    _, node, event_type, a, b = records[1]
+    assert event_type.format(node, a, b) == "Lost a RTS from 3"
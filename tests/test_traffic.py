@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from Common.traffic import ConstantBitRate, OnOff, Poisson, parse_traffic
+
+
+def test_parse_traffic():
+    generator = parse_traffic("onoff:rate=10,on=2,off=8,count=3")(5, 256, start=1)
+
+    assert isinstance(generator, OnOff)
+    assert (generator.dest, generator.length, generator.start) == (5, 256, 1)
+    assert (generator.rate, generator.on, generator.off, generator.count) == (10, 2, 8, 3)
+    assert isinstance(generator.count, int)
+
+
+@pytest.mark.parametrize("spec", [
+    "unknown:rate=5",
+    "poisson",
+    "poisson:count=3",
+    "poisson:rat=5",
+    "cbr:rate=5,on=1",
+    "cbr:rate=x",
+    "cbr:rate=0",
+    "poisson:rate=-1",
+    "onoff:rate=2,off=0",
+])
+def test_parse_traffic_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        parse_traffic(spec)
+
+
+def test_constant_bit_rate_gaps():
+    gaps = ConstantBitRate(1, 100, rate=4).gaps(random.Random(0))
+    assert [next(gaps) for _ in range(3)] == [0, 0.25, 0.25]
+
+
+def test_poisson_mean_gap():
+    gaps = Poisson(1, 100, rate=5).gaps(random.Random(0))
+    mean = sum(next(gaps) for _ in range(10000)) / 10000
+    assert mean == pytest.approx(1 / 5, rel=0.05)